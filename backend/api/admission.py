@@ -0,0 +1,103 @@
+"""
+Per-endpoint admission control
+Each heavy endpoint gets at most max_concurrent requests running and at most
+max_queue waiting for a slot. Anything beyond that, or anything that waits
+longer than queue_timeout, is turned away straight away with 429 and a
+Retry-After estimate. A burst of slow AI checks then cannot hold every
+server thread and starve health checks or short plagiarism checks.
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def configured_limits(environ=os.environ):
+    """
+    (max_concurrent, max_queue) of every limiter of the Plagiarism API. Also
+    read by gunicorn.conf.py, which gives each worker enough request threads
+    for all of them.
+    """
+    return {
+        'plagiarism': (int(environ.get('PLAGIARISM_MAX_CONCURRENT', 2)), int(environ.get('PLAGIARISM_MAX_QUEUE', 8))),
+        # Concurrent AI checks share classifier batches (inference_scheduler.py), so
+        # several run for little more than the cost of one
+        'ai': (int(environ.get('AI_MAX_CONCURRENT', 4)), int(environ.get('AI_MAX_QUEUE', 4))),
+        # Bulk / collusion jobs run for minutes: no queue, a second job is turned away straight away
+        'bulk': (int(environ.get('PLAGIARISM_BULK_MAX_CONCURRENT', 1)), 0),
+        'ingest': (1, 2),
+    }
+
+
+class EndpointLimiter:
+    def __init__(self, name, max_concurrent=2, max_queue=8, queue_timeout=20.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._avg_seconds = None
+
+    def _admit(self):
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+        got_slot = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not got_slot:
+                self.timed_out += 1
+        return got_slot
+
+    @contextmanager
+    def slot(self):
+        """Yields True once a slot is held, or False (without waiting further) when the request should get a 429"""
+        if not self._admit():
+            yield False
+            return
+        with self._lock:
+            self.running += 1
+            self.admitted += 1
+        start = time.monotonic()
+        try:
+            yield True
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.running -= 1
+                # Moving average of service time, used for Retry-After
+                self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._slots.release()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: queued work ahead divided by the parallelism"""
+        with self._lock:
+            avg = self._avg_seconds or 1.0
+            ahead = self.waiting + self.running
+        return max(1, math.ceil(avg * ahead / self.max_concurrent))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'running': self.running,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_service_s': round(self._avg_seconds, 3) if self._avg_seconds is not None else None
+            }
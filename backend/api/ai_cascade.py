@@ -0,0 +1,330 @@
+"""
+Cheap-first cascade for AI detection
+The logistic-regression combiner shipped in backend/data/combiner_logreg.joblib
+(trained in Check_AI.ipynb on stylometric text features plus the PhoBERT
+probability) scores a text from its features alone in about a millisecond.
+/api/check-ai then runs PhoBERT only when that score falls inside the
+uncertain band [low, high]: below it the text is reported as human written,
+above it as AI written. Features that need another model (the PhoBERT
+probability, MaskedLM pseudo-perplexity, tokenizer counts) and the length
+features (debiased the same way in the notebook) are set to their training
+mean, so they do not move the score.
+
+Freezing those features (PhoBERT has the largest coefficient) is only safe
+for bands checked against PhoBERT itself, so the cascade decides nothing
+until an evaluation report on held-out texts covers the configured band for
+the same model files (check_band_report). The evaluation compares the
+cascade with PhoBERT alone for a sweep of bands:
+    python backend/api/ai_cascade.py texts.jsonl -o backend/data/cascade_report.json
+"""
+
+import argparse
+import json
+import math
+import re
+import time
+import unicodedata
+import warnings
+import zlib
+from collections import Counter
+
+import numpy as np
+
+# Same sets as Check_AI.ipynb
+LENGTH_FEATURES = ('n_chars', 'n_words', 'n_sents', 'n_paras', 'avg_para_len_words',
+                   'hf_tokens_full', 'hf_tokens_trunc', 'hf_is_truncated', 'hf_subwords_per_word')
+MODEL_FEATURES = ('prob_model', 'mlm_pseudo_ppl')
+
+VI_STOPWORDS = {
+    'và', 'là', 'của', 'cho', 'một', 'những', 'các', 'đã', 'đang', 'sẽ', 'với', 'trong', 'khi', 'để', 'này', 'đó',
+    'ở', 'tôi', 'bạn', 'anh', 'chị', 'em', 'chúng', 'chúng tôi', 'chúng ta', 'họ', 'nó', 'thì', 'như', 'vì',
+    'nên', 'cũng', 'rất', 'không', 'có', 'đến', 'từ', 'ra', 'vào', 'lại', 'hay', 'được', 'bị', 'vẫn', 'nhiều', 'ít'
+}
+
+SENT_SPLIT = re.compile(r'(?<=[.!?…])\s+')
+# \p{L}+(?:['’]\p{L}+)? without the regex package
+WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)?")
+URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.IGNORECASE)
+QUOTE_RE = re.compile(r"['\"“”‘’]")
+BULLET_LINE_RE = re.compile(r"(?m)^\s*(?:[-*•]|\d+[\).]|[a-zA-Z][\).])\s+")
+_TRANSLATE = str.maketrans({'“': '"', '”': '"', '’': "'", '–': '-', '—': '-'})
+
+
+def normalize_text(text):
+    cleaned = unicodedata.normalize('NFC', text or '').translate(_TRANSLATE)
+    return re.sub(r'\s+', ' ', cleaned).strip()
+
+
+def _words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def text_features(text):
+    """The combiner's text features (compute_text_features in Check_AI.ipynb, without the model-based ones)"""
+    raw = text or ''
+    t = normalize_text(raw)
+    chars = len(t)
+    raw_chars = len(raw)
+
+    categories = [unicodedata.category(ch) for ch in t]
+    punct = sum(1 for c in categories if c[0] in 'PS')
+    digits = sum(1 for c in categories if c[0] == 'N')
+    letters = sum(1 for c in categories if c[0] == 'L')
+    uppers = sum(1 for c in categories if c == 'Lu')
+
+    words = _words(t)
+    n_words = len(words)
+    sent_lens = [len(_words(s)) for s in SENT_SPLIT.split(t) if s.strip()]
+    n_sents = len(sent_lens)
+    avg_sent_len = sum(sent_lens) / n_sents if n_sents else 0.0
+    std_sent = math.sqrt(sum((x - avg_sent_len) ** 2 for x in sent_lens) / n_sents) if n_sents else 0.0
+    para_lens = [len(_words(normalize_text(p))) for p in re.split(r"\n\s*\n+", raw) if p.strip()]
+
+    features = {
+        'n_chars': float(chars),
+        'n_words': float(n_words),
+        'n_sents': float(n_sents),
+        'n_paras': float(len(para_lens)),
+        'punct_ratio': punct / (chars + 1e-6),
+        'digit_ratio': digits / (chars + 1e-6),
+        'uppercase_ratio': uppers / (letters + 1e-6) if letters else 0.0,
+        'quote_ratio': len(QUOTE_RE.findall(raw)) / (raw_chars + 1e-6),
+        'newline_ratio': raw.count('\n') / (raw_chars + 1e-6),
+        'unique_word_ratio': len(set(words)) / n_words if n_words else 0.0,
+        'avg_word_len': sum(len(w) for w in words) / n_words if n_words else 0.0,
+        'avg_sent_len_words': avg_sent_len,
+        'avg_para_len_words': sum(para_lens) / len(para_lens) if para_lens else 0.0,
+        'burstiness': std_sent / (avg_sent_len + 1e-6) if n_sents else 0.0,
+        'bullet_lines': float(len(BULLET_LINE_RE.findall(raw))),
+        'url_count': float(len(URL_RE.findall(raw))),
+        'email_count': float(len(EMAIL_RE.findall(raw))),
+        'hapax_ratio': 0.0, 'herdan_c': 0.0, 'entropy_norm': 0.0, 'stopword_ratio': 0.0, 'max_unigram_rep': 0.0,
+        'bigram_rep': 0.0, 'trigram_rep': 0.0, 'compression_ratio': 0.0,
+    }
+    if n_words:
+        counts = Counter(words)
+        probs = [v / n_words for v in counts.values()]
+        features.update(
+            max_unigram_rep=max(counts.values()) / n_words,
+            hapax_ratio=sum(1 for v in counts.values() if v == 1) / n_words,
+            entropy_norm=-sum(p * math.log(p + 1e-12) for p in probs) / (math.log(len(counts) + 1e-12) + 1e-6),
+            herdan_c=math.log(len(counts) + 1e-12) / (math.log(n_words + 1e-12) + 1e-6) if n_words > 1 else 0.0,
+            stopword_ratio=sum(1 for w in words if w in VI_STOPWORDS) / n_words,
+        )
+    if n_words >= 2:
+        bigrams = list(zip(words, words[1:]))
+        features['bigram_rep'] = 1.0 - len(set(bigrams)) / (len(bigrams) + 1e-6)
+    if n_words >= 3:
+        trigrams = list(zip(words, words[1:], words[2:]))
+        features['trigram_rep'] = 1.0 - len(set(trigrams)) / (len(trigrams) + 1e-6)
+    if raw_chars:
+        features['compression_ratio'] = len(zlib.compress(raw.encode('utf-8', errors='ignore'), level=9)) / (raw_chars + 1e-6)
+    return features
+
+
+def _ai_class_index(model):
+    classes = getattr(model, 'classes_', None)
+    if classes is None and hasattr(model, 'steps'):
+        classes = getattr(model.steps[-1][1], 'classes_', None)
+    classes = list(classes) if classes is not None else [0, 1]
+    for i, c in enumerate(classes):
+        if isinstance(c, str) and c.strip().lower() == 'ai':
+            return i
+    return classes.index(1) if 1 in classes else len(classes) - 1
+
+
+class CheapAIScorer:
+    def __init__(self, model, cols, low=0.2, high=1.0, debias_length=True):
+        """
+        model: fitted sklearn classifier over `cols`
+        low / high: texts scoring below low (above high) skip PhoBERT
+        """
+        self.model = model
+        self.cols = list(cols)
+        self.low = low
+        self.high = high
+        # Set to False when the band has not been validated: decide() then always defers to PhoBERT
+        self.validated = True
+        self.ai_index = _ai_class_index(model)
+
+        scaler = next((est for _, est in getattr(model, 'steps', []) if hasattr(est, 'mean_')), None)
+        means = dict(zip(self.cols, scaler.mean_)) if scaler is not None else {}
+        neutral = set(MODEL_FEATURES) | (set(LENGTH_FEATURES) if debias_length else set())
+        # Columns held at their training mean (0.0 without a scaler, as in the notebook)
+        self.fixed = {col: float(means.get(col, 0.0)) for col in self.cols if col in neutral}
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        import joblib
+        with warnings.catch_warnings():
+            # Pickled with another scikit-learn version; a scaler + logistic regression loads fine
+            warnings.filterwarnings('ignore', message='Trying to unpickle estimator')
+            bundle = joblib.load(path)
+        model = bundle.get('model', bundle) if isinstance(bundle, dict) else bundle
+        cols = bundle.get('cols') if isinstance(bundle, dict) else None
+        if not cols:
+            raise ValueError(f"{path} has no feature column list ('cols')")
+        return cls(model, cols, **kwargs)
+
+    def score(self, texts):
+        """P(AI) of every text from its text features alone"""
+        import pandas as pd
+        rows = [{**text_features(text), **self.fixed} for text in texts]
+        X = pd.DataFrame(rows).reindex(columns=self.cols, fill_value=0.0)
+        return self.model.predict_proba(X)[:, self.ai_index]
+
+    def decide(self, score, low=None, high=None):
+        """'human' / 'ai' when the cheap score is conclusive, None inside the uncertain band"""
+        if not self.validated:
+            return None
+        low = self.low if low is None else low
+        high = self.high if high is None else high
+        if score < low:
+            return 'human'
+        if score > high:
+            return 'ai'
+        return None
+
+
+# ===============================================
+# EVALUATION
+# ===============================================
+
+def evaluate_bands(cheap, phobert, windows, seconds, bands, label_fn, suspicious=0.6, labels=None):
+    """
+    Agreement of the cascade with PhoBERT alone for each (low, high) band.
+    cheap / phobert: document scores; windows / seconds: PhoBERT work per document;
+    labels: optional ground truth (1 = AI).
+    """
+    cheap, phobert = np.asarray(cheap, dtype=float), np.asarray(phobert, dtype=float)
+    windows, seconds = np.asarray(windows, dtype=float), np.asarray(seconds, dtype=float)
+    phobert_labels = [label_fn(p) for p in phobert]
+    rows = []
+    for low, high in bands:
+        to_human, to_ai = cheap < low, cheap > high
+        decided = to_human | to_ai
+        final = np.where(decided, cheap, phobert)
+        row = {
+            'low': low,
+            'high': high,
+            'phobert_skipped': round(float(decided.mean()), 4),
+            'windows_saved': round(float(windows[decided].sum() / max(windows.sum(), 1)), 4),
+            'phobert_seconds_saved': round(float(seconds[decided].sum()), 3),
+            'label_agreement': round(float(np.mean([label_fn(f) == p for f, p in zip(final, phobert_labels)])), 4),
+            'suspicious_agreement': round(float(np.mean((final >= suspicious) == (phobert >= suspicious))), 4),
+            # Documents PhoBERT flags that the cascade clears, and the reverse
+            'missed_suspicious': int(np.sum(to_human & (phobert >= suspicious))),
+            'false_suspicious': int(np.sum(to_ai & (phobert < suspicious))),
+            'max_abs_diff': round(float(np.max(np.abs(final - phobert))), 4) if len(final) else 0.0,
+        }
+        if labels is not None:
+            row['accuracy'] = round(float(np.mean((final >= 0.5) == labels)), 4)
+        rows.append(row)
+    return rows
+
+
+def check_band_report(report_path, low, high, combiner_version, phobert_version, min_agreement=0.95):
+    """
+    None when the report written by main() was made with these model files and
+    its row for [low, high] agrees with PhoBERT on at least min_agreement of
+    the labels without clearing any text PhoBERT flags; otherwise the reason.
+    """
+    try:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError) as e:
+        return f"no usable evaluation report at {report_path} ({e})"
+    if report.get('combiner_version') != combiner_version or report.get('phobert_version') != phobert_version:
+        return f"{report_path} was made with other model files"
+    rows = [report.get('configured_band') or {}] + report.get('bands', [])
+    row = next((r for r in rows if r.get('low') == low and r.get('high') == high), None)
+    if row is None:
+        return f"band [{low}, {high}] is not in {report_path}"
+    if row['missed_suspicious'] or row['label_agreement'] < min_agreement:
+        return (f"band [{low}, {high}] agrees with PhoBERT on {row['label_agreement']:.1%} of "
+                f"{report.get('texts')} texts and clears {row['missed_suspicious']} suspicious ones")
+    return None
+
+
+def _parse_floats(value):
+    return [float(v) for v in value.split(',') if v.strip()]
+
+
+def _parse_label(value):
+    if isinstance(value, str):
+        return 1 if value.strip().lower() in ('ai', '1', 'true') else 0
+    return int(bool(value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the cheap-first cascade with PhoBERT alone')
+    parser.add_argument('input', help='JSON list or JSON lines of {"id", "text", "label" (optional, AI / Human)}')
+    parser.add_argument('-o', '--output', required=True, help='JSON report path')
+    parser.add_argument('--lows', default='0.05,0.1,0.15,0.2,0.3,0.4', help='Lower band edges to sweep')
+    parser.add_argument('--highs', default='0.8,0.9,0.95,1.0', help='Upper band edges to sweep')
+    parser.add_argument('--window-mode', default=None, choices=['sentence', 'document'])
+    args = parser.parse_args()
+
+    from live_corpus import read_document_file
+    documents = [doc for doc in read_document_file(args.input) if str(doc.get('text') or '').strip()]
+    if not documents:
+        raise SystemExit(f"No texts in {args.input}")
+
+    # Same models and configuration as /api/check-ai
+    import plagiarism_api as api
+    scorer = api.startup.result('ai_cascade', api.load_ai_cascade)
+    ai_model, ai_tokenizer, _ = api.startup.result('ai_detector', api.load_ai_detector)
+    window_mode = args.window_mode or api.AI_WINDOW_MODE
+
+    start = time.perf_counter()
+    cheap = scorer.score([doc['text'] for doc in documents])
+    cheap_seconds = time.perf_counter() - start
+
+    records = []
+    for i, (doc, cheap_score) in enumerate(zip(documents, cheap)):
+        t = time.perf_counter()
+        _, window_scores = api.analyze_ai_with_windows(doc['text'].strip(), ai_model, ai_tokenizer, mode=window_mode)
+        records.append({
+            'id': doc.get('id', i),
+            'cheap': round(float(cheap_score), 4),
+            'phobert': round(float(np.mean(window_scores)) if window_scores else 0.0, 4),
+            'windows': len(window_scores),
+            'phobert_s': round(time.perf_counter() - t, 4),
+        })
+        if (i + 1) % 50 == 0:
+            print(f"   {i + 1}/{len(documents)} texts scored by PhoBERT")
+
+    labels = None
+    if all('label' in doc for doc in documents):
+        labels = np.array([_parse_label(doc['label']) for doc in documents])
+    bands = [(low, high) for low in _parse_floats(args.lows) for high in _parse_floats(args.highs) if low <= high]
+    phobert = [r['phobert'] for r in records]
+    configured, *rows = evaluate_bands(cheap, phobert, [r['windows'] for r in records],
+                                       [r['phobert_s'] for r in records], [(scorer.low, scorer.high)] + bands,
+                                       api.get_ai_label, labels=labels)
+
+    report = {
+        'texts': len(documents),
+        'combiner_version': api.artifact_fingerprint(api.AI_CASCADE_MODEL),
+        'phobert_version': api.ai_model_version(),
+        'window_mode': window_mode,
+        'cheap_seconds_total': round(cheap_seconds, 4),
+        'phobert_seconds_total': round(sum(r['phobert_s'] for r in records), 3),
+        'cheap_score_quantiles': {f"p{q}": round(float(np.percentile(cheap, q)), 4) for q in (5, 25, 50, 75, 95)},
+        'configured_band': configured,
+        'bands': rows,
+        'documents': records,
+    }
+    if labels is not None:
+        report['phobert_accuracy'] = round(float(np.mean((np.array(phobert) >= 0.5) == labels)), 4)
+
+    print(f"✅ Band [{scorer.low}, {scorer.high}]: PhoBERT skipped for {configured['phobert_skipped']:.1%} of texts, "
+          f"label agreement {configured['label_agreement']:.1%}, {configured['missed_suspicious']} suspicious texts missed")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✅ Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Sliding-window AI detection (from the notebook): texts are cut into token
+windows, scored by the PhoBERT classifier in padded batches and the window
+probabilities are averaged back onto sentences. The API runs it with the
+model and tokenizer it loaded.
+"""
+
+import re
+
+import numpy as np
+
+from metrics import stage, timed
+
+
+def get_ai_label(confidence):
+    """Convert confidence score to label"""
+    if confidence < 0.4:
+        return "Nguoi viet"
+    elif confidence < 0.6:
+        return "Nghi van"
+    elif confidence < 0.8:
+        return "Co dau hieu AI"
+    else:
+        return "AI viet"
+
+
+# 'sentence': windows inside each sentence; 'document': windows over the whole text
+AI_WINDOW_MODES = ('sentence', 'document')
+
+
+def split_ai_sentences(text):
+    return [s.strip() for s in re.split(r"(?<=[.!?...])\s+", text) if s.strip()]
+
+
+def analyze_ai_with_windows(text, clf_model, ai_tokenizer, max_windows=None, stride_tokens=128, batch_size=32,
+                            mode='sentence', scheduler=None):
+    """
+    Analyze text with sliding windows to get sentence-level scores
+    Returns list of sentences with their AI scores
+    Windows of all sentences are collected first and scored together in
+    padded batches (see predict_probs_batched).
+    mode='document' slides full windows over the whole text instead
+    (see analyze_ai_document_windows). With a scheduler the windows are
+    batched together with those of concurrent requests.
+    """
+    if mode == 'document':
+        return analyze_ai_document_windows(text, clf_model, ai_tokenizer, max_windows=max_windows,
+                                           stride_tokens=stride_tokens, batch_size=batch_size,
+                                           scheduler=scheduler)
+    try:
+        sentences = split_ai_sentences(text)
+        ai_analysis = []
+        sentence_windows = []
+        
+        for idx, sentence in enumerate(sentences):
+            word_count = len(sentence.split())
+            
+            result = {
+                'sentence': sentence,
+                'sentence_index': idx,
+                'word_count': word_count,
+                'is_suspicious': False,
+                'confidence': 0.0,
+                'label': 'Nguoi viet'
+            }
+            
+            if word_count < 5:
+                ai_analysis.append(result)
+                continue
+            
+            windows = []
+            try:
+                with stage('tokenize'):
+                    ids = ai_tokenizer(sentence, add_special_tokens=False, truncation=False).get('input_ids', [])
+                if not ids:
+                    ai_analysis.append(result)
+                    continue
+                    
+                n_special = 2
+                win_len = max(8, int(256) - n_special)
+                
+                if len(ids) <= win_len:
+                    windows.append(ai_tokenizer.build_inputs_with_special_tokens(ids))
+                else:
+                    stride = min(max(1, stride_tokens), win_len)
+                    for start in range(0, len(ids), stride):
+                        chunk = ids[start:start + win_len]
+                        if len(chunk) < 8:
+                            break
+                        windows.append(ai_tokenizer.build_inputs_with_special_tokens(chunk))
+                        if max_windows and len(windows) >= max_windows:
+                            break
+                        if start + win_len >= len(ids):
+                            break
+                    
+            except Exception as e:
+                print(f"Warning processing sentence {idx}: {e}")
+            
+            ai_analysis.append(result)
+            if windows:
+                sentence_windows.append((result, windows))
+        
+        all_windows = [w for _, windows in sentence_windows for w in windows]
+        probs = _score_windows(all_windows, clf_model, ai_tokenizer, batch_size, scheduler)
+        
+        # Per-sentence averages, window scores in sentence order as before
+        window_scores = []
+        offset = 0
+        for result, windows in sentence_windows:
+            sent_probs = probs[offset:offset + len(windows)]
+            offset += len(windows)
+            avg_prob = float(np.mean(sent_probs))
+            result['confidence'] = round(avg_prob, 4)
+            result['is_suspicious'] = avg_prob >= 0.6
+            result['label'] = get_ai_label(avg_prob)
+            window_scores.extend(sent_probs)
+        
+        return ai_analysis, window_scores
+        
+    except Exception as e:
+        print(f"Error in analyze_ai_with_windows: {e}")
+        return [], []
+
+
+def analyze_ai_document_windows(text, clf_model, ai_tokenizer, max_windows=None, stride_tokens=128, batch_size=32,
+                                scheduler=None):
+    """
+    Document-level variant of analyze_ai_with_windows: the text is tokenized
+    once, full windows slide over it with stride_tokens, and each sentence
+    gets the average of the windows covering it, weighted by how many of its
+    tokens each window contains. Short sentences still get no score.
+    Returns the same (sentence analysis, window scores) pair.
+    """
+    try:
+        sentences = split_ai_sentences(text)
+        ids, token_sentence = _tokenize_with_sentence_ids(text, sentences, ai_tokenizer)
+        
+        ai_analysis = [{
+            'sentence': sentence,
+            'sentence_index': idx,
+            'word_count': len(sentence.split()),
+            'is_suspicious': False,
+            'confidence': 0.0,
+            'label': 'Nguoi viet'
+        } for idx, sentence in enumerate(sentences)]
+        if len(ids) == 0:
+            return ai_analysis, []
+        
+        n_special = 2
+        win_len = max(8, int(256) - n_special)
+        stride = min(max(1, stride_tokens), win_len)
+        starts = list(range(0, max(len(ids) - win_len, 0) + 1, stride))
+        if starts[-1] + win_len < len(ids):
+            starts.append(len(ids) - win_len)
+        if max_windows:
+            starts = starts[:max_windows]
+        
+        windows = [ai_tokenizer.build_inputs_with_special_tokens(ids[start:start + win_len]) for start in starts]
+        window_scores = _score_windows(windows, clf_model, ai_tokenizer, batch_size, scheduler)
+        
+        # Token overlap of every window with every sentence
+        overlap = np.zeros((len(starts), len(sentences)))
+        for w, start in enumerate(starts):
+            covered = token_sentence[start:start + win_len]
+            covered = covered[covered >= 0]
+            overlap[w] = np.bincount(covered, minlength=len(sentences))
+        weight_sum = overlap.sum(axis=0)
+        sentence_probs = (np.asarray(window_scores) @ overlap) / np.maximum(weight_sum, 1e-9)
+        
+        for idx, result in enumerate(ai_analysis):
+            if result['word_count'] < 5 or weight_sum[idx] == 0:
+                continue
+            avg_prob = float(sentence_probs[idx])
+            result['confidence'] = round(avg_prob, 4)
+            result['is_suspicious'] = avg_prob >= 0.6
+            result['label'] = get_ai_label(avg_prob)
+        
+        return ai_analysis, window_scores
+        
+    except Exception as e:
+        print(f"Error in analyze_ai_document_windows: {e}")
+        return [], []
+
+
+@timed('tokenize')
+def _tokenize_with_sentence_ids(text, sentences, ai_tokenizer):
+    """
+    Token ids of the whole text plus the sentence index of every token (-1 for
+    tokens outside any sentence). Fast tokenizers are called once with offset
+    mapping; slow ones (PhoBERT ships without a fast tokenizer) per sentence.
+    """
+    if getattr(ai_tokenizer, 'is_fast', False):
+        spans = []
+        cursor = 0
+        for sentence in sentences:
+            begin = text.find(sentence, cursor)
+            spans.append(begin)
+            cursor = begin + len(sentence)
+        enc = ai_tokenizer(text, add_special_tokens=False, truncation=False, return_offsets_mapping=True)
+        ids = enc['input_ids']
+        token_start = np.array([start for start, _ in enc['offset_mapping']], dtype=np.int64)
+        token_sentence = np.searchsorted(np.array(spans, dtype=np.int64), token_start, side='right') - 1
+        return ids, token_sentence
+    
+    ids = []
+    token_sentence = []
+    for idx, sentence in enumerate(sentences):
+        sentence_ids = ai_tokenizer(sentence, add_special_tokens=False, truncation=False).get('input_ids', [])
+        ids.extend(sentence_ids)
+        token_sentence.extend([idx] * len(sentence_ids))
+    return ids, np.array(token_sentence, dtype=np.int64)
+
+
+@timed('classify')
+def _score_windows(windows, clf_model, ai_tokenizer, batch_size=32, scheduler=None):
+    if scheduler is not None:
+        return list(scheduler.run(windows))
+    return predict_probs_batched(windows, clf_model, getattr(ai_tokenizer, 'pad_token_id', None),
+                                  batch_size=batch_size)
+
+
+def _model_device(model):
+    try:
+        return next(model.parameters()).device
+    except (AttributeError, StopIteration):
+        return 'cpu'
+
+
+@timed('classifier_forward')
+def predict_probs_batched(windows, model, pad_token_id=None, batch_size=32):
+    """
+    P(AI) for many token-id windows. Windows are sorted by length and cut
+    into batches so each batch pads to a similar length; padding is masked
+    out with attention_mask. Results come back in the input order.
+    """
+    if not windows:
+        return []
+    import torch
+    if pad_token_id is None:
+        pad_token_id = getattr(getattr(model, 'config', None), 'pad_token_id', None) or 0
+    device = _model_device(model)
+    
+    probs = [0.0] * len(windows)
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        max_len = len(windows[batch[-1]])
+        ids = torch.full((len(batch), max_len), pad_token_id, dtype=torch.long)
+        attn = torch.zeros((len(batch), max_len), dtype=torch.long)
+        for row, i in enumerate(batch):
+            ids[row, :len(windows[i])] = torch.tensor(windows[i], dtype=torch.long)
+            attn[row, :len(windows[i])] = 1
+        try:
+            with torch.inference_mode():
+                logits = model(input_ids=ids.to(device), attention_mask=attn.to(device)).logits
+                batch_probs = torch.softmax(logits.float(), dim=-1)[:, 1].tolist()
+        except Exception as e:
+            print(f"Error in batched prediction, scoring windows one by one: {e}")
+            batch_probs = [_predict_prob_from_ids_simple(windows[i], model) for i in batch]
+        for i, prob in zip(batch, batch_probs):
+            probs[i] = float(prob)
+    return probs
+
+
+def _predict_prob_from_ids_simple(input_ids_1d, model):
+    """Simple prediction from token IDs"""
+    try:
+        import torch
+        ids = torch.tensor([input_ids_1d], device=_model_device(model))
+        attn = torch.ones_like(ids)
+        with torch.inference_mode():
+            logits = model(input_ids=ids, attention_mask=attn).logits
+            prob_ai = torch.softmax(logits, dim=-1)[0, 1].item()
+        return float(prob_ai)
+    except Exception as e:
+        print(f"Error in prediction: {e}")
+        return 0.0
+
+
+def analyze_ai_decided(text, prob_ai):
+    """Sentence analysis of a text the cheap scorer was conclusive about: sentences get the document score"""
+    ai_analysis = []
+    for idx, sentence in enumerate(split_ai_sentences(text)):
+        word_count = len(sentence.split())
+        scored = word_count >= 5
+        ai_analysis.append({
+            'sentence': sentence,
+            'sentence_index': idx,
+            'word_count': word_count,
+            'is_suspicious': scored and prob_ai >= 0.6,
+            'confidence': round(prob_ai, 4) if scored else 0.0,
+            'label': get_ai_label(prob_ai) if scored else 'Nguoi viet'
+        })
+    return ai_analysis
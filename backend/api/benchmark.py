@@ -0,0 +1,495 @@
+"""
+Offline performance benchmark for the plagiarism / AI detection pipeline
+`generate` writes a synthetic Vietnamese corpus of any size (corpus store,
+FAISS index(es) and a query set) embedded with a deterministic stub encoder,
+so no model download is needed. `run` loads the API on that corpus and
+measures latency percentiles and throughput of TextChunker.chunk_text,
+CompletePlagiarismDetector.detect, analyze_sentences,
+DocumentScorer.calculate_doc_scores and analyze_ai_with_windows, then writes
+a JSON report. `compare` diffs two reports and fails on regressions.
+
+Usage:
+    python backend/api/benchmark.py generate --chunks 10000 --out bench/10k
+    python backend/api/benchmark.py run --data bench/10k --out bench/10k/results.json
+    python backend/api/benchmark.py compare before.json after.json --fail-threshold 10
+
+The stub encoder and classifier are cheap, so the numbers isolate chunking,
+search, scoring and request overhead; pass --encoder model / --ai-model to
+time the real models as well.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from text_chunker import TextChunker
+
+GENERATOR_VERSION = 1
+
+# Common Vietnamese words; sentences are random draws, which is enough for the
+# chunker, tokenizer and scorer to see realistic lengths and characters
+VOCAB = """
+tôi bạn chúng ta họ người sinh viên giáo viên trường học lớp bài văn nghị luận xã hội kinh tế phát triển
+công nghệ thông tin đất nước con người gia đình môi trường thiên nhiên lịch sử văn hóa truyền thống hiện đại
+cuộc sống xã hội học tập nghiên cứu khoa học kỹ thuật giáo dục đào tạo chính sách nhà nước doanh nghiệp thị trường
+sản xuất tiêu dùng nông nghiệp công nghiệp dịch vụ du lịch thành phố nông thôn miền núi đồng bằng biển đảo
+sông ngòi rừng núi khí hậu biến đổi ô nhiễm bảo vệ tài nguyên năng lượng tái tạo điện nước giao thông vận tải
+internet mạng điện thoại máy tính phần mềm dữ liệu trí tuệ nhân tạo tự động hóa chuyển đổi số quản lý
+tổ chức cá nhân cộng đồng thế hệ trẻ thanh niên phụ nữ trẻ em người già sức khỏe y tế bệnh viện bác sĩ
+thuốc men dinh dưỡng thể thao nghệ thuật âm nhạc văn học thơ ca tác phẩm tác giả nhân vật câu chuyện
+ý nghĩa giá trị vai trò tầm quan trọng nguyên nhân hậu quả giải pháp biện pháp mục tiêu kết quả hiệu quả
+vấn đề thách thức cơ hội xu hướng quá trình hoạt động chương trình dự án kế hoạch chiến lược định hướng
+là của và có được trong cho với những các một này đó khi để từ như đã sẽ đang cũng rất nhiều hơn
+không thể cần phải nên vì nếu thì mà nhưng hoặc tuy nhiên ngoài ra bên cạnh đồng thời do đó vì vậy
+quan trọng cần thiết tích cực tiêu cực mạnh mẽ bền vững toàn diện sâu sắc rõ ràng cụ thể chung riêng
+tăng giảm thay đổi nâng cao cải thiện thúc đẩy hỗ trợ đóng góp xây dựng bảo đảm thực hiện áp dụng
+""".split()
+
+QUERY_KINDS = ('copy', 'paraphrase', 'mixed', 'original')
+
+
+# ===============================================
+# STUB MODELS
+# ===============================================
+
+_token_ids = {}
+
+
+def _token_id(token):
+    token_id = _token_ids.get(token)
+    if token_id is None:
+        # crc32, not hash(): ids must not change between processes
+        token_id = _token_ids[token] = zlib.crc32(token.encode('utf-8'))
+    return token_id
+
+
+class StubEncoder:
+    """
+    Deterministic bag-of-words encoder with the SentenceTransformer.encode()
+    interface: a text is the sum of fixed random vectors of its words, so
+    copied and lightly paraphrased text stays similar to its source.
+    """
+
+    def __init__(self, dim=768, buckets=16384, seed=0, block_size=512):
+        rng = np.random.default_rng(seed)
+        self.table = rng.standard_normal((buckets, dim), dtype=np.float32)
+        self.table /= np.linalg.norm(self.table, axis=1, keepdims=True)
+        self.dim = dim
+        self.block_size = block_size
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        buckets = len(self.table)
+        for start in range(0, len(texts), self.block_size):
+            block = [[_token_id(t) % buckets for t in text.lower().split()]
+                     for text in texts[start:start + self.block_size]]
+            counts = np.array([len(ids) for ids in block])
+            if not counts.any():
+                continue
+            # Sum each text's word vectors in one pass (texts without words stay zero)
+            flat_ids = np.fromiter((i for ids in block for i in ids), dtype=np.int64, count=int(counts.sum()))
+            vectors = self.table[flat_ids]
+            rows = np.flatnonzero(counts)
+            out[start + rows] = np.add.reduceat(vectors, np.r_[0, np.cumsum(counts)[:-1]][rows], axis=0)
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            norms[norms < 1e-8] = 1.0
+            out /= norms
+        return out[0] if single else out
+
+
+class StubTokenizer:
+    """Whitespace tokenizer with the parts of the Hugging Face tokenizer API the AI detector uses"""
+    is_fast = True
+    pad_token_id = 1
+
+    def __init__(self, vocab_size=64000):
+        self.vocab_size = vocab_size
+
+    def __call__(self, text, add_special_tokens=True, truncation=False, return_offsets_mapping=False, **kwargs):
+        ids, offsets = [], []
+        cursor = 0
+        for token in text.split():
+            begin = text.index(token, cursor)
+            cursor = begin + len(token)
+            ids.append(4 + _token_id(token) % (self.vocab_size - 4))
+            offsets.append((begin, cursor))
+        if add_special_tokens:
+            ids = self.build_inputs_with_special_tokens(ids)
+            offsets = [(0, 0)] + offsets + [(0, 0)]
+        enc = {'input_ids': ids, 'attention_mask': [1] * len(ids)}
+        if return_offsets_mapping:
+            enc['offset_mapping'] = offsets
+        return enc
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [0] + list(ids) + [2]
+
+
+def make_stub_classifier(vocab_size=64000, hidden=64, seed=0):
+    """Tiny torch sequence classifier: mean of token embeddings -> linear -> 2 logits"""
+    import torch
+    from types import SimpleNamespace
+
+    class StubClassifier(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            torch.manual_seed(seed)
+            self.embeddings = torch.nn.Embedding(vocab_size, hidden)
+            self.classifier = torch.nn.Linear(hidden, 2)
+            self.config = SimpleNamespace(pad_token_id=1)
+
+        def forward(self, input_ids, attention_mask):
+            mask = attention_mask.unsqueeze(-1).float()
+            pooled = (self.embeddings(input_ids) * mask).sum(1) / mask.sum(1).clamp(min=1.0)
+            return SimpleNamespace(logits=self.classifier(pooled))
+
+    return StubClassifier().eval()
+
+
+# ===============================================
+# SYNTHETIC CORPUS
+# ===============================================
+
+class TextGenerator:
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+
+    def sentence(self, min_words=8, max_words=22):
+        words = self.rng.choice(VOCAB, size=int(self.rng.integers(min_words, max_words + 1)))
+        return words[0].capitalize() + ' ' + ' '.join(words[1:]) + '.'
+
+    def document(self, min_sentences=6, max_sentences=25, long_ratio=0.1):
+        """Mostly short essays (sentence chunks); some long ones with paragraphs (paragraph chunks)"""
+        if self.rng.random() < long_ratio:
+            paragraphs = [' '.join(self.sentence() for _ in range(int(self.rng.integers(3, 8))))
+                          for _ in range(int(self.rng.integers(8, 16)))]
+            return '\n\n'.join(paragraphs)
+        return ' '.join(self.sentence() for _ in range(int(self.rng.integers(min_sentences, max_sentences + 1))))
+
+    def paraphrase(self, text, ratio=0.25):
+        words = text.split()
+        swap = self.rng.random(len(words)) < ratio
+        replacements = self.rng.choice(VOCAB, size=int(swap.sum()))
+        for i, word in zip(np.flatnonzero(swap), replacements):
+            words[i] = word
+        return ' '.join(words)
+
+    def query(self, kind, source_text):
+        sentences = [s.strip() + '.' for s in source_text.replace('\n', ' ').split('.') if s.strip()]
+        n = int(self.rng.integers(4, 13))
+        start = int(self.rng.integers(0, max(1, len(sentences) - n + 1)))
+        copied = ' '.join(sentences[start:start + n])
+        fresh = ' '.join(self.sentence() for _ in range(n))
+        if kind == 'copy':
+            return copied
+        if kind == 'paraphrase':
+            return self.paraphrase(copied)
+        if kind == 'mixed':
+            half = ' '.join(sentences[start:start + max(1, n // 2)])
+            return half + ' ' + ' '.join(self.sentence() for _ in range(n - n // 2))
+        return fresh
+
+
+def generate(out_dir, num_chunks, dim=768, num_queries=200, index_types=('flat',), seed=0):
+    """Write <out>/data/corpus_store, <out>/data/<faiss index files> and <out>/queries.json"""
+    import faiss
+    from corpus_store import build_store
+    from index_builder import build_index, index_path
+
+    out_dir = Path(out_dir)
+    data_dir = out_dir / 'data'
+    data_dir.mkdir(parents=True, exist_ok=True)
+    gen = TextGenerator(seed)
+    chunker = TextChunker()
+    encoder = StubEncoder(dim, seed=seed)
+
+    start = time.perf_counter()
+    docs, chunks = [], []
+    while len(chunks) < num_chunks:
+        doc = {'id': f"synth_{len(docs)}", 'title': f"Văn bản mẫu {len(docs)}",
+               'url': f"https://example.com/docs/{len(docs)}", 'text': gen.document()}
+        docs.append(doc)
+        chunks.extend(chunker.chunk_text(doc['text'], doc['id']))
+    print(f"   {len(docs)} documents, {len(chunks)} chunks generated in {time.perf_counter() - start:.1f}s")
+
+    # Embedded block by block into a memory map, then copied into the store
+    start = time.perf_counter()
+    tmp_path = data_dir / 'embeddings.tmp.npy'
+    embeddings = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(chunks), dim))
+    step = 8192
+    for i in range(0, len(chunks), step):
+        embeddings[i:i + step] = encoder.encode([c['text'] for c in chunks[i:i + step]], normalize_embeddings=True)
+    embeddings.flush()
+    manifest = build_store(docs, chunks, embeddings, [c['chunk_id'] for c in chunks], data_dir / 'corpus_store')
+    del embeddings
+    tmp_path.unlink()
+    print(f"   corpus store written in {time.perf_counter() - start:.1f}s")
+
+    store_embeddings = np.load(data_dir / 'corpus_store' / 'embeddings.npy', mmap_mode='r')
+    for index_type in index_types:
+        start = time.perf_counter()
+        faiss.write_index(build_index(index_type, store_embeddings), str(index_path(index_type, data_dir)))
+        print(f"   {index_type} index built in {time.perf_counter() - start:.1f}s")
+
+    queries = []
+    for i in range(num_queries):
+        kind = QUERY_KINDS[i % len(QUERY_KINDS)]
+        source = docs[int(gen.rng.integers(0, len(docs)))]
+        queries.append({'kind': kind, 'source_doc_id': source['id'] if kind != 'original' else None,
+                        'text': gen.query(kind, source['text'])})
+
+    dataset = {
+        'generator_version': GENERATOR_VERSION,
+        'seed': seed,
+        'dim': dim,
+        'num_docs': len(docs),
+        'num_chunks': len(chunks),
+        'num_queries': num_queries,
+        'index_types': list(index_types),
+        'store_version': manifest['version']
+    }
+    with open(out_dir / 'queries.json', 'w', encoding='utf-8') as f:
+        json.dump(queries, f, ensure_ascii=False)
+    with open(out_dir / 'dataset.json', 'w', encoding='utf-8') as f:
+        json.dump(dataset, f, indent=2)
+    return dataset
+
+
+# ===============================================
+# MEASUREMENT
+# ===============================================
+
+def measure(fn, inputs, warmup=3, items=None):
+    """
+    Call fn on every input once (after a few warm-up calls); items(input, output)
+    counts work units for throughput. Returns latency percentiles in ms and rates.
+    """
+    for x in inputs[:warmup]:
+        fn(x)
+    latencies, units = [], 0
+    start = time.perf_counter()
+    for x in inputs:
+        t = time.perf_counter()
+        out = fn(x)
+        latencies.append(time.perf_counter() - t)
+        if items is not None:
+            units += items(x, out)
+    total = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000
+    result = {
+        'calls': len(inputs),
+        'latency_ms_mean': round(float(ms.mean()), 3),
+        'latency_ms_p50': round(float(np.percentile(ms, 50)), 3),
+        'latency_ms_p90': round(float(np.percentile(ms, 90)), 3),
+        'latency_ms_p99': round(float(np.percentile(ms, 99)), 3),
+        'latency_ms_max': round(float(ms.max()), 3),
+        'calls_per_s': round(len(inputs) / total, 2)
+    }
+    if items is not None:
+        result['items'] = units
+        result['items_per_s'] = round(units / total, 1)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(data_dir, encoder='stub', ai_model=False, repeat=1, limit=None, use_faiss=True):
+    """Load the API on a generated corpus and time each stage; returns the report dict"""
+    data_dir = Path(data_dir)
+    with open(data_dir / 'dataset.json', 'r', encoding='utf-8') as f:
+        dataset = json.load(f)
+    with open(data_dir / 'queries.json', 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    if limit:
+        queries = queries[:limit]
+    queries = queries * repeat
+
+    # The API reads its configuration at import time
+    os.environ['PLAGIARISM_DATA_DIR'] = str(data_dir / 'data')
+    os.environ['PLAGIARISM_USE_FAISS'] = '1' if use_faiss else '0'
+    os.environ.setdefault('PLAGIARISM_EMBED_CACHE_SIZE', '0')
+    os.environ.setdefault('PLAGIARISM_RESULT_CACHE_SIZE', '0')
+    os.environ['AI_PRELOAD'] = '0'
+    os.environ['PLAGIARISM_CORPUS_DELTA'] = str(data_dir / 'corpus_delta')
+    if encoder == 'stub':
+        import inference_backends
+        inference_backends.load_bi_encoder = lambda *args, **kwargs: StubEncoder(dataset['dim'], seed=dataset['seed'])
+    import plagiarism_api as api
+
+    texts = [q['text'] for q in queries]
+    results = {}
+    print(f"Benchmarking {len(texts)} queries on {dataset['num_chunks']} chunks")
+
+    chunker = TextChunker()
+    results['chunk_text'] = measure(lambda t: chunker.chunk_text(t, 'query'), texts,
+                                    items=lambda _, chunks: len(chunks))
+    results['detect'] = measure(lambda t: api.complete_detector.detect(t), texts,
+                                items=lambda _, r: r['query_chunks'])
+    results['analyze_sentences'] = measure(lambda t: api.analyze_sentences(t), texts,
+                                           items=lambda _, r: len(r))
+
+    # Scorer alone, on the hits the detector's search returns for each query
+    detector = api.complete_detector
+    hit_lists = []
+    for t in texts:
+        chunks = chunker.chunk_text(t, 'query')[:detector.max_query_chunks]
+        if not chunks:
+            continue
+        q_emb = detector.encode([c['text'] for c in chunks])
+        rows = [list(range(len(chunks)))]
+        if detector.use_faiss and detector.chunk_faiss_index is not None:
+            scores, ids = detector._search_faiss(q_emb, rows, 100, detector.faiss_k or 100)[0]
+        else:
+            scores, ids = detector._search_exact(q_emb, rows, 100)[0]
+        hit_lists.append(list(zip(scores.tolist(), ids.tolist())))
+    results['calculate_doc_scores'] = measure(
+        lambda hits: api.doc_scorer.calculate_doc_scores(hits, top_n=15), hit_lists, items=lambda hits, _: len(hits)
+    )
+
+    if ai_model:
+        ai_classifier, ai_tokenizer, _ = api.load_ai_detector()
+    else:
+        ai_classifier, ai_tokenizer = make_stub_classifier(), StubTokenizer()
+    for mode in ('sentence', 'document'):
+        results[f'analyze_ai_with_windows[{mode}]'] = measure(
+            lambda t: api.analyze_ai_with_windows(t, ai_classifier, ai_tokenizer, mode=mode), texts,
+            items=lambda _, out: len(out[1])
+        )
+
+    # Answer quality on the synthetic set, so speedups that lose matches show up
+    found = [r['best_match'] is not None and r['best_match']['doc_id'] == q['source_doc_id']
+             for q, r in zip(queries, (detector.detect(q['text']) for q in queries)) if q['kind'] == 'copy']
+    results['copy_top1_accuracy'] = round(sum(found) / len(found), 4) if found else None
+
+    import faiss
+    import torch
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'faiss': getattr(faiss, '__version__', None),
+            'torch': torch.__version__,
+            'encoder': encoder,
+            'ai_model': api.AI_MODEL_BACKEND if ai_model else 'stub',
+            'index_type': api.FAISS_INDEX_TYPE,
+            'use_faiss': detector.use_faiss,
+            'dynamic_batching': api.DYNAMIC_BATCHING,
+            'queries': len(texts),
+            'dataset': dataset
+        },
+        'results': results
+    }
+
+
+# Lower is better for latencies, higher for rates and accuracy
+def _better_direction(metric):
+    return -1 if metric.startswith('latency') else 1
+
+
+def compare(before, after, fail_threshold=None, metrics=('latency_ms_p50', 'latency_ms_p99', 'items_per_s')):
+    """Per-benchmark relative change of the chosen metrics; returns (rows, regressions)"""
+    rows, regressions = [], []
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if not isinstance(new, dict) or not isinstance(old, dict):
+            continue
+        for metric in metrics:
+            if metric not in new or metric not in old or not old[metric]:
+                continue
+            change = (new[metric] - old[metric]) / old[metric] * 100
+            row = {'benchmark': name, 'metric': metric, 'before': old[metric], 'after': new[metric],
+                   'change_pct': round(change, 2)}
+            rows.append(row)
+            if fail_threshold is not None and change * _better_direction(metric) < -fail_threshold:
+                regressions.append(row)
+    old_acc, new_acc = before['results'].get('copy_top1_accuracy'), after['results'].get('copy_top1_accuracy')
+    if old_acc is not None and new_acc is not None and new_acc < old_acc:
+        regressions.append({'benchmark': 'copy_top1_accuracy', 'metric': 'accuracy',
+                            'before': old_acc, 'after': new_acc})
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline performance benchmark on a synthetic corpus')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('generate', help='Write a synthetic corpus, FAISS index and query set')
+    p.add_argument('--out', required=True)
+    p.add_argument('--chunks', type=int, default=10000, help='Corpus size in chunks (10k .. 5M)')
+    p.add_argument('--dim', type=int, default=768)
+    p.add_argument('--queries', type=int, default=200)
+    p.add_argument('--index-types', nargs='+', default=['flat'])
+    p.add_argument('--seed', type=int, default=0)
+
+    p = sub.add_parser('run', help='Time the pipeline stages on a generated corpus')
+    p.add_argument('--data', required=True, help='Directory written by generate')
+    p.add_argument('--out', default=None, help='Report path (default <data>/results.json)')
+    p.add_argument('--encoder', choices=['stub', 'model'], default='stub')
+    p.add_argument('--ai-model', action='store_true',
+                   help='Time the real AI detector (backend/model/detector_phobert) instead of the stub classifier')
+    p.add_argument('--index-type', default=None, help='FAISS index to search (default: PLAGIARISM_INDEX_TYPE or flat)')
+    p.add_argument('--exact', action='store_true', help='Brute-force search instead of FAISS')
+    p.add_argument('--limit', type=int, default=None, help='Use only the first N queries')
+    p.add_argument('--repeat', type=int, default=1)
+
+    p = sub.add_parser('compare', help='Diff two reports')
+    p.add_argument('before')
+    p.add_argument('after')
+    p.add_argument('--fail-threshold', type=float, default=None,
+                   help='Exit 1 when a metric gets worse by more than this many percent')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        dataset = generate(args.out, args.chunks, args.dim, args.queries, args.index_types, args.seed)
+        print(f"✅ Synthetic corpus in {args.out}: {dataset['num_docs']} documents, {dataset['num_chunks']} chunks")
+    elif args.command == 'run':
+        if args.index_type:
+            os.environ['PLAGIARISM_INDEX_TYPE'] = args.index_type
+        report = run(args.data, args.encoder, args.ai_model, args.repeat, args.limit, use_faiss=not args.exact)
+        out = Path(args.out) if args.out else Path(args.data) / 'results.json'
+        with open(out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        for name, row in report['results'].items():
+            if isinstance(row, dict):
+                print(f"   {name:34s} p50={row['latency_ms_p50']:9.3f}ms p99={row['latency_ms_p99']:9.3f}ms "
+                      f"{row.get('items_per_s', row['calls_per_s'])}/s")
+        print(f"   copy_top1_accuracy {report['results']['copy_top1_accuracy']}")
+        print(f"✅ Report written to {out}")
+    else:
+        with open(args.before, 'r', encoding='utf-8') as f:
+            before = json.load(f)
+        with open(args.after, 'r', encoding='utf-8') as f:
+            after = json.load(f)
+        rows, regressions = compare(before, after, args.fail_threshold)
+        print(json.dumps({'changes': rows, 'regressions': regressions}, indent=2))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
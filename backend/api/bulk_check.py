@@ -0,0 +1,179 @@
+"""
+Streaming bulk plagiarism check for a whole class of submissions
+Documents come in as JSON lines ({"id": ..., "text": ...}) and flow through a
+generator pipeline: parse -> batch -> detect (chunking, one encoder pass and
+one index search per batch, vectorized scoring) -> one NDJSON result line per
+document, in input order. Only a few batches are in flight at a time, so
+memory stays bounded however large the input is, and two batches overlap so
+encoding one batch runs next to scoring the other.
+
+The CLI writes a checkpoint (<output>.ckpt) after every batch and can resume
+an interrupted run where it stopped. The same pipeline backs
+POST /api/bulk-check in plagiarism_api.py.
+
+Usage:
+    python backend/api/bulk_check.py submissions.jsonl -o results.ndjson
+    python backend/api/bulk_check.py submissions.jsonl -o results.ndjson --resume
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def read_documents(lines, start_index=0):
+    """
+    Parse JSON lines into (index, document) pairs; blank lines are skipped.
+    Lines may be (end_offset, line) pairs, the offset is then kept in '_offset'
+    for checkpoints. Unreadable lines yield {'_error': ...} instead of stopping the run.
+    """
+    index = start_index
+    for line in lines:
+        offset = None
+        if isinstance(line, tuple):
+            offset, line = line
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            doc = json.loads(line)
+            if not isinstance(doc, dict):
+                raise ValueError('each line must be a JSON object')
+            if not isinstance(doc.get('text'), str) or not doc['text'].strip():
+                doc = {'id': doc.get('id'), '_error': 'Missing or empty "text"'}
+        except ValueError as e:
+            doc = {'id': None, '_error': f'Invalid JSON line: {e}'}
+        doc['_offset'] = offset
+        yield index, doc
+        index += 1
+
+
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _check_batch(batch, check_texts):
+    valid = [doc['text'] for _, doc in batch if '_error' not in doc]
+    results = iter(check_texts(valid) if valid else [])
+    records = []
+    for index, doc in batch:
+        record = {'index': index, 'id': doc.get('id')}
+        if '_error' in doc:
+            record['error'] = doc['_error']
+        else:
+            record.update(next(results))
+        records.append(record)
+    return records, batch[-1][1].get('_offset')
+
+
+def run_pipeline(documents, check_texts, batch_size=32, max_in_flight=2):
+    """
+    Check (index, document) pairs batch by batch. check_texts(texts) returns one
+    result dict per text. Yields (records, end_offset) per batch, in input
+    order; at most max_in_flight batches are being checked at the same time.
+    """
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='bulk') as pool:
+        pending = deque()
+        for batch in batched(documents, batch_size):
+            pending.append(pool.submit(_check_batch, batch, check_texts))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def to_ndjson(record):
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+# ===============================================
+# CLI
+# ===============================================
+
+def _lines_with_offsets(f):
+    """(end offset, line) for every line of a binary file"""
+    offset = f.tell()
+    for line in iter(f.readline, b''):
+        offset += len(line)
+        yield offset, line
+
+
+def _load_checkpoint(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a JSON-lines file of submissions against the corpus')
+    parser.add_argument('input', help='JSON lines, one {"id": ..., "text": ...} per line')
+    parser.add_argument('-o', '--output', required=True, help='NDJSON results, one line per document')
+    parser.add_argument('--resume', action='store_true', help='Continue from <output>.ckpt')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--in-flight', type=int, default=2, help='Batches checked concurrently')
+    parser.add_argument('--sentences', action='store_true', help='Include sentence-level analysis')
+    parser.add_argument('--prune', default='none', choices=['none', 'threshold', 'top_n'])
+    args = parser.parse_args()
+
+    checkpoint_path = Path(f"{args.output}.ckpt")
+    state = {'input': str(Path(args.input).resolve()), 'input_offset': 0, 'output_bytes': 0, 'done': 0}
+    if args.resume and checkpoint_path.exists():
+        saved = _load_checkpoint(checkpoint_path)
+        if saved.get('input') != state['input']:
+            raise SystemExit(f"{checkpoint_path} belongs to {saved.get('input')}, not {state['input']}")
+        state = saved
+        print(f"Resuming after {state['done']} documents", file=sys.stderr)
+    elif checkpoint_path.exists() and not args.resume:
+        raise SystemExit(f"{checkpoint_path} exists: pass --resume to continue, or delete it to start over")
+
+    # Loads the corpus, index and encoder (same configuration as the API)
+    import plagiarism_api
+
+    def check_texts(texts):
+        return [plagiarism_api.format_detection(result, sentence_analysis)
+                for result, sentence_analysis in plagiarism_api.analyze_documents(
+                    texts, prune=args.prune, sentences=args.sentences)]
+
+    start = time.perf_counter()
+    done_at_start = state['done']
+    with open(args.input, 'rb') as f_in, open(args.output, 'ab') as f_out:
+        # Drop anything written after the last checkpoint (e.g. a torn line)
+        f_out.truncate(state['output_bytes'])
+        f_in.seek(state['input_offset'])
+        documents = read_documents(_lines_with_offsets(f_in), start_index=state['done'])
+        for records, end_offset in run_pipeline(documents, check_texts, args.batch_size, args.in_flight):
+            f_out.write(''.join(to_ndjson(r) for r in records).encode('utf-8'))
+            f_out.flush()
+            os.fsync(f_out.fileno())
+            state.update(input_offset=end_offset, output_bytes=f_out.tell(), done=state['done'] + len(records))
+            _save_checkpoint(checkpoint_path, state)
+            elapsed = time.perf_counter() - start
+            rate = (state['done'] - done_at_start) / elapsed if elapsed else 0.0
+            print(f"   {state['done']} documents checked ({rate:.1f} docs/s)", file=sys.stderr)
+
+    checkpoint_path.unlink(missing_ok=True)
+    print(f"✅ {state['done']} results written to {args.output} in {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
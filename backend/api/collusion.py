@@ -0,0 +1,242 @@
+"""
+Submission-vs-submission collusion detection
+Finds students who copied from each other within one assignment, which the
+corpus check cannot see. The submissions are chunked and embedded once and
+every chunk is joined against the chunks of all other submissions: with an
+exact FAISS flat search for classes up to exact_max_chunks chunks, and an
+HNSW graph above that (no dense n x n matrix is ever held). Each pair is scored
+with the same DocumentScorer features as a corpus match, and pairs above the
+threshold are grouped into clusters (connected components).
+
+Usage:
+    python backend/api/collusion.py submissions.jsonl -o collusion_report.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import faiss
+
+from corpus_store import CorpusIndex
+from index_builder import build_index
+from live_corpus import prepare_documents, read_document_file
+
+
+class CollusionDetector:
+    def __init__(self, encode, chunker, make_scorer, threshold=0.6, min_similarity=0.5,
+                 k=20, exact_max_chunks=20000, ef_search=128, batch_size=256):
+        """
+        encode(texts) -> L2-normalized float32 rows
+        make_scorer(chunks, corpus_index) -> DocumentScorer over the submissions
+        min_similarity: chunk pairs below it are not considered evidence
+        k: neighbours fetched per chunk in the join
+        """
+        self.encode = encode
+        self.chunker = chunker
+        self.make_scorer = make_scorer
+        self.threshold = threshold
+        self.min_similarity = min_similarity
+        self.k = k
+        self.exact_max_chunks = exact_max_chunks
+        self.ef_search = ef_search
+        self.batch_size = batch_size
+
+    def detect(self, submissions, threshold=None, max_pairs=None):
+        """
+        submissions: [{"id": ..., "text": ...}]. Raises ValueError on bad input.
+        Returns {'pairs': [...], 'clusters': [...], 'stats': {...}}; pairs are
+        sorted by score and only those reaching the threshold are returned.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        timings = {}
+        start = time.perf_counter()
+        docs, chunk_lists = prepare_documents(submissions, self.chunker)
+        chunks = [{**chunk, 'doc_id': doc['id']} for doc, doc_chunks in zip(docs, chunk_lists) for chunk in doc_chunks]
+        corpus_index = CorpusIndex.from_chunks(chunks, docs)
+        timings['chunk_s'] = time.perf_counter() - start
+
+        t = time.perf_counter()
+        texts = [chunk['text'] for chunk in chunks]
+        blocks = [self.encode(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        embeddings = np.ascontiguousarray(np.vstack(blocks), dtype=np.float32) if blocks else None
+        timings['encode_s'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        join = 'exact' if len(chunks) <= self.exact_max_chunks else 'hnsw'
+        edges = self._join(embeddings, corpus_index.chunk_doc_idx, join) if embeddings is not None else None
+        timings['join_s'] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        pairs = self._score_pairs(edges, chunks, corpus_index, threshold) if edges is not None else []
+        clusters = self._clusters(pairs)
+        timings['score_s'] = time.perf_counter() - t
+
+        return {
+            'pairs': pairs[:max_pairs] if max_pairs else pairs,
+            'clusters': clusters,
+            'stats': {
+                'submissions': len(docs),
+                'chunks': len(chunks),
+                'join': join,
+                'candidate_chunk_pairs': 0 if edges is None else len(edges[0]),
+                'suspicious_pairs': len(pairs),
+                'threshold': threshold,
+                **{key: round(value, 3) for key, value in timings.items()},
+                'total_s': round(time.perf_counter() - start, 3)
+            }
+        }
+
+    def _join(self, embeddings, chunk_doc, join):
+        """
+        k-NN self-join over all chunks. Returns (query chunk, target chunk, similarity)
+        arrays of the up to k best pairs per query chunk from other submissions
+        reaching min_similarity.
+        """
+        if join == 'exact':
+            index = faiss.IndexFlatIP(embeddings.shape[1])
+            index.add(embeddings)
+        else:
+            index = build_index('hnsw', embeddings)
+        chunk_doc = np.asarray(chunk_doc)
+        # The chunks of a query's own submission (itself included) may all rank
+        # above its first cross-submission neighbour, so they are fetched on top of k
+        fetch = np.minimum(self.k + np.bincount(chunk_doc)[chunk_doc], len(embeddings))
+
+        queries, targets, similarities = [], [], []
+        for k in np.unique(fetch):
+            rows = np.flatnonzero(fetch == k)
+            if join != 'exact':
+                index.hnsw.efSearch = max(self.ef_search, int(k))
+            sims, ids = index.search(embeddings[rows], int(k))
+            cross = (ids >= 0) & (sims >= self.min_similarity) & (chunk_doc[ids] != chunk_doc[rows][:, None])
+            # Neighbours come sorted by similarity: keep the first k cross pairs of every row
+            cross &= np.cumsum(cross, axis=1) <= self.k
+            queries.append(np.broadcast_to(rows[:, None], ids.shape)[cross])
+            targets.append(ids[cross])
+            similarities.append(sims[cross])
+        return np.concatenate(queries), np.concatenate(targets), np.concatenate(similarities)
+
+    def _score_pairs(self, edges, chunks, corpus_index, threshold):
+        """Score every submission against the submissions its chunks matched, as a corpus check would"""
+        query, target, sims = edges
+        scorer = self.make_scorer(chunks, corpus_index)
+        chunk_doc = np.asarray(corpus_index.chunk_doc_idx)
+        doc_ids = corpus_index.doc_ids
+
+        # Group edges by the querying submission
+        query_doc = chunk_doc[query]
+        order = np.lexsort((-sims, query_doc))
+        query, target, sims, query_doc = query[order], target[order], sims[order], query_doc[order]
+        starts = np.flatnonzero(np.r_[True, query_doc[1:] != query_doc[:-1]]) if len(query_doc) else []
+        ends = np.r_[starts[1:], len(query_doc)] if len(query_doc) else []
+
+        best = {}
+        for s, e in zip(starts, ends):
+            # Best similarity per target chunk across the submission's chunks
+            # (hits are sorted by similarity, so the first occurrence wins)
+            target_ids, first = np.unique(target[s:e], return_index=True)
+            hit_sims = sims[s:e][first]
+            source = query[s:e][first]
+            rank = np.argsort(-hit_sims, kind='stable')
+            source_of = dict(zip(target_ids.tolist(), source.tolist()))
+            doc_a = doc_ids[query_doc[s]]
+            for doc_score in scorer.calculate_doc_scores_arrays(hit_sims[rank], target_ids[rank],
+                                                                prune='threshold', min_score=threshold):
+                if doc_score['final_score'] < threshold:
+                    break
+                doc_b = doc_score['doc_id']
+                key = (doc_a, doc_b) if doc_a < doc_b else (doc_b, doc_a)
+                direction = f"{doc_a}->{doc_b}"
+                entry = best.setdefault(key, {'scores': {}})
+                entry['scores'][direction] = round(doc_score['final_score'], 4)
+                if doc_score['final_score'] > entry.get('score', -1.0):
+                    entry.update(self._pair_detail(doc_score, source_of, chunks, swap=key[0] != doc_a))
+
+        pairs = [{'doc_a': a, 'doc_b': b, **entry} for (a, b), entry in best.items()]
+        pairs.sort(key=lambda p: (-p['score'], p['doc_a'], p['doc_b']))
+        return pairs
+
+    @staticmethod
+    def _pair_detail(doc_score, source_of, chunks, swap=False, max_matches=3):
+        """Features of the best-scoring direction; text_a / text_b always belong to doc_a / doc_b"""
+        matches = []
+        for c in doc_score['chunks'][:max_matches]:
+            texts = (chunks[source_of[c['chunk_idx']]]['text'], c['chunk']['text'])
+            if swap:
+                texts = texts[::-1]
+            matches.append({'similarity': round(c['similarity'], 4), 'text_a': texts[0], 'text_b': texts[1]})
+        return {
+            'score': round(doc_score['final_score'], 4),
+            'doc_max': round(doc_score['doc_max'], 4),
+            'doc_mean': round(doc_score['doc_mean'], 4),
+            'coverage': round(doc_score['doc_count'], 4),
+            'doc_contiguous': round(doc_score['doc_contiguous'], 4),
+            'num_chunks': doc_score['num_chunks'],
+            'matches': matches
+        }
+
+    @staticmethod
+    def _clusters(pairs):
+        """Connected components of the suspicious-pair graph, largest first"""
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for pair in pairs:
+            root_a, root_b = find(pair['doc_a']), find(pair['doc_b'])
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+        groups = {}
+        for pair in pairs:
+            groups.setdefault(find(pair['doc_a']), []).append(pair)
+        clusters = []
+        for members_pairs in groups.values():
+            members = sorted({p['doc_a'] for p in members_pairs} | {p['doc_b'] for p in members_pairs})
+            scores = [p['score'] for p in members_pairs]
+            clusters.append({
+                'members': members,
+                'size': len(members),
+                'num_pairs': len(members_pairs),
+                'max_score': max(scores),
+                'mean_score': round(float(np.mean(scores)), 4)
+            })
+        clusters.sort(key=lambda c: (-c['size'], -c['max_score']))
+        return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find submissions copied from each other')
+    parser.add_argument('input', help='JSON list or JSON lines of {"id": ..., "text": ...}')
+    parser.add_argument('-o', '--output', required=True, help='JSON report path')
+    parser.add_argument('--threshold', type=float, default=None, help='Pair score threshold (default: detector threshold)')
+    parser.add_argument('--k', type=int, default=20, help='Neighbours per chunk in the join')
+    parser.add_argument('--exact-max-chunks', type=int, default=20000, help='Above this, join with HNSW')
+    args = parser.parse_args()
+
+    submissions = read_document_file(args.input)
+
+    # Same encoder, chunker and scoring weights as the API
+    import plagiarism_api
+    detector = plagiarism_api.collusion_detector
+    detector.k = args.k
+    detector.exact_max_chunks = args.exact_max_chunks
+    report = detector.detect(submissions, threshold=args.threshold)
+
+    stats = report['stats']
+    print(f"✅ {stats['submissions']} submissions, {stats['chunks']} chunks ({stats['join']} join): "
+          f"{stats['suspicious_pairs']} suspicious pairs in {len(report['clusters'])} clusters, {stats['total_s']}s")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✅ Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+"""
+Compact, memory-mapped corpus store for the plagiarism API
+Replaces json/pickle loading of the corpus at startup: every column is a
+flat file that is mmap'd on first access, so several worker processes share
+the same page cache instead of each holding its own Python objects.
+
+Layout of data/corpus_store/:
+    manifest.json                          counts, dim and store version
+    embeddings.npy                         float32 [n_chunks, dim]
+    chunk_doc_idx.npy                      int32 [n_chunks] row of the owning document
+    chunk_position.npy / chunk_length.npy  int32 [n_chunks]
+    chunk_text.bin + chunk_text.offsets.npy   utf-8 blob + int64 offsets [n+1]
+    chunk_id.bin   + chunk_id.offsets.npy
+    doc_id.bin     + doc_id.offsets.npy
+    doc_text.bin   + doc_text.offsets.npy
+    doc_meta.bin   + doc_meta.offsets.npy     one JSON object per document (no 'text')
+    doc_chunk_order.npy / doc_chunk_offsets.npy   chunk rows grouped by document (see CorpusIndex)
+
+Build it once from the notebook artifacts:
+    python backend/api/corpus_store.py build
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import shutil
+import time
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+STORE_DIR = DATA_DIR / 'corpus_store'
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+class StringColumn(Sequence):
+    """Variable-length utf-8 strings: one mmap'd blob plus an offsets array"""
+
+    def __init__(self, blob_file, offsets):
+        self.offsets = offsets
+        size = blob_file.seek(0, 2)
+        self._blob = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._blob[int(self.offsets[i]):int(self.offsets[i + 1])].decode('utf-8')
+
+    @staticmethod
+    def write(values, blob_path, offsets_path):
+        encoded = [v.encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        with open(blob_path, 'wb') as f:
+            for b in encoded:
+                f.write(b)
+        np.save(offsets_path, offsets)
+
+
+class ChunkSequence(Sequence):
+    """Read-only view with the same dict shape as the corpus_chunks.pkl entries"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.num_chunks
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        store = self.store
+        return {
+            'chunk_id': store.chunk_id[i],
+            'doc_id': store.doc_id[int(store.chunk_doc_idx[i])],
+            'text': store.chunk_text[i],
+            'position': int(store.chunk_position[i]),
+            'length': int(store.chunk_length[i])
+        }
+
+
+class DocumentSequence(Sequence):
+    """Read-only view with the same dict shape as vn_plagiarism_corpus.json entries"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.num_docs
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        doc = json.loads(self.store.doc_meta[i])
+        doc['id'] = self.store.doc_id[i]
+        doc['text'] = self.store.doc_text[i]
+        return doc
+
+
+class DocumentMetadataMap(Mapping):
+    """doc_id -> document dict, decoded on access (replaces doc_metadata_map)"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, doc_id):
+        return self.store.docs[self.store.doc_row[doc_id]]
+
+    def __contains__(self, doc_id):
+        return doc_id in self.store.doc_row
+
+    def __iter__(self):
+        return iter(self.store.doc_row)
+
+    def __len__(self):
+        return self.store.num_docs
+
+
+class CorpusStore:
+    def __init__(self, path=STORE_DIR):
+        self.path = Path(path)
+        # Columns are opened relative to this directory handle, so a store
+        # swapped out by compaction keeps serving its own generation
+        self._dir_fd = os.open(self.path, os.O_RDONLY) if os.open in os.supports_dir_fd else None
+        with self._open(MANIFEST) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported corpus store format: {self.manifest.get('format_version')}")
+        self.num_chunks = self.manifest['num_chunks']
+        self.num_docs = self.manifest['num_docs']
+        self.version = self.manifest['version']
+
+    def __del__(self):
+        if getattr(self, '_dir_fd', None) is not None:
+            os.close(self._dir_fd)
+
+    @staticmethod
+    def exists(path=STORE_DIR):
+        return (Path(path) / MANIFEST).is_file()
+
+    # Columns are opened lazily and only mapped, never read up front
+    @cached_property
+    def embeddings(self):
+        return self._array('embeddings.npy')
+
+    @cached_property
+    def chunk_doc_idx(self):
+        return self._array('chunk_doc_idx.npy')
+
+    @cached_property
+    def chunk_position(self):
+        return self._array('chunk_position.npy')
+
+    @cached_property
+    def chunk_length(self):
+        return self._array('chunk_length.npy')
+
+    @cached_property
+    def chunk_text(self):
+        return self._strings('chunk_text')
+
+    @cached_property
+    def chunk_id(self):
+        return self._strings('chunk_id')
+
+    @cached_property
+    def doc_id(self):
+        return self._strings('doc_id')
+
+    @cached_property
+    def doc_text(self):
+        return self._strings('doc_text')
+
+    @cached_property
+    def doc_meta(self):
+        return self._strings('doc_meta')
+
+    @cached_property
+    def doc_row(self):
+        return {doc_id: i for i, doc_id in enumerate(self.doc_id)}
+
+    @cached_property
+    def doc_chunk_layout(self):
+        """(chunk_order, doc_offsets) as written by build_store, or None for stores without them"""
+        try:
+            return self._array('doc_chunk_order.npy'), self._array('doc_chunk_offsets.npy')
+        except FileNotFoundError:
+            return None
+
+    @cached_property
+    def chunks(self):
+        return ChunkSequence(self)
+
+    @cached_property
+    def docs(self):
+        return DocumentSequence(self)
+
+    @cached_property
+    def doc_metadata(self):
+        return DocumentMetadataMap(self)
+
+    def _open(self, name):
+        if self._dir_fd is None:
+            return open(self.path / name, 'rb')
+        return open(name, 'rb', opener=lambda path, flags: os.open(path, flags, dir_fd=self._dir_fd))
+
+    def _array(self, name):
+        """Memory-map a .npy file (np.load(mmap_mode='r') only takes paths, not our dir_fd handles)"""
+        with self._open(name) as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if not np.prod(shape):
+                return np.empty(shape, dtype=dtype)
+            return np.memmap(f, dtype=dtype, mode='r', shape=shape, order='F' if fortran_order else 'C',
+                             offset=f.tell())
+
+    def _strings(self, name):
+        with self._open(f'{name}.bin') as f:
+            return StringColumn(f, self._array(f'{name}.offsets.npy'))
+
+
+def artifact_fingerprint(*paths):
+    """Cheap version string for files on disk (name + size + mtime, independent of the working directory)"""
+    digest = hashlib.sha1()
+    for path in paths:
+        name = os.path.basename(path)
+        try:
+            st = os.stat(path)
+            digest.update(f"{name}:{st.st_size}:{st.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(f"{name}:missing".encode())
+    return digest.hexdigest()[:16]
+
+
+# Notebook artifacts the API loads when there is no corpus store
+LEGACY_FILES = ('vn_plagiarism_corpus.json', 'corpus_chunks.pkl', 'chunk_embeddings_normalized.npy', 'chunk_metadata.pkl')
+
+
+def legacy_corpus_version(data_dir=DATA_DIR):
+    return artifact_fingerprint(*(Path(data_dir) / name for name in LEGACY_FILES))
+
+
+def compute_doc_chunk_layout(chunk_doc_idx, chunk_position, num_docs):
+    """
+    Group chunk rows by document: chunk_order lists rows sorted by
+    (document, position) and the chunks of document d are
+    chunk_order[doc_offsets[d]:doc_offsets[d + 1]].
+    """
+    chunk_order = np.lexsort((chunk_position, chunk_doc_idx)).astype(np.int64)
+    counts = np.bincount(chunk_doc_idx, minlength=num_docs) if len(chunk_doc_idx) else np.zeros(num_docs, dtype=np.int64)
+    doc_offsets = np.zeros(num_docs + 1, dtype=np.int64)
+    np.cumsum(counts, out=doc_offsets[1:])
+    return chunk_order, doc_offsets
+
+
+class CorpusIndex:
+    """
+    Single shared lookup structure over the corpus chunks, used by
+    DocumentScorer, ContextExpander and the API instead of each building
+    its own chunk/doc dicts. Everything is array-backed: per-chunk document
+    row and position, plus doc -> chunk-range offsets into chunk_order.
+    """
+
+    def __init__(self, doc_ids, chunk_doc_idx, chunk_position, doc_row=None,
+                 chunk_order=None, doc_offsets=None, doc_chunk_counts=None):
+        self.doc_ids = doc_ids
+        self._doc_row = doc_row
+        self.chunk_doc_idx = chunk_doc_idx
+        self.chunk_position = chunk_position
+        if chunk_order is None or doc_offsets is None:
+            chunk_order, doc_offsets = compute_doc_chunk_layout(chunk_doc_idx, chunk_position, len(doc_ids))
+        self.chunk_order = chunk_order
+        self.doc_offsets = doc_offsets
+        self.doc_chunk_counts = doc_chunk_counts if doc_chunk_counts is not None else np.diff(doc_offsets)
+
+    @property
+    def doc_row(self):
+        """doc_id -> row, built on first use (doc_row may also be passed as a callable returning it)"""
+        if self._doc_row is None:
+            self._doc_row = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        elif callable(self._doc_row):
+            self._doc_row = self._doc_row()
+        return self._doc_row
+
+    @classmethod
+    def from_chunks(cls, corpus_chunks, corpus_data=()):
+        """Build from in-memory corpus_chunks (dicts) and corpus_data"""
+        doc_ids = [doc['id'] for doc in corpus_data]
+        doc_row = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        chunk_doc_idx = np.empty(len(corpus_chunks), dtype=np.int32)
+        chunk_position = np.empty(len(corpus_chunks), dtype=np.int32)
+        for i, chunk in enumerate(corpus_chunks):
+            row = doc_row.get(chunk['doc_id'])
+            if row is None:
+                row = doc_row[chunk['doc_id']] = len(doc_ids)
+                doc_ids.append(chunk['doc_id'])
+            chunk_doc_idx[i] = row
+            chunk_position[i] = chunk['position']
+        return cls(doc_ids, chunk_doc_idx, chunk_position, doc_row=doc_row)
+
+    @classmethod
+    def from_store(cls, store):
+        """Wrap the store's mmap'd columns without copying them"""
+        chunk_order, doc_offsets = store.doc_chunk_layout or (None, None)
+        return cls(store.doc_id, store.chunk_doc_idx, store.chunk_position, doc_row=lambda: store.doc_row,
+                   chunk_order=chunk_order, doc_offsets=doc_offsets)
+
+    def doc_chunk_indices(self, doc_row):
+        """Chunk rows of a document, sorted by position"""
+        return self.chunk_order[self.doc_offsets[doc_row]:self.doc_offsets[doc_row + 1]]
+
+
+def build_store(corpus_data, corpus_chunks, embeddings, chunk_ids, out_dir=STORE_DIR):
+    """
+    Build the store from the in-memory notebook artifacts next to out_dir and
+    swap it in: files of a store that processes have mapped are never rewritten.
+    """
+    out_dir = Path(out_dir)
+    staging = out_dir.with_name(out_dir.name + '.new')
+    manifest = write_store(corpus_data, corpus_chunks, embeddings, chunk_ids, staging)
+    swap_store(staging, out_dir)
+    return manifest
+
+
+def swap_store(staging, store_dir):
+    """Rename staging to store_dir; the previous store is kept as <store_dir>.old until the next swap"""
+    staging, store_dir = Path(staging), Path(store_dir)
+    previous = store_dir.with_name(store_dir.name + '.old')
+    if previous.exists():
+        shutil.rmtree(previous)
+    if store_dir.exists():
+        os.rename(store_dir, previous)
+    os.rename(staging, store_dir)
+
+
+def write_store(corpus_data, corpus_chunks, embeddings, chunk_ids, out_dir):
+    """Write a complete store into out_dir, which is emptied first (never a store in use)"""
+    out_dir = Path(out_dir)
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+
+    if len(corpus_chunks) != len(embeddings) or len(chunk_ids) != len(embeddings):
+        raise ValueError(f"Size mismatch: {len(corpus_chunks)} chunks, {len(chunk_ids)} chunk ids, "
+                         f"{len(embeddings)} embeddings")
+    for i, chunk in enumerate(corpus_chunks):
+        if chunk['chunk_id'] != chunk_ids[i]:
+            raise ValueError(f"Chunk {i} is '{chunk['chunk_id']}' but chunk_metadata.pkl has '{chunk_ids[i]}'")
+
+    docs = [dict(doc) for doc in corpus_data]
+    doc_row = {doc['id']: i for i, doc in enumerate(docs)}
+    for chunk in corpus_chunks:
+        if chunk['doc_id'] not in doc_row:
+            doc_row[chunk['doc_id']] = len(docs)
+            docs.append({'id': chunk['doc_id'], 'text': ''})
+
+    np.save(out_dir / 'embeddings.npy', np.ascontiguousarray(embeddings, dtype=np.float32))
+    np.save(out_dir / 'chunk_doc_idx.npy', np.array([doc_row[c['doc_id']] for c in corpus_chunks], dtype=np.int32))
+    np.save(out_dir / 'chunk_position.npy', np.array([c['position'] for c in corpus_chunks], dtype=np.int32))
+    np.save(out_dir / 'chunk_length.npy', np.array([c['length'] for c in corpus_chunks], dtype=np.int32))
+    chunk_order, doc_offsets = compute_doc_chunk_layout(
+        np.load(out_dir / 'chunk_doc_idx.npy'), np.load(out_dir / 'chunk_position.npy'), len(docs)
+    )
+    np.save(out_dir / 'doc_chunk_order.npy', chunk_order)
+    np.save(out_dir / 'doc_chunk_offsets.npy', doc_offsets)
+
+    def write_strings(name, values):
+        StringColumn.write(values, out_dir / f'{name}.bin', out_dir / f'{name}.offsets.npy')
+
+    write_strings('chunk_text', (c['text'] for c in corpus_chunks))
+    write_strings('chunk_id', (c['chunk_id'] for c in corpus_chunks))
+    write_strings('doc_id', (d['id'] for d in docs))
+    write_strings('doc_text', (d.get('text') or '' for d in docs))
+    write_strings('doc_meta', (json.dumps({k: v for k, v in d.items() if k not in ('id', 'text')},
+                                          ensure_ascii=False) for d in docs))
+
+    digest = hashlib.sha1()
+    digest.update(np.load(out_dir / 'chunk_text.offsets.npy').tobytes())
+    digest.update(str((len(corpus_chunks), len(docs), time.time())).encode())
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': digest.hexdigest()[:16],
+        'num_chunks': len(corpus_chunks),
+        'num_docs': len(docs),
+        'dim': int(embeddings.shape[1]),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    # Manifest last: a store without one is treated as absent
+    with open(out_dir / MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the memory-mapped corpus store')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--out', default=None, help='Output directory (default <data-dir>/corpus_store)')
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    with open(data_dir / 'vn_plagiarism_corpus.json', 'r', encoding='utf-8') as f:
+        corpus_data = json.load(f)
+    with open(data_dir / 'corpus_chunks.pkl', 'rb') as f:
+        corpus_chunks = pickle.load(f)
+    with open(data_dir / 'chunk_metadata.pkl', 'rb') as f:
+        chunk_ids = pickle.load(f)['chunk_ids']
+    embeddings = np.load(data_dir / 'chunk_embeddings_normalized.npy', mmap_mode='r')
+
+    manifest = build_store(corpus_data, corpus_chunks, embeddings, chunk_ids,
+                           Path(args.out) if args.out else data_dir / 'corpus_store')
+    print(f"✅ Corpus store written: {manifest['num_docs']} documents, "
+          f"{manifest['num_chunks']} chunks (version {manifest['version']})")
+
+
+if __name__ == '__main__':
+    main()
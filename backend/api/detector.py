@@ -0,0 +1,591 @@
+"""
+Corpus plagiarism detection (from the notebook): DocumentScorer turns chunk
+hits into document features and scores, ContextExpander picks the best chunk
+per document and CompletePlagiarismDetector chunks, encodes and searches
+query texts. The API builds them over the loaded corpus.
+"""
+
+import numpy as np
+
+from corpus_store import CorpusIndex
+from metrics import stage
+from sharding import track_missing_shards
+from text_chunker import TextChunker
+
+# Document pruning modes for DocumentScorer / detect(prune=...)
+PRUNE_MODES = ('none', 'threshold', 'top_n')
+
+
+class DocumentScorer:
+    def __init__(self, corpus_chunks, weights=None, score_center=0.55, score_scale=4.0, corpus_index=None):
+        self.corpus_chunks = corpus_chunks
+        self.corpus_index = corpus_index or CorpusIndex.from_chunks(corpus_chunks)
+        self.weights = weights or {
+            'doc_max': 0.40,
+            'doc_mean': 0.20,
+            'doc_count': 0.15,
+            'doc_contiguous': 0.10,
+            'doc_coverage': 0.10,
+            'chunk_density': 0.05,
+            'span_penalty': 0.05,
+            # Best shingle containment of the document's hits (lexical_index.py); off by default
+            'doc_lexical': 0.0
+        }
+        self.score_center = score_center
+        self.score_scale = score_scale
+
+    def calculate_doc_scores(self, top_k_results, top_n=None, prune=None, min_score=None):
+        """top_k_results: list of (similarity, chunk_idx) pairs"""
+        if len(top_k_results) == 0:
+            return []
+        similarities, chunk_indices = zip(*top_k_results)
+        return self.calculate_doc_scores_arrays(similarities, chunk_indices, top_n=top_n,
+                                                prune=prune, min_score=min_score)
+
+    def calculate_doc_scores_arrays(self, similarities, chunk_indices, top_n=None, prune=None, min_score=None,
+                                    lexical=None):
+        """
+        Vectorized document scoring. Hits are grouped by document with one sort
+        and every feature is reduced per group with np.*.reduceat. Only the
+        top_n documents returned (all when None) get their chunk detail
+        materialized. Ordering matches a stable sort on final_score, with ties
+        kept in order of each document's first hit.
+
+        prune drops documents before scoring when an upper bound on their
+        final_score (from their best chunk similarity) shows they cannot matter:
+        'threshold' drops those that cannot reach min_score, 'top_n' those
+        that cannot enter the top_n (the top_n result is unchanged).
+
+        lexical: shingle containment of each hit (0 when it shares no shingles
+        with the query), the doc_lexical feature; None when it was not computed.
+        """
+        sims = np.asarray(similarities, dtype=np.float64)
+        chunk_idx = np.asarray(chunk_indices, dtype=np.int64)
+        if len(sims) == 0:
+            return []
+        has_lexical = lexical is not None
+        lexical = np.asarray(lexical, dtype=np.float64) if has_lexical else np.zeros(len(sims))
+
+        index = self.corpus_index
+        hit_doc = np.asarray(index.chunk_doc_idx[chunk_idx], dtype=np.int64)
+        hit_pos = np.asarray(index.chunk_position[chunk_idx], dtype=np.int64)
+
+        if prune and prune != 'none':
+            keep = self._prune_hits(sims, hit_doc, hit_pos, lexical, prune, top_n, min_score)
+            if not keep.all():
+                sims, chunk_idx, hit_doc, hit_pos = sims[keep], chunk_idx[keep], hit_doc[keep], hit_pos[keep]
+                lexical = lexical[keep]
+            if len(sims) == 0:
+                return []
+
+        f = self._score_groups(sims, hit_doc, hit_pos, lexical)
+        order, starts, ends = f['order'], f['starts'], f['ends']
+
+        # Rank documents; ties keep the order of each document's first hit
+        first_hit = np.minimum.reduceat(order, starts)
+        ranking = np.lexsort((first_hit, -f['final_score']))
+        if top_n is not None:
+            ranking = ranking[:top_n]
+
+        doc_scores = []
+        for g in ranking:
+            # Chunk detail in original hit order (descending similarity)
+            hit_rows = np.sort(order[starts[g]:ends[g]])
+            chunk_sims = [{
+                'similarity': float(sims[h]),
+                'chunk': self.corpus_chunks[int(chunk_idx[h])],
+                'chunk_idx': int(chunk_idx[h]),
+                **({'containment': float(lexical[h])} if has_lexical else {})
+            } for h in hit_rows]
+            doc_scores.append({
+                'doc_id': chunk_sims[0]['chunk']['doc_id'],
+                'doc_max': float(f['doc_max'][g]),
+                'doc_mean': float(f['doc_mean'][g]),
+                'doc_count': float(f['doc_count'][g]),
+                'doc_contiguous': float(f['doc_contiguous'][g]),
+                'final_score': float(f['final_score'][g]),
+                'raw_score': float(f['raw_score'][g]),
+                'chunk_similarity_std': float(f['chunk_similarity_std'][g]),
+                'position_span_ratio': float(f['span_ratio'][g]),
+                'chunk_density': float(f['chunk_density'][g]),
+                'contiguous_len': int(f['max_group_len'][g]),
+                'doc_lexical': float(f['doc_lexical'][g]),
+                'chunks': chunk_sims,
+                'num_chunks': int(f['n_hits'][g])
+            })
+        return doc_scores
+
+    def _score_groups(self, sims, hit_doc, hit_pos, lexical):
+        """Per-document feature arrays for a set of hits"""
+        # Group hits by document, positions ascending inside each group
+        order = np.lexsort((hit_pos, hit_doc))
+        doc_sorted = hit_doc[order]
+        pos_sorted = hit_pos[order]
+        sim_sorted = sims[order]
+        starts = np.flatnonzero(np.r_[True, doc_sorted[1:] != doc_sorted[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        doc_rows = doc_sorted[starts]
+        n_hits = ends - starts
+
+        doc_max = np.maximum.reduceat(sim_sorted, starts)
+        doc_lexical = np.maximum.reduceat(lexical[order], starts)
+        doc_mean = np.add.reduceat(sim_sorted, starts) / n_hits
+        deviation = sim_sorted - np.repeat(doc_mean, n_hits)
+        chunk_similarity_std = np.sqrt(np.add.reduceat(deviation * deviation, starts) / n_hits)
+        chunk_similarity_std[n_hits == 1] = 0.0
+
+        total_doc_chunks = np.asarray(self.corpus_index.doc_chunk_counts[doc_rows], dtype=np.float64)
+        coverage_ratio = np.minimum(n_hits / total_doc_chunks, 1.0)
+        doc_count = coverage_ratio
+
+        # Contiguous runs: consecutive positions at most 2 apart within a document
+        run_break = np.ones(len(order), dtype=bool)
+        run_break[1:] = (np.diff(pos_sorted) > 2) | (doc_sorted[1:] != doc_sorted[:-1])
+        run_id = np.cumsum(run_break) - 1
+        run_len = np.bincount(run_id)[run_id]
+        max_group_len = np.maximum.reduceat(run_len, starts)
+        doc_contiguous = np.where(n_hits > 1, np.minimum(max_group_len / n_hits, 1.0), 0.0)
+        max_group_len = np.where(n_hits > 1, max_group_len, n_hits)
+
+        span = np.where(n_hits > 1, pos_sorted[ends - 1] - pos_sorted[starts] + 1, 1)
+        span_ratio = np.minimum(span / total_doc_chunks, 1.0)
+        chunk_density = np.minimum(coverage_ratio / np.maximum(span_ratio, 1e-6), 1.0)
+
+        w = self.weights
+        raw_score = (
+            w['doc_max'] * doc_max +
+            w['doc_mean'] * doc_mean +
+            w['doc_count'] * doc_count +
+            w['doc_contiguous'] * doc_contiguous +
+            w['doc_coverage'] * coverage_ratio +
+            w['chunk_density'] * chunk_density +
+            w.get('doc_lexical', 0.0) * doc_lexical -
+            w['span_penalty'] * (1.0 - span_ratio)
+        )
+        final_score = 1.0 / (1.0 + np.exp(-self.score_scale * (raw_score - self.score_center)))
+
+        return {
+            'order': order, 'starts': starts, 'ends': ends, 'n_hits': n_hits,
+            'doc_max': doc_max, 'doc_mean': doc_mean, 'doc_count': doc_count,
+            'doc_contiguous': doc_contiguous, 'max_group_len': max_group_len,
+            'chunk_similarity_std': chunk_similarity_std, 'span_ratio': span_ratio,
+            'chunk_density': chunk_density, 'doc_lexical': doc_lexical, 'raw_score': raw_score, 'final_score': final_score
+        }
+
+    def _prune_hits(self, sims, hit_doc, hit_pos, lexical, prune, top_n, min_score):
+        """Boolean mask of hits whose document may still reach the requested result"""
+        keep = np.ones(len(sims), dtype=bool)
+        if prune not in PRUNE_MODES:
+            raise ValueError(f"Unknown prune mode '{prune}'. Choose from: {', '.join(PRUNE_MODES)}")
+
+        # Best similarity per document, documents in order of that best hit
+        desc = np.argsort(-sims, kind='stable')
+        docs, first = np.unique(hit_doc[desc], return_index=True)
+        doc_best = sims[desc][first]
+
+        cutoff = -np.inf
+        if prune == 'threshold' and min_score is not None:
+            cutoff = self._min_doc_max_for(min_score)
+        elif prune == 'top_n' and top_n and len(docs) > top_n:
+            # Score the top_n documents by best hit exactly; anything whose upper
+            # bound stays below the weakest of them cannot displace it
+            seed_docs = docs[np.argsort(-doc_best, kind='stable')[:top_n]]
+            seed = np.isin(hit_doc, seed_docs)
+            seed_scores = self._score_groups(sims[seed], hit_doc[seed], hit_pos[seed], lexical[seed])['final_score']
+            cutoff = self._min_doc_max_for(float(np.min(seed_scores)))
+
+        if cutoff > -np.inf:
+            keep = np.isin(hit_doc, docs[doc_best >= cutoff])
+        return keep
+
+    def _min_doc_max_for(self, score):
+        """
+        Smallest doc_max whose final_score upper bound reaches score.
+        Bound: doc_mean <= doc_max, the ratio features are <= 1 and the span
+        penalty is >= 0. Returns -inf when the weights do not allow a bound.
+        """
+        w = self.weights
+        slope = w['doc_max'] + w['doc_mean']
+        if score <= 0.0 or slope <= 0 or any(v < 0 for v in w.values()):
+            return -np.inf
+        if score >= 1.0:
+            return np.inf
+        raw = self.score_center + np.log(score / (1.0 - score)) / self.score_scale
+        rest = w['doc_count'] + w['doc_contiguous'] + w['doc_coverage'] + w['chunk_density'] + w.get('doc_lexical', 0.0)
+        return (raw - rest) / slope - 1e-9
+
+
+class ContextExpander:
+    def __init__(self, corpus_chunks, corpus_data, corpus_index=None):
+        self.corpus_chunks = corpus_chunks
+        self.corpus_data = corpus_data
+        self.corpus_index = corpus_index or CorpusIndex.from_chunks(corpus_chunks, corpus_data)
+    
+    def expand_chunk_context(self, chunk, context_window=1):
+        doc_row = self.corpus_index.doc_row.get(chunk['doc_id'])
+        if doc_row is None:
+            return chunk['text']
+        doc_chunks = self.corpus_index.doc_chunk_indices(doc_row)
+        positions = self.corpus_index.chunk_position[doc_chunks]
+        matches = np.flatnonzero(positions == chunk['position'])
+        if len(matches) == 0:
+            return chunk['text']
+        current_idx = int(matches[0])
+        start_idx = max(0, current_idx - context_window)
+        end_idx = min(len(doc_chunks), current_idx + context_window + 1)
+        return " ".join([self.corpus_chunks[int(i)]['text'] for i in doc_chunks[start_idx:end_idx]])
+    
+    def get_best_chunk_per_doc(self, doc_scores, top_n=15):
+        best_chunks = []
+        for doc_score in doc_scores[:top_n]:
+            # Single pass; max() keeps the first of equal similarities like a stable sort
+            chunk_data = max(doc_score['chunks'], key=lambda x: x['similarity'])
+            best_chunks.append({
+                'doc_id': doc_score['doc_id'],
+                'chunk': chunk_data['chunk'],
+                'chunk_similarity': chunk_data['similarity'],
+                'doc_final_score': doc_score['final_score'],
+                'doc_max': doc_score['doc_max'],
+                'doc_mean': doc_score['doc_mean'],
+                'doc_count': doc_score['doc_count'],
+                'doc_contiguous': doc_score['doc_contiguous']
+            })
+        return best_chunks
+
+
+class CompletePlagiarismDetector:
+    def __init__(self, bi_encoder, chunk_faiss_index, corpus_chunks, corpus_data,
+                 doc_scorer, context_expander, query_chunker=None, 
+                 max_query_chunks=10, threshold=0.6, use_faiss=True, faiss_k=None,
+                 rescore_faiss=False, corpus_embeddings=None, embedding_cache=None, encode_scheduler=None,
+                 lexical_index=None, lexical_mode='off', lexical_verbatim=0.9, lexical_min_shingles=3):
+        """
+        lexical_index (lexical_index.py) with lexical_mode 'prefilter': query
+        chunks with at least lexical_min_shingles shingles found in a corpus
+        chunk with containment >= lexical_verbatim are scored from those
+        matches and skip the encoder and the dense search (their dense
+        neighbours are not looked up, so scores can differ from 'off');
+        'feature' only adds the containment of the dense hits (doc_lexical,
+        scores unchanged at weight 0); 'off' ignores it.
+        """
+        self.bi_encoder = bi_encoder
+        self.chunk_faiss_index = chunk_faiss_index
+        self.corpus_chunks = corpus_chunks
+        self.corpus_data = corpus_data
+        self.doc_scorer = doc_scorer
+        self.context_expander = context_expander
+        self.query_chunker = query_chunker or TextChunker()
+        self.max_query_chunks = max_query_chunks
+        self.threshold = threshold
+        self.use_faiss = use_faiss
+        self.faiss_k = faiss_k
+        self.rescore_faiss = rescore_faiss
+        self.corpus_embeddings = corpus_embeddings
+        self.embedding_cache = embedding_cache
+        self.encode_scheduler = encode_scheduler
+        self.lexical_index = lexical_index
+        self.lexical_mode = lexical_mode
+        self.lexical_verbatim = lexical_verbatim
+        self.lexical_min_shingles = lexical_min_shingles
+        if corpus_embeddings is None and (not use_faiss or chunk_faiss_index is None or rescore_faiss):
+            raise ValueError("corpus_embeddings is required for exact search and rescore_faiss")
+        # Boolean mask over corpus chunks; False for chunks of tombstoned documents
+        self.chunk_alive = None
+
+    def detect(self, query_text, top_k=100, top_n_docs=15, use_faiss=None, faiss_k=None,
+               prune=None, verbose=False):
+        """
+        use_faiss=None falls back to the detector default; pass False to force
+        the exact brute-force path (useful for checking ANN recall).
+        faiss_k is the number of neighbours fetched per query chunk (defaults to top_k).
+        prune ('none', 'threshold', 'top_n') skips scoring documents that provably
+        cannot reach self.threshold or the returned top documents.
+        """
+        return self.detect_batch([query_text], top_k=top_k, top_n_docs=top_n_docs,
+                                 use_faiss=use_faiss, faiss_k=faiss_k, prune=prune, verbose=verbose)[0]
+
+    def detect_batch(self, query_texts, top_k=100, top_n_docs=15, use_faiss=None, faiss_k=None,
+                     prune=None, verbose=False):
+        """
+        Run detect() for several texts at once: every query chunk is encoded in
+        a single bi_encoder call (identical chunks only once) and searched in one
+        pass over the index. Each result is the same as a separate detect() call.
+        With the lexical prefilter, chunks copied verbatim from the corpus are
+        left out of that call; a text made only of such chunks is never encoded.
+        """
+        if use_faiss is None:
+            use_faiss = self.use_faiss
+        use_faiss = bool(use_faiss and self.chunk_faiss_index is not None)
+        if not use_faiss and self.corpus_embeddings is None:
+            raise ValueError("Exact search needs corpus_embeddings; this detector only has a FAISS index")
+
+        # Chunk every query and map chunk texts to rows of one embedding matrix
+        unique_texts = {}
+        prepared = []
+        with stage('chunk'):
+            for query_text in query_texts:
+                query_chunks = self.query_chunker.chunk_text(query_text, doc_id="query")
+                if self.max_query_chunks and len(query_chunks) > self.max_query_chunks:
+                    query_chunks = query_chunks[:self.max_query_chunks]
+                rows = [unique_texts.setdefault(c['text'], len(unique_texts)) for c in query_chunks]
+                prepared.append((query_chunks, rows, len(query_text.split())))
+
+        texts = list(unique_texts)
+        lexical_index = self.lexical_index if self.lexical_mode != 'off' else None
+        matches, verbatim = None, [False] * len(texts)
+        if lexical_index is not None and texts:
+            with stage('lexical'):
+                matches = self._lexical_matches(lexical_index, texts)
+            if self.lexical_mode == 'prefilter':
+                verbatim = [bool(n_shingles >= self.lexical_min_shingles and len(containment) > 0
+                                 and containment[0] >= self.lexical_verbatim)
+                            for _, containment, n_shingles in matches]
+
+        # Only the chunks not resolved lexically are encoded and searched
+        dense_row = {r: i for i, r in enumerate(r for r, v in enumerate(verbatim) if not v)}
+        groups = [[dense_row[r] for r in rows if r in dense_row] for _, rows, _ in prepared if rows]
+        dense_groups = [g for g in groups if g]
+        group_results = []
+        with track_missing_shards() as missing_shards:
+            if dense_groups:
+                with stage('encode'):
+                    q_emb_norm = self.encode([texts[r] for r in dense_row])
+                if use_faiss:
+                    group_results = self._search_faiss(q_emb_norm, dense_groups, top_k,
+                                                       faiss_k or self.faiss_k or top_k)
+                else:
+                    group_results = self._search_exact(q_emb_norm, dense_groups, top_k)
+        # Shards that did not answer (sharding.py): the results only cover the others
+        missing_shards = sorted(set(missing_shards))
+
+        method = 'bi-encoder+faiss' if use_faiss else 'bi-encoder'
+        results = []
+        group_iter = iter(group_results)
+        for query_chunks, rows, word_count in prepared:
+            if not rows:
+                results.append({
+                    'prediction': False,
+                    'confidence': 0.0,
+                    'threshold': self.threshold,
+                    'best_match': None,
+                    'top_results': [],
+                    'doc_scores': [],
+                    'method': 'bi-encoder',
+                    'query_chunks': 0,
+                    'query_words': word_count,
+                    'corpus_matches': 0,
+                    'lexical_chunks': 0,
+                    'missing_shards': []
+                })
+                continue
+            lexical_rows = [r for r in rows if verbatim[r]]
+            if len(lexical_rows) < len(rows):
+                hit_scores, hit_indices = next(group_iter)
+            if lexical_rows:
+                # Verbatim chunks: their near-exact copies, containment standing in for similarity
+                parts = []
+                for r in sorted(set(lexical_rows)):
+                    chunk_rows, containment, _ = matches[r]
+                    copies = containment >= self.lexical_verbatim
+                    parts.append((containment[copies], chunk_rows[copies]))
+                if len(lexical_rows) < len(rows):
+                    parts.append((hit_scores, hit_indices))
+                hit_scores, hit_indices = self._merge_hits(parts, top_k)
+            hit_lexical = None
+            if matches is not None:
+                hit_lexical = self._containment_of(hit_indices, [matches[r] for r in sorted(set(rows))])
+
+            # Only the documents that are returned get their chunk detail built
+            with stage('doc_scoring'):
+                doc_scores = self.doc_scorer.calculate_doc_scores_arrays(
+                    hit_scores, hit_indices, top_n=max(top_n_docs, 5),
+                    prune=prune, min_score=self.threshold, lexical=hit_lexical
+                )
+            with stage('context'):
+                best_chunks = self.context_expander.get_best_chunk_per_doc(doc_scores, top_n=top_n_docs)
+
+            best_doc = doc_scores[0] if len(doc_scores) > 0 else None
+            confidence = float(best_doc['final_score']) if best_doc is not None else 0.0
+            is_plagiarism = confidence >= self.threshold
+
+            results.append({
+                'prediction': bool(is_plagiarism),
+                'confidence': confidence,
+                'threshold': self.threshold,
+                'best_match': best_doc,
+                'top_results': doc_scores[:top_n_docs],
+                'doc_scores': doc_scores[:5],
+                'method': 'lexical' if len(lexical_rows) == len(rows) else method + ('+lexical' if lexical_rows else ''),
+                'query_chunks': len(query_chunks),
+                'query_words': word_count,
+                'corpus_matches': len(hit_indices),
+                'lexical_chunks': sum(verbatim[r] for r in rows),
+                'missing_shards': missing_shards if len(lexical_rows) < len(rows) else []
+            })
+        return results
+
+    def _lexical_matches(self, lexical_index, texts):
+        """(corpus chunk rows, containment, informative shingles) per query chunk, live chunks only"""
+        matches = [lexical_index.match(text) for text in texts]
+        # Read after the lookups: the mask is published before the lexical index, so it covers every row
+        chunk_alive = self.chunk_alive
+        if chunk_alive is None:
+            return matches
+        return [(rows[chunk_alive[rows]], containment[chunk_alive[rows]], n_shingles)
+                for rows, containment, n_shingles in matches]
+
+    @staticmethod
+    def _merge_hits(parts, top_k):
+        """Best score per corpus chunk over several (scores, chunk_indices) hit lists; the top_k, descending"""
+        scores = np.concatenate([np.asarray(p[0], dtype=np.float32) for p in parts])
+        ids = np.concatenate([np.asarray(p[1], dtype=np.int64) for p in parts])
+        order = np.argsort(-scores, kind='stable')
+        unique_ids, first = np.unique(ids[order], return_index=True)
+        best_scores = scores[order][first]
+        top = np.argsort(-best_scores, kind='stable')[:top_k]
+        return best_scores[top], unique_ids[top]
+
+    @staticmethod
+    def _containment_of(hit_indices, matches):
+        """Best containment of each hit over the query chunks' lexical matches (0 when it shares no shingle)"""
+        rows = np.concatenate([m[0] for m in matches])
+        if len(rows) == 0:
+            return np.zeros(len(hit_indices))
+        containment = np.concatenate([m[1] for m in matches])
+        order = np.argsort(-containment, kind='stable')
+        unique_rows, first = np.unique(rows[order], return_index=True)
+        best = containment[order][first]
+        pos = np.minimum(np.searchsorted(unique_rows, hit_indices), len(unique_rows) - 1)
+        return np.where(unique_rows[pos] == hit_indices, best[pos], 0.0)
+
+    def encode(self, texts, use_cache=True):
+        """
+        L2-normalized float32 embeddings of texts, through the embedding cache
+        if any. use_cache=False skips it (texts that will not be queried again).
+        """
+        if self.embedding_cache is None or not use_cache:
+            return self._encode_uncached(texts)
+
+        cached = self.embedding_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            fresh = self._encode_uncached([texts[i] for i in missing])
+            self.embedding_cache.put_many([texts[i] for i in missing], fresh)
+            for i, vector in zip(missing, fresh):
+                cached[i] = vector
+        return np.ascontiguousarray(np.stack(cached), dtype=np.float32)
+
+    def _encode_uncached(self, texts):
+        if self.encode_scheduler is not None:
+            # Shares a forward pass with other requests encoding at the same time
+            q_emb = np.asarray(self.encode_scheduler.run(texts))
+        else:
+            with stage('encode_forward'):
+                q_emb = self.bi_encoder.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        q_norms = np.linalg.norm(q_emb, axis=1, keepdims=True)
+        q_norms[q_norms < 1e-8] = 1.0
+        return np.ascontiguousarray(q_emb / q_norms, dtype=np.float32)
+
+    def _search_exact(self, q_emb_norm, groups, top_k, max_rows=64):
+        """
+        Brute-force scoring of every corpus chunk, max over the query rows of
+        each group. Groups are scored together in blocks of ~max_rows rows so
+        the similarity matrix stays bounded for long texts.
+        Returns one (scores, chunk_indices) pair of arrays per group.
+        """
+        results = []
+        block = []
+        block_rows = 0
+        for rows in groups + [None]:
+            if rows is not None:
+                block.append(rows)
+                block_rows += len(rows)
+                if block_rows < max_rows:
+                    continue
+            if not block:
+                break
+            row_ids = sorted({r for g in block for r in g})
+            position = {r: i for i, r in enumerate(row_ids)}
+            with stage('similarity'):
+                if isinstance(self.corpus_embeddings, np.ndarray):
+                    # corpus_embeddings is C-contiguous float32, so .T is a view that BLAS
+                    # consumes directly; only the (n_rows x n_corpus) result is allocated.
+                    similarity_matrix = np.dot(q_emb_norm[row_ids], self.corpus_embeddings.T)
+                else:
+                    # Base + ingested rows (live_corpus.SegmentedMatrix)
+                    similarity_matrix = self.corpus_embeddings.similarities(q_emb_norm[row_ids])
+                if not np.isfinite(similarity_matrix).all():
+                    similarity_matrix = np.nan_to_num(similarity_matrix, nan=0.0, posinf=1.0, neginf=0.0)
+            chunk_alive = self.chunk_alive
+            with stage('top_k'):
+                for g in block:
+                    corpus_scores = np.max(similarity_matrix[[position[r] for r in g]], axis=0)
+                    if chunk_alive is not None:
+                        corpus_scores[~chunk_alive[:len(corpus_scores)]] = -np.inf
+                    top_k_indices = self._top_k(corpus_scores, top_k)
+                    if chunk_alive is not None:
+                        top_k_indices = top_k_indices[np.isfinite(corpus_scores[top_k_indices])]
+                    results.append((corpus_scores[top_k_indices], top_k_indices))
+            block = []
+            block_rows = 0
+        return results
+
+    @staticmethod
+    def _top_k(scores, k):
+        """
+        Indices of the k largest scores, descending (ties: higher index first).
+        O(n) argpartition selection, then only the k winners are sorted.
+        """
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.lexsort((-candidates, -scores[candidates]))]
+
+    def _search_faiss(self, q_emb_norm, groups, top_k, k_per_chunk):
+        """
+        ANN retrieval: search k_per_chunk neighbours for every query chunk,
+        keep the best similarity per corpus chunk and return the top_k of each
+        group. With a flat index and k_per_chunk >= top_k this matches _search_exact.
+        rescore_faiss replaces approximate (e.g. PQ) scores with exact cosine
+        similarities of the candidates, since DocumentScorer relies on them.
+        Returns one (scores, chunk_indices) pair of arrays per group.
+        """
+        if self.chunk_alive is not None:
+            # Over-fetch so hits on tombstoned chunks do not crowd out live ones
+            num_dead = int(len(self.chunk_alive) - self.chunk_alive.sum())
+            k_per_chunk = int(k_per_chunk) + min(int(k_per_chunk), num_dead)
+        k_per_chunk = min(max(int(k_per_chunk), 1), self.chunk_faiss_index.ntotal)
+        with stage('ann_search'):
+            all_scores, all_ids = self.chunk_faiss_index.search(q_emb_norm, k_per_chunk)
+        # Read after the search: the mask is published before the index, so it covers every id
+        chunk_alive = self.chunk_alive
+
+        results = []
+        with stage('top_k'):
+            for rows in groups:
+                scores = all_scores[rows].ravel()
+                ids = all_ids[rows].ravel()
+                valid = ids >= 0
+                if chunk_alive is not None:
+                    valid &= chunk_alive[ids]
+                scores = np.nan_to_num(scores[valid], nan=0.0, posinf=1.0, neginf=0.0)
+                ids = ids[valid]
+                if len(ids) == 0:
+                    results.append((np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)))
+                    continue
+
+                # Best score per corpus chunk across the group's query chunks
+                order = np.argsort(-scores, kind='stable')
+                unique_ids, first = np.unique(ids[order], return_index=True)
+                if self.rescore_faiss:
+                    candidate_sims = np.dot(self.corpus_embeddings[unique_ids], q_emb_norm[rows].T)
+                    best_scores = np.max(candidate_sims, axis=1)
+                else:
+                    best_scores = scores[order][first]
+                top = np.argsort(-best_scores, kind='stable')[:top_k]
+                results.append((best_scores[top], unique_ids[top]))
+        return results
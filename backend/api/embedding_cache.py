@@ -0,0 +1,104 @@
+"""
+Bounded LRU cache for query-chunk embeddings
+Keyed on a hash of the normalized chunk text plus the encoder model name, so
+an edited resubmission only pays encoder cost for the chunks that changed.
+Optionally persisted to an .npz file between restarts.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Normalization used for cache keys (never changes what gets encoded)"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, max_entries=50000, persist_path=None):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if persist_path and os.path.exists(persist_path):
+            self.load(persist_path)
+
+    def key(self, text):
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode('utf-8')
+        return hashlib.sha1(payload).hexdigest()
+
+    def get_many(self, texts):
+        """Cached vector (or None) for each text; hits are moved to the MRU end"""
+        keys = [self.key(t) for t in texts]
+        found = []
+        with self._lock:
+            for k in keys:
+                vector = self._entries.get(k)
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(k)
+                    self.hits += 1
+                found.append(vector)
+        return found
+
+    def put_many(self, texts, vectors):
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                k = self.key(text)
+                self._entries[k] = np.array(vector, dtype=np.float32)
+                self._entries.move_to_end(k)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model_name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def save(self, path=None):
+        path = path or self.persist_path
+        if not path:
+            return
+        with self._lock:
+            keys = list(self._entries)
+            vectors = np.stack(list(self._entries.values())) if keys else np.empty((0, 0), dtype=np.float32)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, keys=np.array(keys), vectors=vectors, model=np.array(self.model_name))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        try:
+            with np.load(path) as data:
+                if str(data['model']) != self.model_name:
+                    print(f"Warning: embedding cache {path} belongs to another model, ignoring it")
+                    return
+                keys, vectors = data['keys'], data['vectors']
+        except Exception as e:
+            print(f"Warning: could not load embedding cache {path}: {e}")
+            return
+        with self._lock:
+            # Oldest first, so the most recently used entries survive trimming
+            for k, vector in list(zip(keys, vectors))[-self.max_entries:]:
+                self._entries[str(k)] = vector
@@ -0,0 +1,66 @@
+"""
+Production server config for the Plagiarism API (Linux/macOS)
+The master imports plagiarism_api once (corpus, FAISS index, models) and then
+forks the workers, which share those read-only pages copy-on-write. Each worker
+warms up before it accepts requests; /api/ready then keeps checking what can
+still fail while it serves (queue capacity, corpus replay, shards).
+
+Usage (from the project root):
+    gunicorn -c backend/api/gunicorn.conf.py plagiarism_api:app
+"""
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from admission import configured_limits  # noqa: E402
+
+_cpus = os.cpu_count() or 1
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('PLAGIARISM_BIND', '0.0.0.0:5000')
+preload_app = True
+
+# Inference threads per worker: by default the cores are split evenly between
+# workers so N workers x M intra-op threads never exceeds the machine
+workers = int(os.environ.get('PLAGIARISM_WORKERS', max(1, min(4, _cpus // 2))))
+torch_threads = int(os.environ.get('PLAGIARISM_TORCH_THREADS', max(1, _cpus // workers)))
+
+# Request threads per worker; more than one lets the batch scheduler coalesce
+# concurrent requests into a single forward pass. The default holds every
+# request the endpoint limiters admit, running + queued (with the default
+# limits: 2+8 plagiarism, 4+4 AI, 1 bulk stream, 1+2 ingest), plus two spare
+# threads so /api/health, /api/ready and /metrics always get one.
+worker_class = 'gthread'
+threads = int(os.environ.get('PLAGIARISM_HTTP_THREADS',
+                             sum(running + queued for running, queued in configured_limits().values()) + 2))
+timeout = int(os.environ.get('PLAGIARISM_WORKER_TIMEOUT', 120))
+graceful_timeout = 30
+
+# Must be in the environment before numpy / torch / faiss are imported by preload_app
+for _var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+    os.environ.setdefault(_var, str(torch_threads))
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+
+def when_ready(server):
+    # Background components (the AI detector) finish in the master too, so the
+    # workers share them instead of each loading a copy after the fork
+    import plagiarism_api
+    plagiarism_api.startup.wait()
+    # Everything allocated while loading is long-lived: keep the collector from
+    # touching (and so un-sharing) those pages in the workers
+    gc.freeze()
+    server.log.info(f"Models loaded, forking {workers} workers x {torch_threads} inference threads")
+
+
+def post_fork(server, worker):
+    import faiss
+    import torch
+    torch.set_num_threads(torch_threads)
+    faiss.omp_set_num_threads(torch_threads)
+
+    import plagiarism_api
+    plagiarism_api.warmup()
+    worker.log.info(f"Worker {worker.pid} ready after {plagiarism_api.service_state['warmup_time']}s warmup")
@@ -0,0 +1,278 @@
+"""
+Offline FAISS index builder for the plagiarism corpus
+Builds IVF-Flat / HNSW / IVF-PQ indexes from the corpus embeddings (corpus
+store, else chunk_embeddings_normalized.npy) and writes a recall@k + latency
+report against exact (flat) search.
+
+Usage:
+    python backend/api/index_builder.py --types ivf_flat hnsw ivf_pq
+    python backend/api/index_builder.py --types hnsw --hnsw-m 48 --ef-search 32,64,128
+"""
+
+import argparse
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+
+# Index type -> file name inside DATA_DIR. 'flat' is the index shipped with the notebook.
+INDEX_FILES = {
+    'flat': 'chunk_faiss_index.faiss',
+    'ivf_flat': 'chunk_faiss_index_ivf_flat.faiss',
+    'hnsw': 'chunk_faiss_index_hnsw.faiss',
+    'ivf_pq': 'chunk_faiss_index_ivf_pq.faiss',
+}
+
+# Index types whose search scores are approximations of the true inner product
+LOSSY_INDEX_TYPES = {'ivf_pq'}
+
+
+def index_path(index_type, data_dir=DATA_DIR):
+    if index_type not in INDEX_FILES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from: {', '.join(INDEX_FILES)}")
+    return Path(data_dir) / INDEX_FILES[index_type]
+
+
+def read_index(index_type, data_dir=DATA_DIR, mmap=False):
+    """
+    Load a prebuilt index. mmap=True maps the file read-only instead of
+    reading it into the heap, so forked workers share the same pages.
+    """
+    path = str(index_path(index_type, data_dir))
+    if mmap:
+        flag = faiss.IO_FLAG_READ_ONLY | (
+            getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) if index_type == 'flat' else faiss.IO_FLAG_MMAP
+        )
+        try:
+            return faiss.read_index(path, flag)
+        except RuntimeError as e:
+            print(f"Warning: could not memory-map {path} ({e}), reading it into memory")
+    return faiss.read_index(path)
+
+
+def write_index(index, path):
+    """Write next to path and rename over it: processes that mapped the old file keep their pages"""
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def apply_search_params(index, nprobe=None, ef_search=None):
+    """Set query-time knobs on an index (no-op for params the index does not have)"""
+    if nprobe:
+        try:
+            faiss.extract_index_ivf(index).nprobe = int(nprobe)
+        except RuntimeError:
+            pass
+    if ef_search and hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = int(ef_search)
+    return index
+
+
+def default_nlist(num_vectors):
+    # Common rule of thumb: ~4 * sqrt(N) inverted lists
+    return max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39 or 1))
+
+
+def build_index(index_type, embeddings, nlist=None, hnsw_m=32, ef_construction=200,
+                pq_m=None, pq_nbits=8, train_size=None, seed=0):
+    """Build an inner-product index over L2-normalized embeddings"""
+    num_vectors, dim = embeddings.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric)
+        index.hnsw.efConstruction = ef_construction
+    elif index_type in ('ivf_flat', 'ivf_pq'):
+        nlist = nlist or default_nlist(num_vectors)
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        else:
+            pq_m = pq_m or _default_pq_m(dim)
+            if dim % pq_m != 0:
+                raise ValueError(f"pq_m={pq_m} must divide embedding dim {dim}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, metric)
+
+        if not train_size:
+            train_size = nlist * 64
+            if index_type == 'ivf_pq':
+                train_size = max(train_size, (2 ** pq_nbits) * 64)
+        rng = np.random.default_rng(seed)
+        sample = embeddings[np.sort(rng.choice(num_vectors, size=min(train_size, num_vectors), replace=False))]
+        index.train(np.ascontiguousarray(sample, dtype='float32'))
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from: {', '.join(INDEX_FILES)}")
+
+    # Add in slices so a memory-mapped embedding file is never fully copied
+    step = 65536
+    for start in range(0, num_vectors, step):
+        index.add(np.ascontiguousarray(embeddings[start:start + step], dtype='float32'))
+    return index
+
+
+def _default_pq_m(dim):
+    for m in (64, 48, 32, 24, 16, 8, 4, 2, 1):
+        if dim % m == 0 and m <= dim:
+            return m
+    return 1
+
+
+def sample_queries(embeddings, num_queries, noise=0.05, seed=0):
+    """
+    Offline query set: perturbed corpus vectors, renormalized.
+    Approximates paraphrased copies, which is what detect() looks for.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[np.sort(rows)], dtype='float32')
+    queries = queries + noise * rng.standard_normal(queries.shape).astype('float32') / np.sqrt(queries.shape[1])
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-8)
+    return queries
+
+
+def exact_neighbors(embeddings, queries, k):
+    flat = build_index('flat', embeddings)
+    _, ids = flat.search(queries, k)
+    return ids
+
+
+def measure(index, queries, ground_truth, k):
+    """recall@k against exact search plus per-query latency (ms)"""
+    latencies = []
+    hits = 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        hits += len(np.intersect1d(ids[0][ids[0] >= 0], ground_truth[i]))
+    latencies = np.asarray(latencies)
+    return {
+        'recall_at_k': round(hits / float(ground_truth.size), 4),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3),
+        'latency_ms_p99': round(float(np.percentile(latencies, 99)), 3),
+        'latency_ms_mean': round(float(latencies.mean()), 3),
+    }
+
+
+def _parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def _load_embeddings(data_dir):
+    """
+    (embeddings, chunk ids of their rows) from the corpus store, else from the
+    notebook artifacts. Index rows are chunk rows, so the legacy chunk_ids are
+    checked one by one against corpus_chunks.pkl (the store is checked on build).
+    """
+    from corpus_store import CorpusStore
+    store_dir = data_dir / 'corpus_store'
+    if CorpusStore.exists(store_dir):
+        store = CorpusStore(store_dir)
+        return store.embeddings, store.chunk_id
+    embeddings = np.load(data_dir / 'chunk_embeddings_normalized.npy', mmap_mode='r')
+    with open(data_dir / 'chunk_metadata.pkl', 'rb') as f:
+        chunk_ids = pickle.load(f)['chunk_ids']
+    with open(data_dir / 'corpus_chunks.pkl', 'rb') as f:
+        corpus_chunks = pickle.load(f)
+    if len(chunk_ids) != len(embeddings) or len(corpus_chunks) != len(embeddings):
+        raise ValueError(f"Size mismatch: {len(corpus_chunks)} chunks, {len(chunk_ids)} chunk ids, "
+                         f"{len(embeddings)} embeddings")
+    for i, chunk in enumerate(corpus_chunks):
+        if chunk['chunk_id'] != chunk_ids[i]:
+            raise ValueError(f"Embedding row {i} is chunk '{chunk['chunk_id']}' but chunk_metadata.pkl has '{chunk_ids[i]}'")
+    if len(set(chunk_ids)) != len(chunk_ids):
+        raise ValueError("chunk_metadata.pkl has duplicate chunk ids")
+    return embeddings, chunk_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build FAISS indexes for the plagiarism corpus')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--types', nargs='+', default=['ivf_flat', 'hnsw', 'ivf_pq'], choices=list(INDEX_FILES))
+    parser.add_argument('--nlist', type=int, default=None, help='IVF lists (default ~4*sqrt(N))')
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    parser.add_argument('--ef-construction', type=int, default=200)
+    parser.add_argument('--pq-m', type=int, default=None, help='PQ sub-quantizers (must divide dim)')
+    parser.add_argument('--pq-nbits', type=int, default=8)
+    parser.add_argument('--nprobe', type=_parse_int_list, default=[1, 4, 16, 64])
+    parser.add_argument('--ef-search', type=_parse_int_list, default=[16, 64, 128, 256])
+    parser.add_argument('--k', type=int, default=100, help='k for recall@k (detect() uses top_k=100)')
+    parser.add_argument('--num-queries', type=int, default=500)
+    parser.add_argument('--queries-npy', default=None, help='Optional real query embeddings (normalized)')
+    parser.add_argument('--report', default=None, help='Report path (default <data-dir>/faiss_index_report.json)')
+    parser.add_argument('--no-save', action='store_true', help='Only benchmark, do not write index files')
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    try:
+        embeddings, chunk_ids = _load_embeddings(data_dir)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"✅ Loaded embeddings: {embeddings.shape}, {len(chunk_ids)} chunk IDs")
+
+    if args.queries_npy:
+        queries = np.ascontiguousarray(np.load(args.queries_npy), dtype='float32')
+    else:
+        queries = sample_queries(embeddings, args.num_queries)
+    k = min(args.k, len(embeddings))
+    ground_truth = exact_neighbors(embeddings, queries, k)
+
+    results = []
+    exact = build_index('flat', embeddings)
+    results.append({'index_type': 'flat', 'params': {}, 'build_time_s': 0.0,
+                    'index_bytes': int(faiss.serialize_index(exact).size), **measure(exact, queries, ground_truth, k)})
+    del exact
+
+    for index_type in args.types:
+        if index_type == 'flat':
+            continue
+        start = time.perf_counter()
+        index = build_index(index_type, embeddings, nlist=args.nlist, hnsw_m=args.hnsw_m,
+                            ef_construction=args.ef_construction, pq_m=args.pq_m, pq_nbits=args.pq_nbits)
+        build_time = time.perf_counter() - start
+        index_bytes = int(faiss.serialize_index(index).size)
+        print(f"✅ Built {index_type}: {index.ntotal} vectors in {build_time:.1f}s ({index_bytes / 2**20:.1f} MiB)")
+
+        if index_type == 'hnsw':
+            sweep = [{'ef_search': ef} for ef in args.ef_search]
+        else:
+            sweep = [{'nprobe': n} for n in args.nprobe if n <= faiss.extract_index_ivf(index).nlist]
+        for params in sweep:
+            apply_search_params(index, **params)
+            row = {'index_type': index_type, 'params': params, 'build_time_s': round(build_time, 2),
+                   'index_bytes': index_bytes, **measure(index, queries, ground_truth, k)}
+            results.append(row)
+            print(f"   {params}: recall@{k}={row['recall_at_k']:.4f} "
+                  f"p50={row['latency_ms_p50']:.2f}ms p99={row['latency_ms_p99']:.2f}ms")
+
+        if not args.no_save:
+            write_index(index, index_path(index_type, data_dir))
+            print(f"   saved -> {index_path(index_type, data_dir)}")
+        del index
+
+    report = {
+        'num_vectors': int(len(embeddings)),
+        'dim': int(embeddings.shape[1]),
+        'k': k,
+        'num_queries': int(len(queries)),
+        'query_source': args.queries_npy or 'perturbed corpus sample',
+        'results': results,
+    }
+    report_path = Path(args.report) if args.report else data_dir / 'faiss_index_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Report written to {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+CPU inference backends for the bi-encoder and the PhoBERT AI detector
+'torch' is plain fp32 PyTorch, 'int8' applies dynamic int8 quantization to
+the Linear layers and 'onnx' runs an exported ONNX Runtime graph (needs
+`pip install "optimum[onnxruntime]"`). The CLI checks a backend against fp32
+on a validation set (score deltas, verdict flips) and measures latency and
+throughput.
+
+Usage:
+    python backend/api/inference_backends.py --backends int8 onnx
+    python backend/api/inference_backends.py --texts data/ai_validation.json --skip-encoder
+"""
+
+import argparse
+import json
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+AI_MODEL_DIR = BASE_DIR / 'model' / 'detector_phobert'
+ENCODER_MODEL_NAME = "bkai-foundation-models/vietnamese-bi-encoder"
+
+BACKENDS = ('torch', 'int8', 'onnx')
+
+# Confidence cut points of get_ai_label() in plagiarism_api.py
+AI_LABEL_THRESHOLDS = (0.4, 0.6, 0.8)
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of every nn.Linear (weights int8, activations quantized on the fly)"""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_bi_encoder(model_name=ENCODER_MODEL_NAME, backend='torch'):
+    _check_backend(backend)
+    from sentence_transformers import SentenceTransformer
+    if backend == 'onnx':
+        # The export is saved once under model/ so later starts skip it
+        export_dir = BASE_DIR / 'model' / f"{model_name.replace('/', '__')}_onnx"
+        if (export_dir / 'onnx' / 'model.onnx').exists():
+            return SentenceTransformer(str(export_dir), device='cpu', backend='onnx')
+        model = SentenceTransformer(model_name, device='cpu', backend='onnx')
+        model.save_pretrained(str(export_dir))
+        return model
+    if backend == 'int8':
+        return quantize_int8(SentenceTransformer(model_name, device='cpu'))
+    return SentenceTransformer(model_name)
+
+
+def onnx_export_dir(model_path):
+    return Path(f"{model_path}_onnx")
+
+
+def load_ai_classifier(model_path=AI_MODEL_DIR, backend='torch'):
+    """Sequence classifier whose forward(input_ids=..., attention_mask=...) returns .logits"""
+    _check_backend(backend)
+    if backend == 'onnx':
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        export_dir = onnx_export_dir(model_path)
+        onnx_file = export_dir / 'model.onnx'
+        newest_source = max((p.stat().st_mtime for p in Path(model_path).iterdir() if p.is_file()), default=0)
+        if onnx_file.exists() and onnx_file.stat().st_mtime >= newest_source:
+            return ORTModelForSequenceClassification.from_pretrained(export_dir)
+        # Exported once next to the checkpoint and re-exported when the checkpoint changes
+        model = ORTModelForSequenceClassification.from_pretrained(model_path, export=True)
+        model.save_pretrained(export_dir)
+        return model
+
+    from transformers import AutoModelForSequenceClassification
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    if backend == 'int8':
+        model = quantize_int8(model)
+    return model
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 2) if samples else 0.0
+
+
+def _timed_batches(fn, items, batch_size):
+    """Run fn over items in batches; returns (concatenated outputs, per-batch seconds, total seconds)"""
+    fn(items[:batch_size])  # warm-up (graph optimization, allocator)
+    outputs, latencies = [], []
+    start = time.perf_counter()
+    for i in range(0, len(items), batch_size):
+        t = time.perf_counter()
+        outputs.append(fn(items[i:i + batch_size]))
+        latencies.append(time.perf_counter() - t)
+    return np.concatenate(outputs), latencies, time.perf_counter() - start
+
+
+def _speed(latencies, total, num_items):
+    return {
+        'latency_ms_p50': _percentile_ms(latencies, 50),
+        'latency_ms_p99': _percentile_ms(latencies, 99),
+        'throughput_per_s': round(num_items / total, 1) if total else 0.0,
+    }
+
+
+def compare_encoders(texts, backends, model_name=ENCODER_MODEL_NAME, batch_size=32, threshold=0.6):
+    """
+    Embedding parity of each backend against fp32: per-text cosine to the fp32
+    vector, drift of text-to-text similarities and how many pairs change side
+    of the detector threshold.
+    """
+    def run(backend):
+        model = load_bi_encoder(model_name, backend)
+        encode = lambda batch: model.encode(batch, batch_size=batch_size, show_progress_bar=False,
+                                            convert_to_numpy=True, normalize_embeddings=True)
+        return _timed_batches(encode, texts, batch_size)
+
+    reference, latencies, total = run('torch')
+    ref_sims = reference @ reference.T
+    pairs = np.triu_indices(len(texts), k=1)
+    results = [{'backend': 'torch', **_speed(latencies, total, len(texts))}]
+    for backend in backends:
+        if backend == 'torch':
+            continue
+        embeddings, latencies, total = run(backend)
+        cosine = np.sum(reference * embeddings, axis=1)
+        sims = embeddings @ embeddings.T
+        sim_delta = np.abs(sims - ref_sims)[pairs]
+        flips = (sims[pairs] >= threshold) != (ref_sims[pairs] >= threshold)
+        results.append({
+            'backend': backend,
+            'cosine_to_fp32_mean': round(float(cosine.mean()), 6),
+            'cosine_to_fp32_min': round(float(cosine.min()), 6),
+            'similarity_delta_mean': round(float(sim_delta.mean()), 6) if sim_delta.size else 0.0,
+            'similarity_delta_max': round(float(sim_delta.max()), 6) if sim_delta.size else 0.0,
+            'threshold': threshold,
+            'threshold_flips': int(flips.sum()),
+            'pairs': int(flips.size),
+            **_speed(latencies, total, len(texts)),
+        })
+    return results
+
+
+def compare_ai_classifiers(texts, backends, model_path=AI_MODEL_DIR, batch_size=32, max_length=256):
+    """P(AI) parity of each backend against fp32: confidence deltas and get_ai_label() verdict flips"""
+    import torch
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(str(model_path), use_fast=True)
+
+    def run(backend):
+        model = load_ai_classifier(model_path, backend)
+
+        def score(batch):
+            enc = tokenizer(batch, truncation=True, max_length=max_length, padding=True, return_tensors='pt')
+            with torch.inference_mode():
+                logits = model(input_ids=enc['input_ids'], attention_mask=enc['attention_mask']).logits
+            return torch.softmax(logits.float(), dim=-1)[:, 1].numpy()
+        return _timed_batches(score, texts, batch_size)
+
+    reference, latencies, total = run('torch')
+    ref_labels = np.digitize(reference, AI_LABEL_THRESHOLDS)
+    results = [{'backend': 'torch', **_speed(latencies, total, len(texts))}]
+    for backend in backends:
+        if backend == 'torch':
+            continue
+        probs, latencies, total = run(backend)
+        delta = np.abs(probs - reference)
+        results.append({
+            'backend': backend,
+            'confidence_delta_mean': round(float(delta.mean()), 6),
+            'confidence_delta_p99': round(float(np.percentile(delta, 99)), 6),
+            'confidence_delta_max': round(float(delta.max()), 6),
+            'label_flips': int((np.digitize(probs, AI_LABEL_THRESHOLDS) != ref_labels).sum()),
+            'texts': len(texts),
+            **_speed(latencies, total, len(texts)),
+        })
+    return results
+
+
+def load_validation_texts(path=None, limit=500, seed=0):
+    """Texts from a JSON list (strings or objects with "text"); defaults to a sample of corpus chunks"""
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        texts = [item['text'] if isinstance(item, dict) else item for item in items]
+    else:
+        with open(DATA_DIR / 'corpus_chunks.pkl', 'rb') as f:
+            texts = [chunk['text'] for chunk in pickle.load(f)]
+    texts = [t for t in texts if t and t.strip()]
+    if limit and len(texts) > limit:
+        rng = np.random.default_rng(seed)
+        texts = [texts[i] for i in sorted(rng.choice(len(texts), size=limit, replace=False))]
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare CPU inference backends against fp32 PyTorch')
+    parser.add_argument('--backends', nargs='+', default=['int8', 'onnx'], choices=list(BACKENDS))
+    parser.add_argument('--texts', default=None, help='Validation JSON (default: sample of corpus_chunks.pkl)')
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--encoder', default=ENCODER_MODEL_NAME)
+    parser.add_argument('--ai-model', default=str(AI_MODEL_DIR))
+    parser.add_argument('--threshold', type=float, default=0.6, help='Similarity threshold used by the detector')
+    parser.add_argument('--skip-encoder', action='store_true')
+    parser.add_argument('--skip-ai', action='store_true')
+    parser.add_argument('--report', default=None, help='Report path (default data/inference_backend_report.json)')
+    args = parser.parse_args()
+
+    texts = load_validation_texts(args.texts, args.limit)
+    print(f"✅ Loaded {len(texts)} validation texts")
+
+    report = {'num_texts': len(texts), 'text_source': args.texts or 'corpus_chunks.pkl sample',
+              'batch_size': args.batch_size}
+    if not args.skip_encoder:
+        report['encoder'] = compare_encoders(texts, args.backends, args.encoder, args.batch_size, args.threshold)
+        for row in report['encoder']:
+            print(f"   encoder/{row['backend']}: {row['throughput_per_s']} texts/s, "
+                  f"cosine min={row.get('cosine_to_fp32_min', 1.0)}, flips={row.get('threshold_flips', 0)}")
+    if not args.skip_ai:
+        if Path(args.ai_model).exists():
+            report['ai_detector'] = compare_ai_classifiers(texts, args.backends, args.ai_model, args.batch_size)
+            for row in report['ai_detector']:
+                print(f"   ai/{row['backend']}: {row['throughput_per_s']} texts/s, "
+                      f"max delta={row.get('confidence_delta_max', 0.0)}, flips={row.get('label_flips', 0)}")
+        else:
+            print(f"Warning: AI model not found at {args.ai_model}, skipping detector comparison")
+
+    report_path = Path(args.report) if args.report else DATA_DIR / 'inference_backend_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✅ Report written to {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+In-process dynamic batching for model inference
+Concurrent requests submit their encode / classify work to a BatchScheduler;
+a single worker thread coalesces whatever is pending (up to max_batch_size
+items, waiting at most max_wait_ms for more) into one call of the batch
+function and hands each caller its slice of the results through a Future.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    def __init__(self, batch_fn, max_batch_size=64, max_wait_ms=5, name='batch'):
+        """batch_fn(items) must return one result per item, in order"""
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._carry = None
+        self._worker = None
+
+    def submit(self, items):
+        """Queue a list of items; the Future resolves to their results (a list)"""
+        future = Future()
+        items = list(items)
+        if not items:
+            future.set_result([])
+            return future
+        self._ensure_worker()
+        self._queue.put((items, future))
+        return future
+
+    def run(self, items):
+        """Blocking helper: submit and wait"""
+        return self.submit(items).result()
+
+    def queue_depth(self):
+        """Requests waiting, including one held back from a full batch for the next one"""
+        if self._queue is None or self._pid != os.getpid():
+            return 0
+        return self._queue.qsize() + (self._carry is not None)
+
+    def _ensure_worker(self):
+        # Started lazily and restarted in forked children, which do not inherit threads
+        if self._pid == os.getpid() and self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._worker is not None and self._worker.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._carry = None
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, args=(self._queue,),
+                                            name=f'{self.name}-scheduler', daemon=True)
+            self._worker.start()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'queue_depth': self.queue_depth(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'batches': self.batches,
+            'requests': self.requests,
+            'items': self.items,
+            'avg_batch_items': round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+    def _next_request(self, requests, timeout=None):
+        if self._carry is not None:
+            pending, self._carry = self._carry, None
+            return pending
+        return requests.get(timeout=timeout)
+
+    def _run(self, requests):
+        while True:
+            pending = [self._next_request(requests)]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._next_request(requests, timeout=remaining)
+                except queue.Empty:
+                    break
+                if size + len(request[0]) > self.max_batch_size:
+                    # Keep it for the next batch rather than overshooting this one
+                    self._carry = request
+                    break
+                pending.append(request)
+                size += len(request[0])
+            self._execute(pending)
+
+    def _execute(self, pending):
+        # Callers that gave up (cancelled futures) are dropped before running
+        pending = [(items, future) for items, future in pending if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        all_items = [item for items, _ in pending for item in items]
+        try:
+            results = self.batch_fn(all_items)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.requests += len(pending)
+        self.items += len(all_items)
+        offset = 0
+        for items, future in pending:
+            future.set_result(results[offset:offset + len(items)])
+            offset += len(items)
@@ -0,0 +1,217 @@
+"""
+Lexical shingle index over the corpus chunks
+Every chunk is reduced to the set of its hashed word 4-grams (shingles) and an
+inverted index maps each shingle to the chunks containing it: sorted keys plus
+CSR postings, numpy arrays that are memory-mapped when prebuilt. Looking up a
+query chunk is one searchsorted and one unique over the postings (well under
+a millisecond) and gives, for every corpus chunk sharing shingles with it, the
+containment: the share of the query chunk's shingles found in that chunk
+(1.0 for a verbatim copy, also when the query is only part of a longer chunk).
+
+CompletePlagiarismDetector uses it to resolve query chunks found verbatim in
+the corpus without the encoder, and DocumentScorer gets the containment of
+every hit as the doc_lexical feature.
+
+Usage (otherwise the API builds the index in memory at startup):
+    python backend/api/lexical_index.py
+"""
+
+import argparse
+import json
+import pickle
+import re
+import time
+import unicodedata
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+INDEX_DIR = DATA_DIR / 'lexical_index'
+
+SHINGLE_SIZE = 4
+# Shingles held by more chunks than this (stock phrases) are ignored on both sides
+MAX_POSTINGS = 1000
+
+_WORD_RE = re.compile(r'\w+')
+_HASH_BASE = np.uint64(1099511628211)
+_ARRAYS = ('keys', 'offsets', 'postings', 'chunk_shingles')
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """Sorted distinct 64-bit hashes of the word size-grams of a text (case and punctuation ignored)"""
+    words = _WORD_RE.findall(unicodedata.normalize('NFC', text).lower())
+    if len(words) < size:
+        return np.empty(0, dtype=np.uint64)
+    tokens = np.fromiter((zlib.crc32(w.encode('utf-8')) for w in words), dtype=np.uint64, count=len(words))
+    n = len(words) - size + 1
+    hashes = np.zeros(n, dtype=np.uint64)
+    for j in range(size):
+        hashes = hashes * _HASH_BASE + tokens[j:j + n]
+    return np.unique(hashes)
+
+
+class LexicalIndex:
+    def __init__(self, keys, offsets, postings, chunk_shingles, shingle_size=SHINGLE_SIZE,
+                 max_postings=MAX_POSTINGS, version=None):
+        """
+        keys: sorted shingle hashes; the chunks holding keys[i] are
+        postings[offsets[i]:offsets[i + 1]]. chunk_shingles: shingles per chunk.
+        """
+        self.keys = keys
+        self.offsets = offsets
+        self.postings = postings
+        self.chunk_shingles = chunk_shingles
+        self.shingle_size = shingle_size
+        self.max_postings = max_postings
+        self.version = version
+
+    def __len__(self):
+        return len(self.chunk_shingles)
+
+    @classmethod
+    def build(cls, texts, shingle_size=SHINGLE_SIZE, max_postings=MAX_POSTINGS, version=None):
+        per_chunk = [shingle_hashes(text, shingle_size) for text in texts]
+        counts = np.array([len(h) for h in per_chunk], dtype=np.int32)
+        all_keys = np.concatenate(per_chunk) if per_chunk else np.empty(0, dtype=np.uint64)
+        rows = np.repeat(np.arange(len(per_chunk), dtype=np.int32), counts)
+        order = np.argsort(all_keys, kind='stable')
+        keys, starts = np.unique(all_keys[order], return_index=True)
+        offsets = np.append(starts, len(all_keys)).astype(np.int64)
+        return cls(keys, offsets, rows[order], counts, shingle_size, max_postings, version)
+
+    def save(self, path=INDEX_DIR):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(path / f'{name}.npy', getattr(self, name))
+        with open(path / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'shingle_size': self.shingle_size,
+                       'max_postings': self.max_postings, 'num_chunks': len(self),
+                       'num_shingles': len(self.keys)}, f, indent=2)
+
+    @classmethod
+    def load(cls, path=INDEX_DIR, version=None):
+        """Memory-mapped index from path; None when it is missing or was built for another corpus version"""
+        path = Path(path)
+        if not (path / 'manifest.json').exists():
+            return None
+        with open(path / 'manifest.json', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if version is not None and manifest['version'] != version:
+            return None
+        arrays = [np.load(path / f'{name}.npy', mmap_mode='r') for name in _ARRAYS]
+        return cls(*arrays, manifest['shingle_size'], manifest['max_postings'], manifest['version'])
+
+    def rare(self, hashes):
+        """The query shingles that are not stock phrases of this index"""
+        if len(self.keys) == 0 or len(hashes) == 0:
+            return hashes
+        pos = np.minimum(np.searchsorted(self.keys, hashes), len(self.keys) - 1)
+        found = self.keys[pos] == hashes
+        df = np.where(found, self.offsets[pos + 1] - self.offsets[pos], 0)
+        return hashes[df <= self.max_postings]
+
+    def hits(self, hashes):
+        """Chunk row of every (shingle, chunk) posting of the given shingles"""
+        if len(self.keys) == 0 or len(hashes) == 0:
+            return np.empty(0, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, hashes), len(self.keys) - 1)
+        pos = pos[self.keys[pos] == hashes]
+        starts = np.asarray(self.offsets[pos], dtype=np.int64)
+        lengths = np.asarray(self.offsets[pos + 1], dtype=np.int64) - starts
+        # Concatenate the posting slices without a Python loop
+        flat = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        return np.asarray(self.postings[flat], dtype=np.int64)
+
+    def match(self, text, min_containment=0.0):
+        """
+        Corpus chunks sharing shingles with text -> (chunk rows, containment,
+        number of informative query shingles), best containment first.
+        """
+        return match_hashes(self, shingle_hashes(text, self.shingle_size), min_containment)
+
+
+class AppendedLexicalIndex:
+    """The base lexical index (never modified) followed by one over the delta chunks"""
+
+    def __init__(self, base, delta_texts):
+        self.base = base
+        self.shingle_size = base.shingle_size
+        # Stock phrases are judged on the base index only
+        self.delta = LexicalIndex.build(delta_texts, base.shingle_size)
+
+    def __len__(self):
+        return len(self.base) + len(self.delta)
+
+    def rare(self, hashes):
+        return self.base.rare(hashes)
+
+    def hits(self, hashes):
+        return np.concatenate([self.base.hits(hashes), self.delta.hits(hashes) + len(self.base)])
+
+    def match(self, text, min_containment=0.0):
+        return match_hashes(self, shingle_hashes(text, self.shingle_size), min_containment)
+
+
+def match_hashes(index, hashes, min_containment=0.0):
+    hashes = index.rare(hashes)
+    rows, shared = np.unique(index.hits(hashes), return_counts=True)
+    containment = shared / max(len(hashes), 1)
+    keep = containment >= min_containment
+    rows, containment = rows[keep], containment[keep]
+    order = np.argsort(-containment, kind='stable')
+    return rows[order], containment[order], len(hashes)
+
+
+# ===============================================
+# CLI
+# ===============================================
+
+def _load_chunk_texts(data_dir):
+    """(chunk texts, corpus version) from the corpus store, else from the notebook pickles"""
+    from corpus_store import CorpusStore, legacy_corpus_version
+    store_dir = data_dir / 'corpus_store'
+    if CorpusStore.exists(store_dir):
+        store = CorpusStore(store_dir)
+        return store.chunk_text, store.version
+    with open(data_dir / 'corpus_chunks.pkl', 'rb') as f:
+        return [chunk['text'] for chunk in pickle.load(f)], legacy_corpus_version(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the lexical shingle index of the plagiarism corpus')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--output', default=None, help='Index directory (default <data-dir>/lexical_index)')
+    parser.add_argument('--shingle-size', type=int, default=SHINGLE_SIZE, help='Words per shingle')
+    parser.add_argument('--max-postings', type=int, default=MAX_POSTINGS, help='Ignore shingles in more chunks')
+    parser.add_argument('--num-queries', type=int, default=500, help='Chunks looked up for the latency report')
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    texts, version = _load_chunk_texts(data_dir)
+    start = time.perf_counter()
+    index = LexicalIndex.build(texts, args.shingle_size, args.max_postings, version)
+    build_time = time.perf_counter() - start
+    index.save(args.output or data_dir / 'lexical_index')
+    print(f"✅ Built lexical index over {len(index)} chunks: {len(index.keys)} shingles, "
+          f"{len(index.postings)} postings in {build_time:.1f}s")
+
+    # Every sampled chunk must find itself with containment 1.0
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(texts), size=min(args.num_queries, len(texts)), replace=False)
+    latencies, found = [], 0
+    for row in sample:
+        t = time.perf_counter()
+        rows, containment, n_shingles = index.match(texts[row])
+        latencies.append((time.perf_counter() - t) * 1000)
+        found += bool(n_shingles == 0 or (row in rows[containment >= 1.0]))
+    if latencies:
+        print(f"   self-match {found}/{len(sample)}, lookup p50={np.percentile(latencies, 50):.3f}ms "
+              f"p99={np.percentile(latencies, 99):.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,598 @@
+"""
+Incremental corpus ingestion on top of the frozen base corpus
+New documents are chunked with TextChunker, encoded in batches and appended to
+a delta log kept next to the base artifacts; deletes are tombstones in the same
+log. Every API process replays the log tail on its next request and searches
+the base FAISS index (read-only, possibly mmap'd) plus a small flat index over
+the delta, so searches keep running while documents are added. `compact` folds
+base + delta - tombstones into a new corpus store and FAISS index.
+
+Layout of data/corpus_delta/<base corpus version>/:
+    log.jsonl        one record per line, in order:
+                     {"op": "add", "doc": {...}, "chunks": [...], "row": <first embedding row>}
+                     {"op": "delete", "doc_id": "..."}
+    embeddings.f32   float32 rows of the added chunks, in log order
+
+Usage:
+    python backend/api/live_corpus.py add new_docs.jsonl      # one {"id", "text", "title", ...} per line
+    python backend/api/live_corpus.py delete doc_123 doc_456
+    python backend/api/live_corpus.py compact                  # then restart the API processes
+    python backend/api/live_corpus.py stats
+"""
+
+import argparse
+import json
+import os
+import pickle
+import threading
+import time
+from collections import ChainMap, namedtuple
+from collections.abc import Sequence
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from corpus_store import (CorpusIndex, CorpusStore, STORE_DIR, compute_doc_chunk_layout, legacy_corpus_version,
+                          swap_store, write_store)
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writer at a time is assumed
+    fcntl = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+DELTA_DIR = DATA_DIR / 'corpus_delta'
+
+LOG_FILE = 'log.jsonl'
+EMBEDDINGS_FILE = 'embeddings.f32'
+# Written by compact into the old version's log, which then takes no more records
+SEALED_FILE = 'sealed'
+
+# What the detector searches: chunk_alive is None when nothing is tombstoned
+CorpusSnapshot = namedtuple('CorpusSnapshot', 'chunks index embeddings faiss_index chunk_alive version')
+
+
+class LogSealedError(RuntimeError):
+    """The log's base corpus was compacted into a new version; the API must restart to serve it"""
+
+
+class DeltaLog:
+    """Append-only record log plus raw embedding rows for one base corpus version"""
+
+    def __init__(self, path, dim):
+        self.path = Path(path)
+        self.dim = dim
+        self.log_path = self.path / LOG_FILE
+        self.embeddings_path = self.path / EMBEDDINGS_FILE
+
+    def size(self):
+        try:
+            return self.log_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    @contextmanager
+    def _locked(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    @contextmanager
+    def _writable(self):
+        with self._locked():
+            if (self.path / SEALED_FILE).exists():
+                raise LogSealedError(f"Corpus {self.path.name} was compacted into "
+                                     f"{(self.path / SEALED_FILE).read_text().strip()}; restart the API to change it")
+            yield
+
+    def _append_lines(self, records):
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append_documents(self, documents, chunk_lists, embeddings):
+        """documents[i] owns chunk_lists[i]; embeddings has one row per chunk, in the same order"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        row_bytes = 4 * self.dim
+        with self._writable():
+            size = self.embeddings_path.stat().st_size if self.embeddings_path.exists() else 0
+            row = size // row_bytes
+            if size % row_bytes:
+                # A write torn by a crash: its log line was never written, drop the partial row
+                os.truncate(self.embeddings_path, row * row_bytes)
+            # Embeddings first: a log line is only written once its rows are on disk
+            with open(self.embeddings_path, 'ab') as f:
+                f.write(embeddings.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            records = []
+            for doc, chunks in zip(documents, chunk_lists):
+                records.append({'op': 'add', 'doc': doc, 'chunks': chunks, 'row': row})
+                row += len(chunks)
+            self._append_lines(records)
+
+    def append_deletes(self, doc_ids):
+        with self._writable():
+            self._append_lines([{'op': 'delete', 'doc_id': doc_id} for doc_id in doc_ids])
+
+    def read(self, offset=0):
+        """Complete records after byte offset -> (records, new offset)"""
+        if self.size() <= offset:
+            return [], offset
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return records, offset + end
+
+    def embeddings(self, start_row, num_rows):
+        if num_rows == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        rows = np.fromfile(self.embeddings_path, dtype=np.float32, count=num_rows * self.dim,
+                           offset=start_row * self.dim * 4)
+        return rows.reshape(num_rows, self.dim)
+
+
+class ChainedSequence(Sequence):
+    """Read-only base sequence followed by a tail list (indices of the base are unchanged)"""
+
+    def __init__(self, base, tail):
+        self.base = base
+        self.tail = tail
+        self._base_len = len(base)
+
+    def __len__(self):
+        return self._base_len + len(self.tail)
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if i < self._base_len:
+            return self.base[i]
+        return self.tail[i - self._base_len]
+
+
+class SegmentedMatrix:
+    """Row-wise concatenation of embedding matrices without copying them"""
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.offsets = np.cumsum([0] + [len(s) for s in segments])
+        self.shape = (int(self.offsets[-1]), segments[0].shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def similarities(self, queries):
+        """queries @ matrix.T, one BLAS call per segment"""
+        return np.hstack([np.dot(queries, s.T) for s in self.segments])
+
+    def __getitem__(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        segment = np.searchsorted(self.offsets, rows, side='right') - 1
+        out = np.empty((len(rows), self.shape[1]), dtype=np.float32)
+        for i, s in enumerate(self.segments):
+            mask = segment == i
+            if mask.any():
+                out[mask] = s[rows[mask] - self.offsets[i]]
+        return out
+
+
+class SegmentedArray:
+    """1-D counterpart of SegmentedMatrix: indexes like the concatenation of its segments without building it"""
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.offsets = np.cumsum([0] + [len(s) for s in segments])
+        self.dtype = np.result_type(*segments)
+        self.shape = (int(self.offsets[-1]),)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.concatenate(self.segments).astype(dtype or self.dtype, copy=False)
+
+    def sum(self):
+        return sum(s.sum() for s in self.segments)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice) and key.step in (None, 1):
+            start, stop, _ = key.indices(len(self))
+            parts = [s[max(start - o, 0):max(stop - o, 0)] for s, o in zip(self.segments, self.offsets)]
+            parts = [part for part in parts if len(part)]
+            return parts[0] if len(parts) == 1 else np.concatenate(parts or [np.empty(0, dtype=self.dtype)])
+        if isinstance(key, (int, np.integer)):
+            i = int(key) + len(self) if key < 0 else int(key)
+            segment = int(np.searchsorted(self.offsets, i, side='right')) - 1
+            return self.segments[segment][i - self.offsets[segment]]
+        rows = np.asarray(key, dtype=np.int64)
+        flat = rows.ravel()
+        flat = np.where(flat < 0, flat + len(self), flat)
+        segment = np.searchsorted(self.offsets, flat, side='right') - 1
+        out = np.empty(len(flat), dtype=self.dtype)
+        for i, s in enumerate(self.segments):
+            mask = segment == i
+            if mask.any():
+                out[mask] = s[flat[mask] - self.offsets[i]]
+        return out.reshape(rows.shape)
+
+
+class AppendedIndex:
+    """The base FAISS index (never modified) followed by a flat index over the delta rows"""
+
+    def __init__(self, base, delta_embeddings):
+        import faiss
+        self.base = base
+        self.d = base.d
+        self.delta = faiss.IndexFlatIP(base.d)
+        if len(delta_embeddings):
+            self.delta.add(np.ascontiguousarray(delta_embeddings, dtype=np.float32))
+        self.ntotal = base.ntotal + self.delta.ntotal
+
+    def search(self, queries, k):
+        scores, ids = self.base.search(queries, max(1, min(k, self.base.ntotal)))
+        if self.delta.ntotal == 0:
+            return scores, ids
+        delta_scores, delta_ids = self.delta.search(queries, min(k, self.delta.ntotal))
+        delta_ids = np.where(delta_ids >= 0, delta_ids + self.base.ntotal, -1)
+        scores = np.hstack([scores, delta_scores])
+        ids = np.hstack([ids, delta_ids])
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class LiveCorpus:
+    """
+    Base corpus plus the replayed delta log. Delta documents always get new
+    document rows and delta chunks new chunk rows after the base ones, so every
+    row a search has already returned stays valid in later snapshots.
+    """
+
+    def __init__(self, base_chunks, base_index, base_embeddings, base_faiss, base_metadata,
+                 base_version, delta_root=DELTA_DIR):
+        self.base_chunks = base_chunks
+        self.base_index = base_index
+        self.base_embeddings = base_embeddings
+        self.base_faiss = base_faiss
+        self.base_version = base_version
+        self.log = DeltaLog(Path(delta_root) / base_version, base_embeddings.shape[1])
+        # doc_id -> document, updated in place as delta documents arrive
+        self.metadata = ChainMap({}, base_metadata)
+        self.dead_rows = set()
+        # Liveness of the base chunks, allocated when the first base document dies
+        self._base_alive = None
+        self._delta_docs = []
+        self._delta_doc_row = {}
+        self._delta_chunks = []
+        self._delta_chunk_doc_idx = []
+        self._delta_positions = []
+        self._delta_embeddings = np.empty((0, base_embeddings.shape[1]), dtype=np.float32)
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.snapshot = CorpusSnapshot(base_chunks, base_index, base_embeddings, base_faiss, None, base_version)
+
+    @property
+    def num_base_docs(self):
+        return len(self.base_index.doc_ids)
+
+    def _tombstone(self, row):
+        """
+        Mark a document row dead. Base chunks only ever die, so their mask is
+        updated in place: a request still on the previous snapshot may already
+        skip a base document deleted since. Delta masks are rebuilt per snapshot.
+        """
+        self.dead_rows.add(row)
+        if row >= self.num_base_docs:
+            return
+        if self._base_alive is None:
+            self._base_alive = np.ones(len(self.base_chunks), dtype=bool)
+        self._base_alive[self.base_index.doc_chunk_indices(row)] = False
+
+    def row_of(self, doc_id):
+        row = self._delta_doc_row.get(doc_id)
+        return row if row is not None else self.base_index.doc_row.get(doc_id)
+
+    def refresh(self, publish=None):
+        """
+        Replay new log records; returns the new snapshot, or None when nothing
+        changed. publish(snapshot) runs under the replay lock and the offset only
+        moves after it, so a caller that finds another thread replaying waits:
+        on return everything logged before the call is served.
+        """
+        if self.log.size() == self._offset:
+            return None
+        with self._lock:
+            records, offset = self.log.read(self._offset)
+            if not records:
+                return None
+            self._apply(records)
+            snapshot = self._build_snapshot(offset)
+            if publish is not None:
+                publish(snapshot)
+            self.snapshot = snapshot
+            self._offset = offset
+            return snapshot
+
+    def _apply(self, records):
+        adds = [r for r in records if r['op'] == 'add']
+        if adds:
+            first = adds[0]['row']
+            last = adds[-1]['row'] + len(adds[-1]['chunks'])
+            rows = self.log.embeddings(first, last - first)
+            blocks = [self._delta_embeddings]
+
+        for record in records:
+            if record['op'] == 'delete':
+                row = self.row_of(record['doc_id'])
+                if row is not None and row not in self.dead_rows:
+                    self._tombstone(row)
+                continue
+
+            doc = record['doc']
+            doc_id = doc['id']
+            replaced = self.row_of(doc_id)
+            if replaced is not None and replaced not in self.dead_rows:
+                self._tombstone(replaced)
+            row = self.num_base_docs + len(self._delta_docs)
+            self._delta_docs.append(doc)
+            self._delta_doc_row[doc_id] = row
+            self.metadata.maps[0][doc_id] = doc
+            for chunk in record['chunks']:
+                self._delta_chunks.append({**chunk, 'doc_id': doc_id})
+                self._delta_chunk_doc_idx.append(row)
+                self._delta_positions.append(chunk['position'])
+            start = record['row'] - first
+            blocks.append(rows[start:start + len(record['chunks'])])
+
+        if adds:
+            self._delta_embeddings = np.ascontiguousarray(np.vstack(blocks), dtype=np.float32)
+
+    def _build_snapshot(self, offset):
+        """Base columns are chained to the delta ones, never copied: a refresh costs O(delta), not O(corpus)"""
+        base = self.base_index
+        num_base_chunks = len(self.base_chunks)
+        delta_doc_idx = np.asarray(self._delta_chunk_doc_idx, dtype=np.int32)
+        delta_positions = np.asarray(self._delta_positions, dtype=np.int32)
+        # Delta documents only own delta chunks, so their layout is appended to the base one
+        delta_order, delta_offsets = compute_doc_chunk_layout(
+            delta_doc_idx - self.num_base_docs, delta_positions, len(self._delta_docs)
+        )
+        index = CorpusIndex(
+            ChainedSequence(base.doc_ids, [doc['id'] for doc in self._delta_docs]),
+            SegmentedArray([base.chunk_doc_idx, delta_doc_idx]),
+            SegmentedArray([base.chunk_position, delta_positions]),
+            doc_row=ChainMap(dict(self._delta_doc_row), base.doc_row),
+            chunk_order=SegmentedArray([base.chunk_order, delta_order + num_base_chunks]),
+            doc_offsets=SegmentedArray([base.doc_offsets, delta_offsets[1:] + base.doc_offsets[-1]]),
+            doc_chunk_counts=SegmentedArray([base.doc_chunk_counts, np.diff(delta_offsets)])
+        )
+        chunk_alive = None
+        if self.dead_rows:
+            base_alive = self._base_alive if self._base_alive is not None else np.broadcast_to(True, (num_base_chunks,))
+            dead_delta_rows = np.fromiter((r for r in self.dead_rows if r >= self.num_base_docs), dtype=np.int64)
+            chunk_alive = SegmentedArray([base_alive, ~np.isin(delta_doc_idx, dead_delta_rows)])
+        embeddings = SegmentedMatrix([self.base_embeddings, self._delta_embeddings])
+        faiss_index = AppendedIndex(self.base_faiss, self._delta_embeddings) if self.base_faiss is not None else None
+        return CorpusSnapshot(ChainedSequence(self.base_chunks, list(self._delta_chunks)), index, embeddings,
+                              faiss_index, chunk_alive, f"{self.base_version}+{offset}")
+
+    def delta_document(self, row):
+        return self._delta_docs[row - self.num_base_docs]
+
+    def stats(self):
+        alive = self.snapshot.chunk_alive
+        dead_chunks = 0 if alive is None else len(alive) - int(alive.sum())
+        return {
+            'version': self.snapshot.version,
+            'base_documents': self.num_base_docs,
+            'base_chunks': len(self.base_chunks),
+            'delta_documents': len(self._delta_docs),
+            'delta_chunks': len(self._delta_chunks),
+            'tombstoned_documents': len(self.dead_rows),
+            'tombstoned_chunks': dead_chunks,
+            'log_bytes': self._offset
+        }
+
+
+def prepare_documents(documents, chunker):
+    """Validate and chunk documents -> (documents, chunk lists); raises ValueError on bad input"""
+    prepared, chunk_lists = [], []
+    seen = set()
+    for i, doc in enumerate(documents):
+        if not isinstance(doc, dict) or not str(doc.get('id') or '').strip():
+            raise ValueError(f'Document {i} needs a non-empty "id"')
+        if not isinstance(doc.get('text'), str) or not doc['text'].strip():
+            raise ValueError(f'Document "{doc["id"]}" needs a non-empty "text"')
+        doc = {**doc, 'id': str(doc['id']).strip()}
+        if doc['id'] in seen:
+            raise ValueError(f'Document "{doc["id"]}" appears twice in the batch')
+        seen.add(doc['id'])
+        chunks = [{k: c[k] for k in ('chunk_id', 'text', 'position', 'length')}
+                  for c in chunker.chunk_text(doc['text'], doc['id'])]
+        prepared.append(doc)
+        chunk_lists.append(chunks)
+    return prepared, chunk_lists
+
+
+def ingest_documents(log, documents, chunker, encode, batch_size=256):
+    """
+    Chunk, encode (encode(texts) must return L2-normalized float32 rows) and
+    append documents to the delta log. Returns counts.
+    """
+    documents, chunk_lists = prepare_documents(documents, chunker)
+    texts = [c['text'] for chunks in chunk_lists for c in chunks]
+    blocks = [encode(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    embeddings = np.vstack(blocks) if blocks else np.empty((0, log.dim), dtype=np.float32)
+    log.append_documents(documents, chunk_lists, embeddings)
+    return {'documents': len(documents), 'chunks': len(texts)}
+
+
+# ===============================================
+# CLI
+# ===============================================
+
+def base_version(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    """(version, dim) of the base corpus the API would load; names the delta directory"""
+    if CorpusStore.exists(store_dir):
+        store = CorpusStore(store_dir)
+        return store.version, store.manifest['dim']
+    embeddings = np.load(data_dir / 'chunk_embeddings_normalized.npy', mmap_mode='r')
+    return legacy_corpus_version(data_dir), embeddings.shape[1]
+
+
+def load_base(data_dir=DATA_DIR, store_dir=STORE_DIR):
+    """(chunks, CorpusIndex, embeddings, docs, version) of the base corpus, as the API loads it"""
+    if CorpusStore.exists(store_dir):
+        store = CorpusStore(store_dir)
+        return store.chunks, CorpusIndex.from_store(store), store.embeddings, store.docs, store.version
+    with open(data_dir / 'vn_plagiarism_corpus.json', 'r', encoding='utf-8') as f:
+        docs = json.load(f)
+    with open(data_dir / 'corpus_chunks.pkl', 'rb') as f:
+        chunks = pickle.load(f)
+    embeddings = np.load(data_dir / 'chunk_embeddings_normalized.npy', mmap_mode='r')
+    return chunks, CorpusIndex.from_chunks(chunks, list(docs)), embeddings, docs, legacy_corpus_version(data_dir)
+
+
+def compact(data_dir=DATA_DIR, store_dir=STORE_DIR, delta_root=DELTA_DIR, index_types=('flat',)):
+    """
+    Write base + delta - tombstones as a new corpus store and FAISS index(es).
+    The new store gets a new version and its own delta log. Records logged
+    while it is built are carried over to that log, and the old log is sealed
+    under its lock at the swap, so nothing ingested meanwhile is lost. Running
+    API processes keep serving their old generation (and refuse to ingest)
+    until they are restarted.
+    """
+    import faiss
+    from index_builder import INDEX_FILES, build_index, index_path
+
+    data_dir, store_dir = Path(data_dir), Path(store_dir)
+    chunks, index, embeddings, docs, version = load_base(data_dir, store_dir)
+    live = LiveCorpus(chunks, index, embeddings, None, {}, version, delta_root)
+    live.refresh()
+    snapshot = live.snapshot
+    if snapshot.version == version:
+        print("Nothing to compact: the delta log is empty")
+        return None
+
+    new_docs = []
+    for row in range(len(snapshot.index.doc_ids)):
+        if row in live.dead_rows:
+            continue
+        if row >= live.num_base_docs:
+            new_docs.append(live.delta_document(row))
+        elif row < len(docs):
+            new_docs.append(docs[row])
+        else:
+            new_docs.append({'id': snapshot.index.doc_ids[row], 'text': ''})
+    alive = snapshot.chunk_alive
+    alive = np.asarray(alive) if alive is not None else np.ones(len(snapshot.chunks), dtype=bool)
+    keep = np.flatnonzero(alive)
+    new_chunks = [snapshot.chunks[i] for i in keep]
+    new_embeddings = snapshot.embeddings[keep]
+    print(f"Compacting: {len(new_docs)} documents, {len(new_chunks)} chunks "
+          f"({live.stats()['tombstoned_documents']} tombstoned documents dropped)")
+
+    # Everything is written next to the live files first, then swapped in by rename
+    staging = store_dir.with_name(store_dir.name + '.new')
+    manifest = write_store(new_docs, new_chunks, new_embeddings, [c['chunk_id'] for c in new_chunks], staging)
+
+    types = set(index_types) | {t for t in INDEX_FILES if index_path(t, data_dir).exists()}
+    staged_indexes = []
+    for index_type in sorted(types):
+        start = time.perf_counter()
+        faiss_index = build_index(index_type, new_embeddings)
+        tmp_path = Path(f"{index_path(index_type, data_dir)}.tmp")
+        faiss.write_index(faiss_index, str(tmp_path))
+        staged_indexes.append((tmp_path, index_path(index_type, data_dir)))
+        print(f"   built {index_type} index in {time.perf_counter() - start:.1f}s")
+
+    with live.log._locked():
+        tail, _ = live.log.read(live._offset)
+        swap_store(staging, store_dir)
+        for tmp_path, final_path in staged_indexes:
+            os.replace(tmp_path, final_path)
+        carry_records(live.log, tail, DeltaLog(Path(delta_root) / manifest['version'], live.log.dim))
+        (live.log.path / SEALED_FILE).write_text(manifest['version'])
+    if tail:
+        print(f"   carried {len(tail)} records logged during compaction into the new delta log")
+    print(f"✅ New corpus store {store_dir} (version {manifest['version']}); restart the API to serve it")
+    return manifest
+
+
+def carry_records(source, records, target):
+    """Append records read from source to target, added documents with their embedding rows"""
+    for record in records:
+        if record['op'] == 'delete':
+            target.append_deletes([record['doc_id']])
+        else:
+            target.append_documents([record['doc']], [record['chunks']],
+                                    source.embeddings(record['row'], len(record['chunks'])))
+
+
+def read_document_file(path):
+    """JSON list or JSON lines of {"id", "text", ...}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if content.lstrip().startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add / delete corpus documents without a full rebuild')
+    parser.add_argument('command', choices=['add', 'delete', 'compact', 'stats'])
+    parser.add_argument('args', nargs='*', help='add: document files; delete: document ids')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--store', default=None, help='Corpus store directory (default <data-dir>/corpus_store)')
+    parser.add_argument('--delta-dir', default=None, help='Delta log root (default <data-dir>/corpus_delta)')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--index-types', nargs='+', default=['flat'], help='FAISS indexes to build on compact')
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    store_dir = Path(args.store) if args.store else data_dir / 'corpus_store'
+    delta_root = Path(args.delta_dir) if args.delta_dir else data_dir / 'corpus_delta'
+
+    if args.command == 'compact':
+        compact(data_dir, store_dir, delta_root, args.index_types)
+        return
+
+    version, dim = base_version(data_dir, store_dir)
+    log = DeltaLog(delta_root / version, dim)
+    if args.command == 'stats':
+        records, size = log.read(0)
+        adds = [r for r in records if r['op'] == 'add']
+        print(json.dumps({
+            'base_version': version,
+            'log': str(log.log_path),
+            'log_bytes': size,
+            'added_documents': len(adds),
+            'added_chunks': sum(len(r['chunks']) for r in adds),
+            'deletes': len(records) - len(adds)
+        }, indent=2))
+    elif args.command == 'delete':
+        if not args.args:
+            raise SystemExit('delete needs at least one document id')
+        log.append_deletes(args.args)
+        print(f"✅ Tombstoned {len(args.args)} documents")
+    else:
+        from inference_backends import ENCODER_MODEL_NAME, load_bi_encoder
+        from text_chunker import TextChunker
+        documents = [doc for path in args.args for doc in read_document_file(path)]
+        encoder = load_bi_encoder(ENCODER_MODEL_NAME, os.environ.get('PLAGIARISM_ENCODER_BACKEND', 'torch'))
+        encode = lambda texts: encoder.encode(texts, show_progress_bar=False, convert_to_numpy=True,
+                                              normalize_embeddings=True).astype(np.float32)
+        counts = ingest_documents(log, documents, TextChunker(), encode, batch_size=args.batch_size)
+        print(f"✅ Added {counts['documents']} documents ({counts['chunks']} chunks) to {log.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Lightweight in-process metrics in the Prometheus text format
+Pipeline stages are timed with `with stage('encode'):`, which feeds the
+plagiarism_stage_seconds histogram and, while profiled() is active in the
+current request, that request's breakdown (?profile=1). Gauges such as queue
+depth, cache and limiter stats are read from the components at scrape time
+by collectors, so the hot path only pays for two clock reads and a lock.
+
+Every process keeps its own registry: under gunicorn each worker reports its
+own numbers (the `pid` label tells them apart).
+"""
+
+import bisect
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; spans a cached embedding lookup up to a long AI check
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if not value.is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, base_labels=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = list(base_labels) + list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = '+Inf' if math.isinf(bound) else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = []
+        self._collectors = []
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        histogram = Histogram(name, help_text, label_names, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collect):
+        """
+        collect() returns [(name, type, help, [(labels dict, value), ...]), ...]
+        and is called on every scrape; a failing collector is skipped.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        base_labels = [('pid', os.getpid())]
+        lines = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render(base_labels))
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                lines.append(f"# collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(base_labels + sorted(labels.items()))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram(
+    'plagiarism_stage_seconds', 'Time spent in each pipeline stage', ['stage']
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'plagiarism_http_request_seconds', 'HTTP request latency', ['endpoint', 'status']
+)
+
+_profile = ContextVar('metrics_profile', default=None)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        profile = _profile.get()
+        if profile is not None:
+            entry = profile.setdefault(name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+
+def timed(name):
+    """Decorator form of stage()"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def profiled(enabled=True):
+    """
+    Collect the stages run by this thread into a per-request breakdown; yields
+    a callable returning {stage: {'seconds', 'calls'}}. Work done on other
+    threads (e.g. the batch scheduler's forward pass) is timed where the
+    request waits for it.
+    """
+    if not enabled:
+        yield None
+        return
+    profile = {}
+    token = _profile.set(profile)
+    try:
+        yield lambda: {name: {'seconds': round(seconds, 6), 'calls': calls}
+                       for name, (seconds, calls) in profile.items()}
+    finally:
+        _profile.reset(token)
@@ -3,17 +3,40 @@ Flask API Server for Plagiarism Detection
 Load pre-trained models and expose REST API endpoints
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import atexit
+from contextlib import ExitStack
+import hashlib
+import hmac
 import json
 import numpy as np
 import pickle
 import os
 import re
+import threading
 import time
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 import faiss
+from admission import EndpointLimiter, configured_limits
+from ai_cascade import CheapAIScorer, check_band_report
+from ai_windows import (AI_WINDOW_MODES, analyze_ai_decided, analyze_ai_with_windows, get_ai_label,
+                        predict_probs_batched)
+from bulk_check import read_documents, run_pipeline, to_ndjson
+from collusion import CollusionDetector
+from corpus_store import CorpusIndex, CorpusStore, artifact_fingerprint, legacy_corpus_version
+from detector import PRUNE_MODES, CompletePlagiarismDetector, ContextExpander, DocumentScorer
+from embedding_cache import EmbeddingCache
+from inference_scheduler import BatchScheduler
+from inference_backends import load_ai_classifier, load_bi_encoder
+from index_builder import LOSSY_INDEX_TYPES, apply_search_params, index_path, read_index
+from lexical_index import AppendedLexicalIndex, LexicalIndex
+from live_corpus import LiveCorpus, LogSealedError, ingest_documents
+from metrics import REGISTRY, REQUEST_SECONDS, profiled, stage, timed
+from result_cache import ResultCache
+from sharding import ShardedIndex, track_missing_shards
+from startup import StartupOrchestrator
+from text_chunker import TextChunker
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
@@ -25,369 +48,177 @@ print("="*60)
 print("🚀 LOADING PRE-TRAINED MODELS...")
 print("="*60)
 
-# Resolve data directory relative to this file
+# Resolve data directory relative to this file (PLAGIARISM_DATA_DIR points elsewhere, e.g. a benchmark corpus)
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / 'data'
+DATA_DIR = Path(os.environ.get('PLAGIARISM_DATA_DIR', BASE_DIR / 'data'))
 
-# Load corpus data
-with open(DATA_DIR / 'vn_plagiarism_corpus.json', 'r', encoding='utf-8') as f:
-    corpus_data = json.load(f)
-print(f"✅ Loaded corpus: {len(corpus_data)} documents")
+# Memory-mapped corpus store (build with corpus_store.py); falls back to the
+# notebook json/pickle artifacts when it has not been built
+CORPUS_STORE_DIR = Path(os.environ.get('PLAGIARISM_CORPUS_STORE', DATA_DIR / 'corpus_store'))
+# The store holds its directory open, so compaction swapping the directory
+# does not change the generation this process serves
+corpus_store = CorpusStore(CORPUS_STORE_DIR) if CorpusStore.exists(CORPUS_STORE_DIR) else None
 
-# Load queries data (for metadata)
-with open(DATA_DIR / 'vn_plagiarism_queries.json', 'r', encoding='utf-8') as f:
-    queries_data = json.load(f)
-print(f"✅ Loaded queries: {len(queries_data)} queries")
-
-# Load bi-encoder model
+# PLAGIARISM_ENCODER_BACKEND: torch (fp32), int8 (dynamic quantization) or onnx (ONNX Runtime)
 model_name = "bkai-foundation-models/vietnamese-bi-encoder"
-bi_encoder = SentenceTransformer(model_name)
-print(f"✅ Loaded bi-encoder model: {model_name}")
+ENCODER_BACKEND = os.environ.get('PLAGIARISM_ENCODER_BACKEND', 'torch')
 
-# Load corpus chunks
-with open(DATA_DIR / 'corpus_chunks.pkl', 'rb') as f:
-    corpus_chunks = pickle.load(f)
-print(f"✅ Loaded corpus chunks: {len(corpus_chunks)} chunks")
+# FAISS index (build alternatives with index_builder.py)
+FAISS_INDEX_TYPE = os.environ.get('PLAGIARISM_INDEX_TYPE', 'flat')
+FAISS_NPROBE = int(os.environ.get('PLAGIARISM_FAISS_NPROBE', 16))
+FAISS_EF_SEARCH = int(os.environ.get('PLAGIARISM_FAISS_EF_SEARCH', 128))
 
-# Load embeddings
-chunk_embeddings_normalized = np.load(DATA_DIR / 'chunk_embeddings_normalized.npy')
-print(f"✅ Loaded embeddings: {chunk_embeddings_normalized.shape}")
+# Sharded deployment (sharding.py): shard server URLs, comma-separated. The
+# shards then hold the embeddings and their index; this process only maps them
+SHARD_URLS = [url.strip() for url in os.environ.get('PLAGIARISM_SHARDS', '').split(',') if url.strip()]
+SHARD_TIMEOUT_S = float(os.environ.get('PLAGIARISM_SHARD_TIMEOUT_MS', 2000)) / 1000.0
 
-# Load FAISS index
-chunk_faiss_index = faiss.read_index(str(DATA_DIR / 'chunk_faiss_index.faiss'))
-print(f"✅ Loaded FAISS index: {chunk_faiss_index.ntotal} vectors")
+# Lexical shingle index (build with lexical_index.py, otherwise built in memory at startup)
+LEXICAL_MODES = ('off', 'feature', 'prefilter')
+LEXICAL_MODE = os.environ.get('PLAGIARISM_LEXICAL', 'off')
+if LEXICAL_MODE not in LEXICAL_MODES:
+    raise ValueError(f"Unknown PLAGIARISM_LEXICAL '{LEXICAL_MODE}'. Choose from: {', '.join(LEXICAL_MODES)}")
+LEXICAL_INDEX_DIR = Path(os.environ.get('PLAGIARISM_LEXICAL_INDEX', DATA_DIR / 'lexical_index'))
+LEXICAL_VERBATIM = float(os.environ.get('PLAGIARISM_LEXICAL_VERBATIM', 0.9))
+LEXICAL_WEIGHT = float(os.environ.get('PLAGIARISM_LEXICAL_WEIGHT', 0.0))
+if LEXICAL_MODE == 'feature' and LEXICAL_WEIGHT == 0:
+    # The feature would not change any score, so don't pay for the index
+    print("Warning: PLAGIARISM_LEXICAL=feature with PLAGIARISM_LEXICAL_WEIGHT=0 has no effect, lexical index disabled")
+    LEXICAL_MODE = 'off'
 
-# Load chunk metadata
-with open(DATA_DIR / 'chunk_metadata.pkl', 'rb') as f:
-    metadata = pickle.load(f)
-chunk_ids = metadata['chunk_ids']
-print(f"✅ Loaded metadata: {len(chunk_ids)} chunk IDs")
 
-# Create chunk map for fast lookup
-chunk_map = {chunk['chunk_id']: chunk for chunk in corpus_chunks}
-doc_chunks_map = {}
-for chunk in corpus_chunks:
-    doc_chunks_map.setdefault(chunk['doc_id'], []).append(chunk)
+def _load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-# Create doc metadata map
-doc_metadata_map = {doc['id']: doc for doc in corpus_data}
 
-print("="*60)
-print("✅ ALL MODELS LOADED SUCCESSFULLY!")
-print("="*60)
-# ===============================================
-# INITIALIZE AI DETECTION TOKENIZER (GLOBAL)
-# ===============================================
-try:
-    from transformers import AutoTokenizer
-    tokenizer = AutoTokenizer.from_pretrained('vinai/phobert-base', use_fast=True)
-    print("AI tokenizer initialized")
-except Exception as e:
-    print(f"Warning: Could not initialize AI tokenizer: {e}")
-    tokenizer = None
-# ===============================================
-# UTILITY CLASSES (From Notebook)
-# ===============================================
+def _load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
 
-class TextChunker:
-    def __init__(self, chunk_type="adaptive", max_chunk_words=100):
-        self.chunk_type = chunk_type
-        self.max_chunk_words = max_chunk_words
-    
-    def chunk_text(self, text, doc_id):
-        word_count = len(text.split())
-        if self.chunk_type == "adaptive":
-            if word_count > 500:
-                return self._chunk_by_paragraph(text, doc_id)
-            else:
-                return self._chunk_by_sentence(text, doc_id)
-        elif self.chunk_type == "paragraph":
-            return self._chunk_by_paragraph(text, doc_id)
-        else:
-            return self._chunk_by_sentence(text, doc_id)
-    
-    def _chunk_by_sentence(self, text, doc_id):
-        sentences = re.split(r'[.!?]+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        chunks = []
-        for i, sentence in enumerate(sentences):
-            chunk = {
-                'chunk_id': f"{doc_id}_chunk_{i}",
-                'doc_id': doc_id,
-                'text': sentence,
-                'position': i,
-                'length': len(sentence.split())
-            }
-            chunks.append(chunk)
-        return chunks
-    
-    def _chunk_by_paragraph(self, text, doc_id):
-        paragraphs = re.split(r'\n\n+|\s{4,}', text)
-        paragraphs = [p.strip() for p in paragraphs if p.strip()]
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for para in paragraphs:
-            para_words = para.split()
-            para_length = len(para_words)
-            
-            if para_length > self.max_chunk_words:
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                sentences = re.split(r'[.!?]+', para)
-                sentences = [s.strip() for s in sentences if s.strip()]
-                temp_chunk = []
-                temp_length = 0
-                for sent in sentences:
-                    sent_len = len(sent.split())
-                    if temp_length + sent_len > self.max_chunk_words and temp_chunk:
-                        chunks.append(' '.join(temp_chunk))
-                        temp_chunk = [sent]
-                        temp_length = sent_len
-                    else:
-                        temp_chunk.append(sent)
-                        temp_length += sent_len
-                if temp_chunk:
-                    chunks.append(' '.join(temp_chunk))
-            elif current_length + para_length <= self.max_chunk_words:
-                current_chunk.append(para)
-                current_length += para_length
-            else:
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                current_chunk = [para]
-                current_length = para_length
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        chunk_objects = []
-        for i, chunk_text in enumerate(chunks):
-            chunk_objects.append({
-                'chunk_id': f"{doc_id}_chunk_{i}",
-                'doc_id': doc_id,
-                'text': chunk_text,
-                'position': i,
-                'length': len(chunk_text.split())
-            })
-        return chunk_objects
-
-
-class DocumentScorer:
-    def __init__(self, corpus_chunks, weights=None, score_center=0.55, score_scale=4.0):
-        self.corpus_chunks = corpus_chunks
-        self.weights = weights or {
-            'doc_max': 0.40,
-            'doc_mean': 0.20,
-            'doc_count': 0.15,
-            'doc_contiguous': 0.10,
-            'doc_coverage': 0.10,
-            'chunk_density': 0.05,
-            'span_penalty': 0.05
-        }
-        self.score_center = score_center
-        self.score_scale = score_scale
-        self.chunk_map = {chunk['chunk_id']: chunk for chunk in corpus_chunks}
-        self.doc_chunks_map = {}
-        for chunk in corpus_chunks:
-            self.doc_chunks_map.setdefault(chunk['doc_id'], []).append(chunk)
-
-    def calculate_doc_scores(self, top_k_results):
-        doc_similarities = {}
-        for similarity, chunk_idx in top_k_results:
-            chunk = self.corpus_chunks[chunk_idx]
-            doc_id = chunk['doc_id']
-            doc_similarities.setdefault(doc_id, []).append({
-                'similarity': similarity,
-                'chunk': chunk,
-                'chunk_idx': chunk_idx
-            })
 
-        doc_scores = []
-        for doc_id, chunk_sims in doc_similarities.items():
-            similarities = [cs['similarity'] for cs in chunk_sims]
-            doc_max = max(similarities)
-            doc_mean = np.mean(similarities)
-            total_doc_chunks = len(self.doc_chunks_map[doc_id])
-            coverage_ratio = min(len(similarities) / total_doc_chunks, 1.0)
-            doc_count = coverage_ratio
-
-            positions = sorted(cs['chunk']['position'] for cs in chunk_sims)
-            doc_contiguous, max_group_len = self._calculate_contiguous_score(positions)
-            span = positions[-1] - positions[0] + 1 if len(positions) > 1 else 1
-            span_ratio = min(span / total_doc_chunks, 1.0)
-            chunk_density = min(coverage_ratio / max(span_ratio, 1e-6), 1.0)
-            chunk_similarity_std = float(np.std(similarities)) if len(similarities) > 1 else 0.0
-
-            raw_score = (
-                self.weights['doc_max'] * doc_max +
-                self.weights['doc_mean'] * doc_mean +
-                self.weights['doc_count'] * doc_count +
-                self.weights['doc_contiguous'] * doc_contiguous +
-                self.weights['doc_coverage'] * coverage_ratio +
-                self.weights['chunk_density'] * chunk_density -
-                self.weights['span_penalty'] * (1.0 - span_ratio)
-            )
-
-            logistic_input = self.score_scale * (raw_score - self.score_center)
-            final_score = 1.0 / (1.0 + np.exp(-logistic_input))
-
-            doc_scores.append({
-                'doc_id': doc_id,
-                'doc_max': doc_max,
-                'doc_mean': doc_mean,
-                'doc_count': doc_count,
-                'doc_contiguous': doc_contiguous,
-                'final_score': final_score,
-                'raw_score': raw_score,
-                'chunk_similarity_std': chunk_similarity_std,
-                'position_span_ratio': span_ratio,
-                'chunk_density': chunk_density,
-                'contiguous_len': max_group_len,
-                'chunks': chunk_sims,
-                'num_chunks': len(chunk_sims)
-            })
+def _load_faiss_index():
+    index = read_index(FAISS_INDEX_TYPE, DATA_DIR, mmap=corpus_store is not None)
+    apply_search_params(index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH)
+    return index
 
-        doc_scores.sort(key=lambda x: x['final_score'], reverse=True)
-        return doc_scores
-
-    def _calculate_contiguous_score(self, positions):
-        if len(positions) <= 1:
-            return 0.0, len(positions)
-        contiguous_groups = []
-        current_group = [positions[0]]
-        for i in range(1, len(positions)):
-            if positions[i] - positions[i-1] <= 2:
-                current_group.append(positions[i])
-            else:
-                contiguous_groups.append(len(current_group))
-                current_group = [positions[i]]
-        contiguous_groups.append(len(current_group))
-        max_contiguous = max(contiguous_groups)
-        score = min(max_contiguous / len(positions), 1.0)
-        return score, max_contiguous
-
-
-class ContextExpander:
-    def __init__(self, corpus_chunks, corpus_data):
-        self.corpus_chunks = corpus_chunks
-        self.corpus_data = corpus_data
-        self.doc_text_map = {doc['id']: doc['text'] for doc in corpus_data}
-        self.doc_chunks_map = {}
-        for chunk in corpus_chunks:
-            doc_id = chunk['doc_id']
-            self.doc_chunks_map.setdefault(doc_id, []).append(chunk)
-        for doc_id in self.doc_chunks_map:
-            self.doc_chunks_map[doc_id].sort(key=lambda x: x['position'])
-    
-    def expand_chunk_context(self, chunk, context_window=1):
-        doc_id = chunk['doc_id']
-        position = chunk['position']
-        doc_chunks = self.doc_chunks_map[doc_id]
-        current_idx = next((idx for idx, c in enumerate(doc_chunks) if c['position'] == position), None)
-        if current_idx is None:
-            return chunk['text']
-        start_idx = max(0, current_idx - context_window)
-        end_idx = min(len(doc_chunks), current_idx + context_window + 1)
-        context_chunks = doc_chunks[start_idx:end_idx]
-        return " ".join([c['text'] for c in context_chunks])
-    
-    def get_best_chunk_per_doc(self, doc_scores, top_n=15):
-        best_chunks = []
-        for doc_score in doc_scores[:top_n]:
-            sorted_chunks = sorted(doc_score['chunks'], key=lambda x: x['similarity'], reverse=True)
-            chunk_data = sorted_chunks[0]
-            best_chunks.append({
-                'doc_id': doc_score['doc_id'],
-                'chunk': chunk_data['chunk'],
-                'chunk_similarity': chunk_data['similarity'],
-                'doc_final_score': doc_score['final_score'],
-                'doc_max': doc_score['doc_max'],
-                'doc_mean': doc_score['doc_mean'],
-                'doc_count': doc_score['doc_count'],
-                'doc_contiguous': doc_score['doc_contiguous']
-            })
-        return best_chunks
-
-
-class CompletePlagiarismDetector:
-    def __init__(self, bi_encoder, chunk_faiss_index, corpus_chunks, corpus_data,
-                 doc_scorer, context_expander, query_chunker=None, 
-                 max_query_chunks=10, threshold=0.6):
-        self.bi_encoder = bi_encoder
-        self.chunk_faiss_index = chunk_faiss_index
-        self.corpus_chunks = corpus_chunks
-        self.corpus_data = corpus_data
-        self.doc_scorer = doc_scorer
-        self.context_expander = context_expander
-        self.query_chunker = query_chunker or TextChunker()
-        self.max_query_chunks = max_query_chunks
-        self.threshold = threshold
-
-    def detect(self, query_text, top_k=100, top_n_docs=15, use_faiss=False, verbose=False):
-        query_chunks = self.query_chunker.chunk_text(query_text, doc_id="query")
-        if self.max_query_chunks and len(query_chunks) > self.max_query_chunks:
-            query_chunks = query_chunks[:self.max_query_chunks]
-        query_texts = [c['text'] for c in query_chunks]
-        word_count = len(query_text.split())
-
-        if len(query_texts) == 0:
-            return {
-                'prediction': False,
-                'confidence': 0.0,
-                'threshold': self.threshold,
-                'best_match': None,
-                'top_results': [],
-                'doc_scores': [],
-                'method': 'bi-encoder',
-                'query_chunks': 0,
-                'query_words': word_count,
-                'corpus_matches': 0
-            }
 
-        q_emb = self.bi_encoder.encode(query_texts, show_progress_bar=False, convert_to_numpy=True)
-        q_norms = np.linalg.norm(q_emb, axis=1, keepdims=True)
-        q_norms[q_norms < 1e-8] = 1.0
-        q_emb_norm = q_emb / q_norms
+# Independent artifacts load in parallel; the AI detector is added further down
+# as a background component
+startup = StartupOrchestrator()
+startup.submit('bi_encoder', lambda: load_bi_encoder(model_name, ENCODER_BACKEND))
+if not SHARD_URLS:
+    startup.submit('faiss_index', _load_faiss_index)
+if corpus_store is None:
+    startup.submit('corpus', lambda: _load_json(DATA_DIR / 'vn_plagiarism_corpus.json'))
+    startup.submit('corpus_chunks', lambda: _load_pickle(DATA_DIR / 'corpus_chunks.pkl'))
+    startup.submit('chunk_metadata', lambda: _load_pickle(DATA_DIR / 'chunk_metadata.pkl'))
+    if SHARD_URLS:
+        # Searched by the shards; only read here by a forced exact search
+        startup.submit('embeddings', lambda: np.load(DATA_DIR / 'chunk_embeddings_normalized.npy', mmap_mode='r'))
+    else:
+        # Kept as a single C-contiguous float32 matrix so scoring never copies it per request
+        startup.submit('embeddings', lambda: np.ascontiguousarray(
+            np.load(DATA_DIR / 'chunk_embeddings_normalized.npy'), dtype=np.float32
+        ))
 
-        similarity_matrix = np.dot(q_emb_norm.astype('float32'), 
-                                   chunk_embeddings_normalized.T.astype('float32'))
-        if not np.isfinite(similarity_matrix).all():
-            similarity_matrix = np.nan_to_num(similarity_matrix, nan=0.0, posinf=1.0, neginf=0.0)
-        
-        corpus_scores = np.max(similarity_matrix, axis=0)
-        top_k_actual = min(top_k, len(corpus_scores))
-        top_k_indices = np.argsort(corpus_scores)[::-1][:top_k_actual]
-        bi_results = [(float(corpus_scores[idx]), int(idx)) for idx in top_k_indices]
+if corpus_store is not None:
+    corpus_data = corpus_store.docs
+    corpus_chunks = corpus_store.chunks
+    chunk_ids = corpus_store.chunk_id
+    # Already a contiguous float32 matrix, so this stays a zero-copy memory map
+    chunk_embeddings_normalized = corpus_store.embeddings
+    print(f"✅ Opened corpus store {CORPUS_STORE_DIR} (version {corpus_store.version}): "
+          f"{len(corpus_data)} documents, {len(corpus_chunks)} chunks")
+else:
+    corpus_data = startup.result('corpus')
+    print(f"✅ Loaded corpus: {len(corpus_data)} documents")
+    corpus_chunks = startup.result('corpus_chunks')
+    print(f"✅ Loaded corpus chunks: {len(corpus_chunks)} chunks")
+    chunk_ids = startup.result('chunk_metadata')['chunk_ids']
+    print(f"✅ Loaded metadata: {len(chunk_ids)} chunk IDs")
+    chunk_embeddings_normalized = startup.result('embeddings')
+print(f"✅ Loaded embeddings: {chunk_embeddings_normalized.shape}")
 
-        doc_scores = self.doc_scorer.calculate_doc_scores(bi_results)
-        best_chunks = self.context_expander.get_best_chunk_per_doc(doc_scores, top_n=top_n_docs)
+if corpus_store is not None:
+    CORPUS_VERSION = corpus_store.version
+else:
+    CORPUS_VERSION = legacy_corpus_version(DATA_DIR)
 
-        best_doc = doc_scores[0] if len(doc_scores) > 0 else None
-        confidence = float(best_doc['final_score']) if best_doc is not None else 0.0
-        is_plagiarism = confidence >= self.threshold
 
-        return {
-            'prediction': bool(is_plagiarism),
-            'confidence': confidence,
-            'threshold': self.threshold,
-            'best_match': best_doc,
-            'top_results': doc_scores[:top_n_docs],
-            'doc_scores': doc_scores[:5],
-            'method': 'bi-encoder',
-            'query_chunks': len(query_chunks),
-            'query_words': word_count,
-            'corpus_matches': len(bi_results)
-        }
+def _load_lexical_index():
+    index = LexicalIndex.load(LEXICAL_INDEX_DIR, version=CORPUS_VERSION)
+    if index is None:
+        texts = corpus_store.chunk_text if corpus_store is not None else [chunk['text'] for chunk in corpus_chunks]
+        index = LexicalIndex.build(texts, version=CORPUS_VERSION)
+    return index
+
 
+if LEXICAL_MODE != 'off':
+    startup.submit('lexical_index', _load_lexical_index)
+
+bi_encoder = startup.result('bi_encoder')
+print(f"✅ Loaded bi-encoder model: {model_name} ({ENCODER_BACKEND})")
+
+if SHARD_URLS:
+    chunk_faiss_index = ShardedIndex(SHARD_URLS, chunk_embeddings_normalized.shape[1], len(corpus_chunks),
+                                     timeout=SHARD_TIMEOUT_S)
+    shard_infos, unreachable_shards = chunk_faiss_index.check(CORPUS_VERSION)
+    for shard in unreachable_shards:
+        print(f"Warning: shard {shard} is unreachable, searches leave it out until it answers")
+    print(f"✅ Searching {len(SHARD_URLS)} corpus shards ({len(shard_infos)} reachable)")
+else:
+    chunk_faiss_index = startup.result('faiss_index')
+    print(f"✅ Loaded FAISS index ({FAISS_INDEX_TYPE}): {chunk_faiss_index.ntotal} vectors")
+
+lexical_index = startup.result('lexical_index') if LEXICAL_MODE != 'off' else None
+if lexical_index is not None:
+    print(f"✅ Loaded lexical index ({LEXICAL_MODE}): {len(lexical_index.keys)} shingles over {len(lexical_index)} chunks")
+
+# Shared doc -> chunk index used by every component (array-backed, built once)
+if corpus_store is not None:
+    corpus_index = CorpusIndex.from_store(corpus_store)
+    doc_metadata_map = corpus_store.doc_metadata
+else:
+    corpus_index = CorpusIndex.from_chunks(corpus_chunks, corpus_data)
+    doc_metadata_map = {doc['id']: doc for doc in corpus_data}
+print(f"✅ Built corpus index: {len(corpus_index.doc_ids)} documents")
+
+STARTUP_TIME = round(time.monotonic() - startup.started_at, 2)
+print("="*60)
+print(f"✅ ALL MODELS LOADED SUCCESSFULLY! ({STARTUP_TIME}s)")
+print("="*60)
 
 # Initialize components
+# Query-chunk embedding cache (PLAGIARISM_EMBED_CACHE_SIZE=0 disables it)
+EMBED_CACHE_SIZE = int(os.environ.get('PLAGIARISM_EMBED_CACHE_SIZE', 50000))
+EMBED_CACHE_PATH = os.environ.get('PLAGIARISM_EMBED_CACHE_PATH')
+# Quantized / ONNX embeddings differ slightly from fp32 ones, so they get their own keys
+embed_cache_model = model_name if ENCODER_BACKEND == 'torch' else f"{model_name}@{ENCODER_BACKEND}"
+embedding_cache = EmbeddingCache(embed_cache_model, EMBED_CACHE_SIZE, EMBED_CACHE_PATH) if EMBED_CACHE_SIZE > 0 else None
+if embedding_cache is not None and EMBED_CACHE_PATH:
+    atexit.register(embedding_cache.save)
+
+# Cross-request dynamic batching of encoder / classifier work (PLAGIARISM_DYNAMIC_BATCHING=0 disables it)
+DYNAMIC_BATCHING = os.environ.get('PLAGIARISM_DYNAMIC_BATCHING', '1') != '0'
+BATCH_MAX_SIZE = int(os.environ.get('PLAGIARISM_BATCH_MAX_SIZE', 64))
+BATCH_MAX_WAIT_MS = float(os.environ.get('PLAGIARISM_BATCH_MAX_WAIT_MS', 5))
+
+
+@timed('encode_forward')
+def _encode_forward(texts):
+    return bi_encoder.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+
+
+encode_scheduler = BatchScheduler(
+    _encode_forward,
+    max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, name='bi-encoder'
+) if DYNAMIC_BATCHING else None
+
 chunker = TextChunker()
-doc_scorer = DocumentScorer(corpus_chunks)
-context_expander = ContextExpander(corpus_chunks, corpus_data)
+doc_scorer = DocumentScorer(corpus_chunks, corpus_index=corpus_index)
+doc_scorer.weights['doc_lexical'] = LEXICAL_WEIGHT
+context_expander = ContextExpander(corpus_chunks, corpus_data, corpus_index=corpus_index)
 complete_detector = CompletePlagiarismDetector(
     bi_encoder=bi_encoder,
     chunk_faiss_index=chunk_faiss_index,
@@ -397,22 +228,193 @@ complete_detector = CompletePlagiarismDetector(
     context_expander=context_expander,
     query_chunker=chunker,
     max_query_chunks=10,
-    threshold=0.6
+    threshold=0.6,
+    use_faiss=os.environ.get('PLAGIARISM_USE_FAISS', '1') != '0',
+    faiss_k=int(os.environ['PLAGIARISM_FAISS_K']) if os.environ.get('PLAGIARISM_FAISS_K') else None,
+    # Shards rescore lossy indexes themselves
+    rescore_faiss=FAISS_INDEX_TYPE in LOSSY_INDEX_TYPES and not SHARD_URLS,
+    corpus_embeddings=chunk_embeddings_normalized,
+    embedding_cache=embedding_cache,
+    encode_scheduler=encode_scheduler,
+    lexical_index=lexical_index,
+    lexical_mode=LEXICAL_MODE,
+    lexical_verbatim=LEXICAL_VERBATIM
 )
 
+# Submissions of one assignment compared with each other, scored like corpus matches
+collusion_detector = CollusionDetector(
+    encode=complete_detector.encode,
+    chunker=chunker,
+    make_scorer=lambda chunks, index: DocumentScorer(chunks, corpus_index=index),
+    threshold=complete_detector.threshold
+)
+COLLUSION_MAX_SUBMISSIONS = int(os.environ.get('PLAGIARISM_COLLUSION_MAX_SUBMISSIONS', 5000))
+
 print("✅ Plagiarism Detector initialized!")
 
+# ===============================================
+# RESULT CACHE
+# ===============================================
+
+# Everything that changes a plagiarism answer: corpus, index and its search
+# parameters, encoder and retrieval settings. Part of every result cache key.
+PLAGIARISM_VERSION = hashlib.sha1(str((
+    CORPUS_VERSION, artifact_fingerprint(index_path(FAISS_INDEX_TYPE, DATA_DIR)), FAISS_INDEX_TYPE,
+    FAISS_NPROBE, FAISS_EF_SEARCH, model_name, ENCODER_BACKEND, complete_detector.use_faiss, complete_detector.faiss_k,
+    LEXICAL_MODE, LEXICAL_VERBATIM, LEXICAL_WEIGHT, tuple(SHARD_URLS)
+)).encode()).hexdigest()[:16]
+
+# Whole-response cache for /api/check-plagiarism and /api/check-ai
+# (PLAGIARISM_RESULT_CACHE_SIZE=0 disables it)
+RESULT_CACHE_SIZE = int(os.environ.get('PLAGIARISM_RESULT_CACHE_SIZE', 1000))
+RESULT_CACHE_TTL = int(os.environ.get('PLAGIARISM_RESULT_CACHE_TTL', 3600))
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL) if RESULT_CACHE_SIZE > 0 else None
+
+
+def cached_response(payload):
+    response = jsonify(payload)
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+# ===============================================
+# ADMISSION CONTROL
+# ===============================================
+
+# Per-process limits for the CPU-heavy endpoints; requests beyond running + queue
+# (or queued longer than the timeout) get 429 + Retry-After instead of piling up
+# behind the proxy timeout. /api/health and /api/ready are never limited.
+QUEUE_TIMEOUT = float(os.environ.get('PLAGIARISM_QUEUE_TIMEOUT', 20))
+LIMITS = configured_limits()
+plagiarism_limiter = EndpointLimiter('plagiarism', *LIMITS['plagiarism'], queue_timeout=QUEUE_TIMEOUT)
+ai_limiter = EndpointLimiter('ai', *LIMITS['ai'], queue_timeout=QUEUE_TIMEOUT)
+bulk_limiter = EndpointLimiter('bulk', *LIMITS['bulk'], queue_timeout=0)
+
+
+def busy_response(limiter):
+    retry_after = limiter.retry_after()
+    response = jsonify({
+        'error': 'Server is busy, please retry later',
+        'retry_after': retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+# ===============================================
+# LIVE CORPUS (INCREMENTAL INGESTION)
+# ===============================================
+
+# Documents added or deleted after the build (POST/DELETE /api/corpus/documents
+# or live_corpus.py) live in a delta log next to the base artifacts. Every process
+# replays the log tail before a request and searches base + delta - tombstones.
+CORPUS_DELTA_DIR = Path(os.environ.get('PLAGIARISM_CORPUS_DELTA', DATA_DIR / 'corpus_delta'))
+INGEST_TOKEN = os.environ.get('PLAGIARISM_INGEST_TOKEN')
+# Per request: documents are chunked and encoded while the ingest slot is held
+INGEST_MAX_DOCUMENTS = int(os.environ.get('PLAGIARISM_INGEST_MAX_DOCUMENTS', 100))
+INGEST_MAX_CHARS = int(os.environ.get('PLAGIARISM_INGEST_MAX_CHARS', 100000))
+live_corpus = LiveCorpus(corpus_chunks, corpus_index, chunk_embeddings_normalized, chunk_faiss_index,
+                         doc_metadata_map, CORPUS_VERSION, delta_root=CORPUS_DELTA_DIR)
+doc_metadata_map = live_corpus.metadata
+ingest_limiter = EndpointLimiter('ingest', *LIMITS['ingest'], queue_timeout=QUEUE_TIMEOUT)
+
+
+def publish_corpus(snapshot):
+    """
+    Point the components at a new snapshot. Lookups (chunks, doc index, alive
+    mask) are swapped before the lexical index, embeddings and FAISS index, so
+    a search never returns a row the lookups do not know yet.
+    """
+    doc_scorer.corpus_chunks = snapshot.chunks
+    doc_scorer.corpus_index = snapshot.index
+    context_expander.corpus_chunks = snapshot.chunks
+    context_expander.corpus_index = snapshot.index
+    complete_detector.corpus_chunks = snapshot.chunks
+    complete_detector.chunk_alive = snapshot.chunk_alive
+    if lexical_index is not None:
+        complete_detector.lexical_index = AppendedLexicalIndex(lexical_index, [c['text'] for c in snapshot.chunks.tail])
+    complete_detector.corpus_embeddings = snapshot.embeddings
+    complete_detector.chunk_faiss_index = snapshot.faiss_index
+    if result_cache is not None:
+        result_cache.invalidate()
+
+
+def refresh_corpus():
+    """Pick up documents ingested by any process; returns the corpus version now served"""
+    snapshot = live_corpus.refresh(publish=publish_corpus)
+    if snapshot is not None:
+        print(f"✅ Corpus updated to {snapshot.version}")
+    return live_corpus.snapshot.version
+
+
+def ingest_error():
+    """403 response unless the request carries the configured ingest token (none configured: always 403)"""
+    if not INGEST_TOKEN:
+        return jsonify({'error': 'Corpus changes are disabled: set PLAGIARISM_INGEST_TOKEN to enable them'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Ingest-Token', ''), INGEST_TOKEN):
+        return jsonify({'error': 'Missing or invalid X-Ingest-Token header'}), 403
+    return None
+
+
+# Replay what was ingested before this start (under gunicorn: once, in the master)
+refresh_corpus()
+
 # ===============================================
 # SENTENCE-LEVEL ANALYSIS
 # ===============================================
 
-def analyze_sentences(query_text, min_words=6):
+def _split_sentences(query_text):
+    return [s.strip() for s in re.split(r"(?<=[.!?…])\s+", query_text) if s.strip()]
+
+
+def analyze_document(query_text, min_words=6, prune=None):
+    """
+    Document-level detection plus sentence-level analysis in one batch:
+    the document chunks and all eligible sentences are encoded together and
+    searched in a single pass. Returns (detect result, sentence analysis).
+    """
+    return analyze_documents([query_text], min_words=min_words, prune=prune)[0]
+
+
+def analyze_documents(query_texts, min_words=6, prune=None, sentences=True):
+    """
+    analyze_document() for several texts in one encode/search batch.
+    With sentences=False only document-level detection runs (sentence analysis is None).
+    Returns one (detect result, sentence analysis) pair per text.
+    """
+    if not sentences:
+        results = complete_detector.detect_batch(query_texts, prune=prune, verbose=False)
+        return [(result, None) for result in results]
+
+    batch, layout = [], []
+    for query_text in query_texts:
+        split = _split_sentences(query_text)
+        eligible = [s for s in split if len(s.split()) >= min_words]
+        layout.append((split, len(batch), len(eligible)))
+        batch.append(query_text)
+        batch.extend(eligible)
+    results = complete_detector.detect_batch(batch, prune=prune, verbose=False)
+    return [
+        (results[start], _build_sentence_analysis(split, results[start + 1:start + 1 + num_eligible], min_words))
+        for split, start, num_eligible in layout
+    ]
+
+
+def analyze_sentences(query_text, min_words=6, prune=None):
     """
     Analyze each sentence in the query text and return plagiarism info
     Returns list of sentences with their plagiarism scores
     """
-    sentences = [s.strip() for s in re.split(r"(?<=[.!?…])\s+", query_text) if s.strip()]
+    sentences = _split_sentences(query_text)
+    eligible = [s for s in sentences if len(s.split()) >= min_words]
+    results = complete_detector.detect_batch(eligible, prune=prune, verbose=False) if eligible else []
+    return _build_sentence_analysis(sentences, results, min_words)
+
+
+@timed('metadata_join')
+def _build_sentence_analysis(sentences, results, min_words):
+    """Pair sentences with their detect() results (short sentences have none)"""
     sentence_analysis = []
+    result_iter = iter(results)
     
     for idx, sentence in enumerate(sentences):
         word_count = len(sentence.split())
@@ -429,8 +431,7 @@ def analyze_sentences(query_text, min_words=6):
             })
             continue
         
-        # Detect plagiarism for this sentence
-        result = complete_detector.detect(sentence, verbose=False)
+        result = next(result_iter)
         best_match = result.get('best_match')
         confidence = result.get('confidence', 0.0)
         
@@ -458,6 +459,185 @@ def analyze_sentences(query_text, min_words=6):
     return sentence_analysis
 
 
+@timed('metadata_join')
+def format_detection(result, sentence_analysis=None):
+    """Response body of /api/check-plagiarism for one detect() result (without timings)"""
+    best_match = result.get('best_match')
+    top_results = result.get('top_results', [])
+    
+    # Get source info for best match
+    source_info = None
+    if best_match:
+        doc_id = best_match['doc_id']
+        if doc_id in doc_metadata_map:
+            doc_meta = doc_metadata_map[doc_id]
+            source_info = {
+                'doc_id': doc_id,
+                'title': doc_meta.get('title'),
+                'url': doc_meta.get('source_url') or doc_meta.get('url'),
+                'author': doc_meta.get('author'),
+                'final_score': best_match['final_score']
+            }
+    
+    # Format top matches
+    top_matches = []
+    for doc_score in top_results[:5]:
+        doc_id = doc_score['doc_id']
+        if doc_id in doc_metadata_map:
+            doc_meta = doc_metadata_map[doc_id]
+            top_matches.append({
+                'doc_id': doc_id,
+                'title': doc_meta.get('title'),
+                'url': doc_meta.get('source_url') or doc_meta.get('url'),
+                'score': doc_score['final_score'],
+                'num_chunks': doc_score['num_chunks']
+            })
+    
+    return {
+        'is_plagiarism': result['prediction'],
+        'confidence': round(result['confidence'], 4),
+        'partial': bool(result['missing_shards']),
+        'threshold': result['threshold'],
+        'original_probability': round(1.0 - result['confidence'], 4),
+        'best_match': source_info,
+        'top_matches': top_matches,
+        'sentence_analysis': sentence_analysis,
+        'stats': {
+            'query_words': result['query_words'],
+            'query_chunks': result['query_chunks'],
+            'corpus_matches': result['corpus_matches'],
+            'lexical_chunks': result['lexical_chunks'],
+            'missing_shards': result['missing_shards']
+        }
+    }
+
+
+# ===============================================
+# WARMUP / READINESS
+# ===============================================
+
+# Per process: /api/ready reports a worker ready only after warmup() has run in it
+service_state = {'ready': False, 'warmup_time': None, 'pid': None}
+
+
+def warmup():
+    """Run one full analysis so lazy initialization (thread pools, kernels, caches) happens before traffic"""
+    start = time.time()
+    sample = corpus_chunks[0]['text'] if len(corpus_chunks) else ''
+    analyze_document(f"{sample} Đây là câu dùng để khởi động hệ thống kiểm tra.")
+    service_state.update(ready=True, warmup_time=round(time.time() - start, 3), pid=os.getpid())
+
+
+# ===============================================
+# METRICS
+# ===============================================
+
+# Stage histograms are fed by stage()/timed() in the pipeline; everything below
+# is read from the components when /metrics is scraped
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    with _in_flight_lock:
+        _in_flight[request.endpoint] = _in_flight.get(request.endpoint, 0) + 1
+
+
+@app.after_request
+def _record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    if 'metrics_start' not in g:
+        return
+    with _in_flight_lock:
+        _in_flight[request.endpoint] -= 1
+    REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_start,
+                            endpoint=request.endpoint or 'unmatched', status=g.get('metrics_status', 500))
+
+
+def _service_metrics():
+    with _in_flight_lock:
+        in_flight = [({'endpoint': endpoint or 'unmatched'}, n) for endpoint, n in _in_flight.items()]
+    components = startup.status()
+    return [
+        ('plagiarism_in_flight_requests', 'gauge', 'Requests being handled', in_flight),
+        ('plagiarism_ready', 'gauge', '1 once this worker has warmed up', [({}, int(service_state['ready']))]),
+        ('plagiarism_startup_seconds', 'gauge', 'Time until all startup components were loaded',
+         [({}, STARTUP_TIME)]),
+        ('plagiarism_component_load_seconds', 'gauge', 'Load time of each startup component',
+         [({'component': name}, c['load_time_s']) for name, c in components.items()
+          if c['load_time_s'] is not None]),
+        ('plagiarism_component_ready', 'gauge', '1 when the component loaded, 0 while loading or failed',
+         [({'component': name}, int(c['status'] == 'ready')) for name, c in components.items()]),
+    ]
+
+
+def _queue_metrics():
+    ai_detector = startup.peek('ai_detector')
+    schedulers = [sched.stats() for sched in (encode_scheduler, ai_detector[2] if ai_detector else None)
+                  if sched is not None]
+    limiters = [limiter.stats() for limiter in (plagiarism_limiter, ai_limiter, bulk_limiter, ingest_limiter)]
+    return [
+        ('plagiarism_batch_queue_depth', 'gauge', 'Requests waiting for the batch scheduler',
+         [({'scheduler': st['name']}, st['queue_depth']) for st in schedulers]),
+        ('plagiarism_batch_items_total', 'counter', 'Items run through the batch scheduler',
+         [({'scheduler': st['name']}, st['items']) for st in schedulers]),
+        ('plagiarism_batches_total', 'counter', 'Forward passes run by the batch scheduler',
+         [({'scheduler': st['name']}, st['batches']) for st in schedulers]),
+        ('plagiarism_admission_running', 'gauge', 'Requests holding an endpoint slot',
+         [({'limiter': st['name']}, st['running']) for st in limiters]),
+        ('plagiarism_admission_waiting', 'gauge', 'Requests queued for an endpoint slot',
+         [({'limiter': st['name']}, st['waiting']) for st in limiters]),
+        ('plagiarism_admission_rejected_total', 'counter', 'Requests turned away with 429',
+         [({'limiter': st['name']}, st['rejected'] + st['timed_out']) for st in limiters]),
+    ]
+
+
+def _cache_metrics():
+    caches = [(name, cache.stats()) for name, cache in (('embedding', embedding_cache), ('result', result_cache))
+              if cache is not None]
+    corpus = live_corpus.stats()
+    return [
+        ('plagiarism_cache_entries', 'gauge', 'Entries held by each cache',
+         [({'cache': name}, st['entries']) for name, st in caches]),
+        ('plagiarism_cache_hits_total', 'counter', 'Cache hits', [({'cache': name}, st['hits']) for name, st in caches]),
+        ('plagiarism_cache_misses_total', 'counter', 'Cache misses',
+         [({'cache': name}, st['misses']) for name, st in caches]),
+        ('plagiarism_cache_evictions_total', 'counter', 'Cache evictions',
+         [({'cache': name}, st['evictions']) for name, st in caches]),
+        ('plagiarism_corpus_chunks', 'gauge', 'Corpus chunks by origin',
+         [({'kind': 'base'}, corpus['base_chunks']), ({'kind': 'delta'}, corpus['delta_chunks']),
+          ({'kind': 'tombstoned'}, corpus['tombstoned_chunks'])]),
+    ]
+
+
+def _shard_metrics():
+    shards = chunk_faiss_index.stats() if SHARD_URLS else []
+    return [
+        ('plagiarism_shard_requests_total', 'counter', 'Searches sent to each corpus shard',
+         [({'shard': st['url']}, st['requests']) for st in shards]),
+        ('plagiarism_shard_errors_total', 'counter', 'Shard searches left out of the result',
+         [({'shard': st['url'], 'reason': reason}, st[key]) for st in shards
+          for reason, key in (('error', 'failures'), ('timeout', 'timeouts'))]),
+    ]
+
+
+for _collector in (_service_metrics, _queue_metrics, _cache_metrics, _shard_metrics):
+    REGISTRY.add_collector(_collector)
+
+
+def profile_response(response, breakdown):
+    """Attach the ?profile=1 per-stage breakdown (stages may nest) to a response body"""
+    if breakdown is not None:
+        response['profile'] = {'stages': breakdown(), 'total_s': round(time.perf_counter() - g.metrics_start, 6)}
+    return response
+
 # ===============================================
 # API ENDPOINTS
 # ===============================================
@@ -465,18 +645,68 @@ def analyze_sentences(query_text, min_words=6):
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    ai_detector = startup.peek('ai_detector')
     return jsonify({
         'status': 'ok',
         'message': 'Plagiarism Detection API is running',
-        'models_loaded': True
+        'models_loaded': True,
+        'startup_time_s': STARTUP_TIME,
+        'components': startup.status(),
+        'ready': service_state['ready'],
+        'inference_backends': {'encoder': ENCODER_BACKEND, 'ai_detector': AI_MODEL_BACKEND},
+        'embedding_cache': embedding_cache.stats() if embedding_cache is not None else None,
+        'result_cache': result_cache.stats() if result_cache is not None else None,
+        'admission': [plagiarism_limiter.stats(), ai_limiter.stats(), bulk_limiter.stats(), ingest_limiter.stats()],
+        'corpus': live_corpus.stats(),
+        'shards': chunk_faiss_index.stats() if SHARD_URLS else None,
+        'schedulers': [sched.stats() for sched in (encode_scheduler, ai_detector[2] if ai_detector else None)
+                       if sched is not None]
     })
 
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness probe, checked on every call: 503 until this worker has warmed
+    up, while its plagiarism queue is full, when ingested documents cannot be
+    replayed or, with shards, when none of them answers
+    """
+    checks = {
+        'warmup': service_state['ready'],
+        'capacity': plagiarism_limiter.waiting < plagiarism_limiter.max_queue
+    }
+    errors = {}
+    try:
+        refresh_corpus()
+        checks['corpus'] = True
+    except Exception as e:
+        checks['corpus'] = False
+        errors['corpus'] = str(e)
+    if SHARD_URLS:
+        try:
+            _, unreachable = chunk_faiss_index.check(CORPUS_VERSION)
+            checks['shards'] = len(unreachable) < len(SHARD_URLS)
+            if unreachable:
+                errors['shards'] = unreachable
+        except ValueError as e:
+            checks['shards'] = False
+            errors['shards'] = str(e)
+    ready = all(checks.values())
+    return jsonify({**service_state, 'ready': ready, 'checks': checks, 'errors': errors}), 200 if ready else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint (this process only)"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/check-plagiarism', methods=['POST'])
 def check_plagiarism():
     """
     Main endpoint for plagiarism detection
-    Request body: { "text": "query text here" }
+    Request body: { "text": "query text here", "prune": "none" | "threshold" | "top_n" }
+    Query params: profile=1 adds a per-stage latency breakdown (bypasses the result cache)
     """
     try:
         data = request.get_json()
@@ -491,75 +721,51 @@ def check_plagiarism():
                 'error': 'Text cannot be empty'
             }), 400
         
+        prune = data.get('prune', 'none')
+        if prune not in PRUNE_MODES:
+            return jsonify({
+                'error': f'"prune" must be one of: {", ".join(PRUNE_MODES)}'
+            }), 400
+        
         print(f"\n{'='*60}")
         print(f"📝 Processing query ({len(query_text)} chars)")
         print(f"{'='*60}")
         
-        # Overall detection
-        start_time = time.time()
-        result = complete_detector.detect(query_text, verbose=False)
-        detection_time = time.time() - start_time
-        
-        # Sentence-level analysis
-        start_time = time.time()
-        sentence_analysis = analyze_sentences(query_text)
-        analysis_time = time.time() - start_time
+        profile = request.args.get('profile') == '1'
+        corpus_version = refresh_corpus()
+        cache_key = None
+        if result_cache is not None and not profile:
+            cache_key = ResultCache.make_key('check-plagiarism', query_text, f"{PLAGIARISM_VERSION}:{corpus_version}",
+                                             prune=prune, threshold=complete_detector.threshold)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                return cached_response(cached)
         
-        # Prepare response
-        best_match = result.get('best_match')
-        top_results = result.get('top_results', [])
+        # Overall detection + sentence-level analysis share one encode/search batch
+        with plagiarism_limiter.slot() as admitted:
+            if not admitted:
+                return busy_response(plagiarism_limiter)
+            start_time = time.time()
+            with profiled(profile) as breakdown:
+                result, sentence_analysis = analyze_document(query_text, prune=prune)
+                detection_time = time.time() - start_time
+                response = format_detection(result, sentence_analysis)
         
-        # Get source info for best match
-        source_info = None
-        if best_match:
-            doc_id = best_match['doc_id']
-            if doc_id in doc_metadata_map:
-                doc_meta = doc_metadata_map[doc_id]
-                source_info = {
-                    'doc_id': doc_id,
-                    'title': doc_meta.get('title'),
-                    'url': doc_meta.get('source_url') or doc_meta.get('url'),
-                    'author': doc_meta.get('author'),
-                    'final_score': best_match['final_score']
-                }
+        # Sentence analysis shares the detection batch, so it has no time of its own
+        response['stats'].update({
+            'detection_time': round(detection_time, 3),
+            'total_time': round(detection_time, 3)
+        })
         
-        # Format top matches
-        top_matches = []
-        for doc_score in top_results[:5]:
-            doc_id = doc_score['doc_id']
-            if doc_id in doc_metadata_map:
-                doc_meta = doc_metadata_map[doc_id]
-                top_matches.append({
-                    'doc_id': doc_id,
-                    'title': doc_meta.get('title'),
-                    'url': doc_meta.get('source_url') or doc_meta.get('url'),
-                    'score': doc_score['final_score'],
-                    'num_chunks': doc_score['num_chunks']
-                })
+        # A partial answer (shards missing) is not cached
+        if cache_key is not None and not response['partial']:
+            result_cache.put(cache_key, response)
         
-        response = {
-            'is_plagiarism': result['prediction'],
-            'confidence': round(result['confidence'], 4),
-            'threshold': result['threshold'],
-            'original_probability': round(1.0 - result['confidence'], 4),
-            'best_match': source_info,
-            'top_matches': top_matches,
-            'sentence_analysis': sentence_analysis,
-            'stats': {
-                'query_words': result['query_words'],
-                'query_chunks': result['query_chunks'],
-                'corpus_matches': result['corpus_matches'],
-                'detection_time': round(detection_time, 3),
-                'analysis_time': round(analysis_time, 3),
-                'total_time': round(detection_time + analysis_time, 3)
-            }
-        }
-        
-        print(f"✅ Detection completed in {detection_time + analysis_time:.3f}s")
+        print(f"✅ Detection completed in {detection_time:.3f}s")
         print(f"   Result: {'PLAGIARISM' if result['prediction'] else 'ORIGINAL'}")
         print(f"   Confidence: {result['confidence']:.4f}")
         
-        return jsonify(response)
+        return jsonify(profile_response(response, breakdown))
     
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -575,7 +781,8 @@ def check_plagiarism():
 def analyze_sentences_endpoint():
     """
     Endpoint for sentence-level analysis only
-    Request body: { "text": "query text here" }
+    Request body: { "text": "query text here", "prune": "none" | "threshold" | "top_n" }
+    Query params: profile=1 adds a per-stage latency breakdown
     """
     try:
         data = request.get_json()
@@ -590,13 +797,26 @@ def analyze_sentences_endpoint():
                 'error': 'Text cannot be empty'
             }), 400
         
-        sentence_analysis = analyze_sentences(query_text)
+        prune = data.get('prune', 'none')
+        if prune not in PRUNE_MODES:
+            return jsonify({
+                'error': f'"prune" must be one of: {", ".join(PRUNE_MODES)}'
+            }), 400
         
-        return jsonify({
+        refresh_corpus()
+        with plagiarism_limiter.slot() as admitted:
+            if not admitted:
+                return busy_response(plagiarism_limiter)
+            with profiled(request.args.get('profile') == '1') as breakdown, track_missing_shards() as missing_shards:
+                sentence_analysis = analyze_sentences(query_text, prune=prune)
+        
+        return jsonify(profile_response({
             'sentences': sentence_analysis,
+            'partial': bool(missing_shards),
+            'missing_shards': sorted(set(missing_shards)),
             'total_sentences': len(sentence_analysis),
             'suspicious_count': sum(1 for s in sentence_analysis if s['is_suspicious'])
-        })
+        }, breakdown))
     
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -606,114 +826,267 @@ def analyze_sentences_endpoint():
         }), 500
 
 
-# ===============================================
-# AI DETECTION FUNCTIONS
-# ===============================================
+@app.route('/api/bulk-check', methods=['POST'])
+def bulk_check():
+    """
+    Check many documents in one streamed request
+    Request body: JSON lines, one { "id": "...", "text": "..." } per line
+    Query params: sentences=1 (sentence-level analysis), prune, start=N (skip the
+    first N documents, to resume a dropped stream), batch_size
+    Response: NDJSON, one { "index", "id", ...check-plagiarism fields } per document
+    in input order, or { "index", "id", "error" } for an unreadable line.
+    """
+    prune = request.args.get('prune', 'none')
+    if prune not in PRUNE_MODES:
+        return jsonify({
+            'error': f'"prune" must be one of: {", ".join(PRUNE_MODES)}'
+        }), 400
+    try:
+        start = max(int(request.args.get('start', 0)), 0)
+        batch_size = min(max(int(request.args.get('batch_size', 32)), 1), 256)
+    except ValueError:
+        return jsonify({'error': '"start" and "batch_size" must be integers'}), 400
+    with_sentences = request.args.get('sentences', '0') == '1'
 
-def get_ai_label(confidence):
-    """Convert confidence score to label"""
-    if confidence < 0.4:
-        return "Nguoi viet"
-    elif confidence < 0.6:
-        return "Nghi van"
-    elif confidence < 0.8:
-        return "Co dau hieu AI"
-    else:
-        return "AI viet"
+    refresh_corpus()
+    slot = ExitStack()
+    if not slot.enter_context(bulk_limiter.slot()):
+        slot.close()
+        return busy_response(bulk_limiter)
+
+    def check_texts(texts):
+        return [format_detection(result, sentence_analysis)
+                for result, sentence_analysis in analyze_documents(texts, prune=prune, sentences=with_sentences)]
 
+    def generate():
+        # The slot is held until the last line is sent (or the client goes away)
+        with slot:
+            lines = iter(request.stream.readline, b'')
+            documents = ((index, doc) for index, doc in read_documents(lines) if index >= start)
+            num_docs = 0
+            start_time = time.time()
+            for records, _ in run_pipeline(documents, check_texts, batch_size=batch_size):
+                num_docs += len(records)
+                yield ''.join(to_ndjson(record) for record in records)
+            print(f"✅ Bulk check: {num_docs} documents in {time.time() - start_time:.1f}s")
+
+    try:
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    except Exception:
+        slot.close()
+        raise
+    # Also released when the body is never iterated (client gone before the first chunk)
+    response.call_on_close(slot.close)
+    return response
 
-def analyze_ai_with_windows(text, clf_model, ai_tokenizer, max_windows=None, stride_tokens=128):
+
+@app.route('/api/collusion-check', methods=['POST'])
+def collusion_check():
     """
-    Analyze text with sliding windows to get sentence-level scores
-    Returns list of sentences with their AI scores
+    Compare the submissions of one assignment with each other
+    Request body: { "submissions": [{ "id": "...", "text": "..." }], "threshold": 0.6 (optional) }
+    Response: suspicious pairs (same scores as /api/check-plagiarism) and clusters of students
     """
     try:
-        sentences = [s.strip() for s in re.split(r"(?<=[.!?...])\s+", text) if s.strip()]
-        ai_analysis = []
-        window_scores = []
-        
-        for idx, sentence in enumerate(sentences):
-            word_count = len(sentence.split())
-            
-            result = {
-                'sentence': sentence,
-                'sentence_index': idx,
-                'word_count': word_count,
-                'is_suspicious': False,
-                'confidence': 0.0,
-                'label': 'Nguoi viet'
-            }
-            
-            if word_count < 5:
-                ai_analysis.append(result)
-                continue
-            
+        data = request.get_json()
+        submissions = data.get('submissions') if isinstance(data, dict) else None
+        if not isinstance(submissions, list) or len(submissions) < 2:
+            return jsonify({
+                'error': 'Request body needs a "submissions" list with at least 2 items'
+            }), 400
+        if len(submissions) > COLLUSION_MAX_SUBMISSIONS:
+            return jsonify({
+                'error': f'At most {COLLUSION_MAX_SUBMISSIONS} submissions per request'
+            }), 400
+        threshold = data.get('threshold')
+        if threshold is not None and not isinstance(threshold, (int, float)):
+            return jsonify({'error': '"threshold" must be a number'}), 400
+
+        with bulk_limiter.slot() as admitted:
+            if not admitted:
+                return busy_response(bulk_limiter)
             try:
-                ids = ai_tokenizer(sentence, add_special_tokens=False, truncation=False).get('input_ids', [])
-                if not ids:
-                    ai_analysis.append(result)
-                    continue
-                    
-                n_special = 2
-                win_len = max(8, int(256) - n_special)
-                
-                sent_probs = []
-                if len(ids) <= win_len:
-                    ids_with_special = ai_tokenizer.build_inputs_with_special_tokens(ids)
-                    prob_ai = _predict_prob_from_ids_simple(ids_with_special, clf_model)
-                    sent_probs.append(prob_ai)
-                else:
-                    stride = min(max(1, stride_tokens), win_len)
-                    for start in range(0, len(ids), stride):
-                        chunk = ids[start:start + win_len]
-                        if len(chunk) < 8:
-                            break
-                        ids_with_special = ai_tokenizer.build_inputs_with_special_tokens(chunk)
-                        sent_probs.append(_predict_prob_from_ids_simple(ids_with_special, clf_model))
-                        if max_windows and len(sent_probs) >= max_windows:
-                            break
-                        if start + win_len >= len(ids):
-                            break
-                
-                if sent_probs:
-                    avg_prob = float(np.mean(sent_probs))
-                    result['confidence'] = round(avg_prob, 4)
-                    result['is_suspicious'] = avg_prob >= 0.6
-                    result['label'] = get_ai_label(avg_prob)
-                    window_scores.extend(sent_probs)
-                    
-            except Exception as e:
-                print(f"Warning processing sentence {idx}: {e}")
-            
-            ai_analysis.append(result)
-        
-        return ai_analysis, window_scores
-        
+                report = collusion_detector.detect(submissions, threshold=threshold)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        stats = report['stats']
+        print(f"✅ Collusion check: {stats['submissions']} submissions, "
+              f"{stats['suspicious_pairs']} suspicious pairs in {stats['total_s']}s")
+        return jsonify(report)
+
     except Exception as e:
-        print(f"Error in analyze_ai_with_windows: {e}")
-        return [], []
+        print(f"❌ Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'error': str(e),
+            'message': 'Internal server error'
+        }), 500
 
 
-def _predict_prob_from_ids_simple(input_ids_1d, model):
-    """Simple prediction from token IDs"""
+@app.route('/api/corpus/documents', methods=['POST'])
+def add_corpus_documents():
+    """
+    Add documents to the reference corpus without a rebuild
+    Request body: { "documents": [{ "id": "...", "text": "...", "title": "...", "url": "..." }] }
+    A document whose id already exists is replaced. Batches over
+    INGEST_MAX_DOCUMENTS documents or texts over INGEST_MAX_CHARS get 413.
+    """
+    denied = ingest_error()
+    if denied is not None:
+        return denied
+    try:
+        # Rough bound (4 bytes per character plus metadata) checked before the body is parsed
+        if (request.content_length or 0) > INGEST_MAX_DOCUMENTS * (4 * INGEST_MAX_CHARS + 4096):
+            return jsonify({
+                'error': 'Request body too large'
+            }), 413
+        data = request.get_json()
+        documents = data.get('documents') if isinstance(data, dict) else None
+        if not isinstance(documents, list) or not documents:
+            return jsonify({
+                'error': 'Missing "documents" list in request body'
+            }), 400
+        if len(documents) > INGEST_MAX_DOCUMENTS:
+            return jsonify({
+                'error': f'At most {INGEST_MAX_DOCUMENTS} documents per request'
+            }), 413
+        for doc in documents:
+            if isinstance(doc, dict) and isinstance(doc.get('text'), str) and len(doc['text']) > INGEST_MAX_CHARS:
+                return jsonify({
+                    'error': f'Document "{doc.get("id")}" is longer than {INGEST_MAX_CHARS} characters'
+                }), 413
+
+        with ingest_limiter.slot() as admitted:
+            if not admitted:
+                return busy_response(ingest_limiter)
+            start_time = time.time()
+            try:
+                counts = ingest_documents(live_corpus.log, documents, chunker,
+                                          lambda texts: complete_detector.encode(texts, use_cache=False))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except LogSealedError as e:
+                return jsonify({'error': str(e)}), 409
+            corpus_version = refresh_corpus()
+
+        print(f"✅ Ingested {counts['documents']} documents ({counts['chunks']} chunks)")
+        return jsonify({
+            **counts,
+            'corpus_version': corpus_version,
+            'ingest_time': round(time.time() - start_time, 3)
+        })
+
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return jsonify({
+            'error': str(e),
+            'message': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/corpus/documents/<doc_id>', methods=['DELETE'])
+def delete_corpus_document(doc_id):
+    """Remove a document from the reference corpus (tombstoned until the next compaction)"""
+    denied = ingest_error()
+    if denied is not None:
+        return denied
     try:
-        import torch
-        ids = torch.tensor([input_ids_1d], device='cuda' if torch.cuda.is_available() else 'cpu')
-        attn = torch.ones_like(ids)
-        with torch.inference_mode():
-            logits = model(input_ids=ids, attention_mask=attn).logits
-            prob_ai = torch.softmax(logits, dim=-1)[0, 1].item()
-        return float(prob_ai)
+        refresh_corpus()
+        row = live_corpus.row_of(doc_id)
+        if row is None or row in live_corpus.dead_rows:
+            return jsonify({'error': f'Document "{doc_id}" not found'}), 404
+        try:
+            live_corpus.log.append_deletes([doc_id])
+        except LogSealedError as e:
+            return jsonify({'error': str(e)}), 409
+        return jsonify({'deleted': doc_id, 'corpus_version': refresh_corpus()})
+
     except Exception as e:
-        print(f"Error in prediction: {e}")
-        return 0.0
+        print(f"❌ Error: {str(e)}")
+        return jsonify({
+            'error': str(e),
+            'message': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/corpus/stats', methods=['GET'])
+def corpus_stats():
+    """Base / delta / tombstone counts of the corpus this process serves"""
+    refresh_corpus()
+    return jsonify(live_corpus.stats())
+
+
+# ===============================================
+# AI DETECTION FUNCTIONS
+# ===============================================
+
+# 'sentence': windows inside each sentence; 'document': windows over the whole text (see ai_windows.py)
+AI_WINDOW_MODE = os.environ.get('AI_WINDOW_MODE', 'sentence')
+# AI_MODEL_BACKEND: torch (fp32), int8 (dynamic quantization) or onnx (exported to model/detector_phobert_onnx)
+AI_MODEL_BACKEND = os.environ.get('AI_MODEL_BACKEND', 'torch')
+
+AI_MODEL_DIR = BASE_DIR / 'model' / 'detector_phobert'
+# AI_PRELOAD=0 defers loading the detector until the first /api/check-ai
+AI_PRELOAD = os.environ.get('AI_PRELOAD', '1') != '0'
+
+
+def load_ai_detector():
+    """(model, tokenizer, scheduler) for /api/check-ai; scheduler is None without dynamic batching"""
+    from transformers import AutoTokenizer
+    model = load_ai_classifier(str(AI_MODEL_DIR), AI_MODEL_BACKEND)
+    ai_tokenizer = AutoTokenizer.from_pretrained(str(AI_MODEL_DIR), use_fast=True)
+    scheduler = None
+    if DYNAMIC_BATCHING:
+        pad_token_id = ai_tokenizer.pad_token_id
+        scheduler = BatchScheduler(
+            lambda windows: predict_probs_batched(windows, model, pad_token_id),
+            max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, name='ai-classifier'
+        )
+    return model, ai_tokenizer, scheduler
+
+
+if AI_PRELOAD and AI_MODEL_DIR.exists():
+    startup.submit('ai_detector', load_ai_detector, background=True)
+
+# Cheap-first cascade (ai_cascade.py): PhoBERT only runs for texts whose combiner score falls
+# inside [AI_CASCADE_LOW, AI_CASCADE_HIGH]. AI_CASCADE=1 turns it on unless a request says otherwise.
+AI_CASCADE = os.environ.get('AI_CASCADE', '0') == '1'
+AI_CASCADE_MODEL = Path(os.environ.get('AI_CASCADE_MODEL', BASE_DIR / 'data' / 'combiner_logreg.joblib'))
+AI_CASCADE_LOW = float(os.environ.get('AI_CASCADE_LOW', 0.2))
+AI_CASCADE_HIGH = float(os.environ.get('AI_CASCADE_HIGH', 1.0))
+# Evaluation report of ai_cascade.py that has to cover the band before the cascade decides anything
+AI_CASCADE_REPORT = Path(os.environ.get('AI_CASCADE_REPORT', BASE_DIR / 'data' / 'cascade_report.json'))
+AI_CASCADE_MIN_AGREEMENT = float(os.environ.get('AI_CASCADE_MIN_AGREEMENT', 0.95))
+
+
+def ai_model_version():
+    """Fingerprint of the PhoBERT detector files ('missing' when they are not there)"""
+    return artifact_fingerprint(*sorted(AI_MODEL_DIR.iterdir())) if AI_MODEL_DIR.exists() else 'missing'
+
+
+def load_ai_cascade():
+    scorer = CheapAIScorer.load(AI_CASCADE_MODEL, low=AI_CASCADE_LOW, high=AI_CASCADE_HIGH)
+    problem = check_band_report(AI_CASCADE_REPORT, scorer.low, scorer.high, artifact_fingerprint(AI_CASCADE_MODEL),
+                                ai_model_version(), min_agreement=AI_CASCADE_MIN_AGREEMENT)
+    if problem:
+        print(f"⚠️ AI cascade band not validated, every text goes to PhoBERT: {problem}")
+        scorer.validated = False
+    return scorer
+
+
+if AI_CASCADE_MODEL.exists():
+    startup.submit('ai_cascade', load_ai_cascade, background=True)
 
 
 @app.route('/api/check-ai', methods=['POST'])
 def check_ai():
     """
     AI detection endpoint
-    Request body: { "text": "text to check" }
+    Request body: { "text": "text to check", "window_mode": "sentence" | "document",
+                    "cascade": true | false (default AI_CASCADE) }
+    Query params: profile=1 adds a per-stage latency breakdown (bypasses the result cache)
     Response: {
         "combined_prob_ai": 0.75,
         "combined_label": "Co dau hieu AI",
@@ -734,34 +1107,77 @@ def check_ai():
                 'error': 'Text cannot be empty'
             }), 400
         
-        if not os.path.exists(str(BASE_DIR / 'model' / 'detector_phobert')):
+        window_mode = data.get('window_mode', AI_WINDOW_MODE)
+        if window_mode not in AI_WINDOW_MODES:
             return jsonify({
-                'error': 'AI model not found. Please ensure detector_phobert model is available.',
-                'model_path': str(BASE_DIR / 'model' / 'detector_phobert')
-            }), 500
+                'error': f'"window_mode" must be one of: {", ".join(AI_WINDOW_MODES)}'
+            }), 400
         
-        try:
-            from transformers import AutoModelForSequenceClassification, AutoTokenizer
-            
-            model_path = str(BASE_DIR / 'model' / 'detector_phobert')
-            
-            if not hasattr(check_ai, 'ai_model') or check_ai.ai_model is None:
-                check_ai.ai_model = AutoModelForSequenceClassification.from_pretrained(model_path)
-                check_ai.ai_model.eval()
-                check_ai.ai_tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=True)
-                print("Loaded AI detection model")
-            
-            ai_model = check_ai.ai_model
-            ai_tokenizer = check_ai.ai_tokenizer
-            
-        except Exception as e:
-            print(f"Error loading AI model: {e}")
+        cascade = data.get('cascade', AI_CASCADE)
+        if not isinstance(cascade, bool):
             return jsonify({
-                'error': f'Failed to load AI detection model: {str(e)}'
-            }), 500
+                'error': '"cascade" must be true or false'
+            }), 400
+        
+        profile = request.args.get('profile') == '1'
+        cache_key = None
+        if result_cache is not None and not profile:
+            # The cascade part covers the combiner and the report that validates its band
+            cascade_version = [AI_CASCADE_LOW, AI_CASCADE_HIGH,
+                               artifact_fingerprint(AI_CASCADE_MODEL, AI_CASCADE_REPORT)]
+            cache_key = ResultCache.make_key('check-ai', query_text, ai_model_version(), window_mode=window_mode,
+                                             backend=AI_MODEL_BACKEND, cascade=cascade_version if cascade else None)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                return cached_response(cached)
+        
+        cascade_info = None
+        if cascade:
+            try:
+                cheap_scorer = startup.result('ai_cascade', load_ai_cascade)
+            except Exception as e:
+                print(f"Error loading cascade model: {e}")
+                return jsonify({
+                    'error': f'Failed to load AI cascade model: {str(e)}'
+                }), 500
         
         try:
-            sentence_analysis, window_scores = analyze_ai_with_windows(query_text, ai_model, ai_tokenizer)
+            with profiled(profile) as breakdown:
+                if cascade:
+                    with stage('cheap_classify'):
+                        cheap_score = float(cheap_scorer.score([query_text])[0])
+                    decided = cheap_scorer.decide(cheap_score) is not None
+                    cascade_info = {
+                        'cheap_prob_ai': round(cheap_score, 4),
+                        'band': [cheap_scorer.low, cheap_scorer.high],
+                        'validated': cheap_scorer.validated,
+                        'decided_by': 'cheap' if decided else 'phobert'
+                    }
+                
+                if cascade_info is not None and cascade_info['decided_by'] == 'cheap':
+                    # Conclusive without PhoBERT: no model load, no admission slot
+                    sentence_analysis, window_scores = analyze_ai_decided(query_text, cheap_score), [cheap_score]
+                else:
+                    if not AI_MODEL_DIR.exists():
+                        return jsonify({
+                            'error': 'AI model not found. Please ensure detector_phobert model is available.',
+                            'model_path': str(AI_MODEL_DIR)
+                        }), 500
+                    try:
+                        # Waits for the background preload if it is still running; loads (or retries) it otherwise
+                        ai_model, ai_tokenizer, ai_scheduler = startup.result('ai_detector', load_ai_detector)
+                    except Exception as e:
+                        print(f"Error loading AI model: {e}")
+                        return jsonify({
+                            'error': f'Failed to load AI detection model: {str(e)}'
+                        }), 500
+                    
+                    with ai_limiter.slot() as admitted:
+                        if not admitted:
+                            return busy_response(ai_limiter)
+                        sentence_analysis, window_scores = analyze_ai_with_windows(
+                            query_text, ai_model, ai_tokenizer, mode=window_mode, scheduler=ai_scheduler
+                        )
             
             overall_score = float(np.mean(window_scores)) if window_scores else 0.0
             
@@ -780,8 +1196,14 @@ def check_ai():
                     'max_confidence': round(max([s['confidence'] for s in sentence_analysis]), 4) if sentence_analysis else 0.0
                 }
             }
+            if cascade_info is not None:
+                response['cascade'] = cascade_info
+            
+            # An empty analysis means the windows failed; do not pin that in the cache
+            if cache_key is not None and sentence_analysis:
+                result_cache.put(cache_key, response)
             
-            return jsonify(response)
+            return jsonify(profile_response(response, breakdown))
             
         except Exception as e:
             print(f"Error during AI analysis: {e}")
@@ -813,4 +1235,6 @@ if __name__ == '__main__':
     print("   API endpoint: http://localhost:5000/api/check-plagiarism")
     print("="*60 + "\n")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    warmup()
+    # Development server; the Werkzeug debugger runs arbitrary code, so it is opt-in
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('PLAGIARISM_DEBUG', '0') == '1')
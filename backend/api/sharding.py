@@ -0,0 +1,284 @@
+"""
+Sharded corpus search (scatter-gather across processes or hosts)
+For corpora that outgrow one machine's RAM, the chunk embeddings and their
+FAISS index are split into shards of consecutive chunk rows, each served by
+its own process (`serve`). The API then runs as a coordinator
+(PLAGIARISM_SHARDS): ShardedIndex has the search interface of a FAISS index,
+sends every batch of query embeddings to all shards in parallel and merges
+their top-k into the same (scores, global chunk ids) a local index returns,
+so DocumentScorer and everything after it are unchanged. The coordinator
+only keeps the per-chunk lookups (document, position, text) and never loads
+the vectors or the index.
+
+A shard that fails or does not answer within the timeout is left out: the
+search returns what the other shards found and the shard is reported through
+track_missing_shards() (the API marks such responses partial).
+
+Usage:
+    python backend/api/sharding.py build --num-shards 4 --index-type hnsw
+    python backend/api/sharding.py serve backend/data/shards/shard_0 --port 5101
+    PLAGIARISM_SHARDS=http://localhost:5101,http://localhost:5102 python backend/api/plagiarism_api.py
+"""
+
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+import numpy as np
+
+from index_builder import LOSSY_INDEX_TYPES, apply_search_params, build_index, index_path, read_index, write_index
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / 'data'
+
+MANIFEST = 'manifest.json'
+
+
+def encode_array(array):
+    array = np.ascontiguousarray(array)
+    return {'dtype': array.dtype.str, 'shape': list(array.shape), 'data': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def decode_array(payload):
+    data = base64.b64decode(payload['data'])
+    return np.frombuffer(data, dtype=np.dtype(payload['dtype'])).reshape(payload['shape'])
+
+
+# ===============================================
+# SHARD SIDE
+# ===============================================
+
+def build_shards(embeddings, num_shards, out_dir, version, index_type='flat', **index_params):
+    """Split the embedding rows into num_shards ranges and write each one with its own index"""
+    out_dir = Path(out_dir)
+    bounds = np.linspace(0, len(embeddings), num_shards + 1).astype(np.int64)
+    manifests = []
+    for shard in range(num_shards):
+        start, end = int(bounds[shard]), int(bounds[shard + 1])
+        shard_dir = out_dir / f'shard_{shard}'
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        rows = np.ascontiguousarray(embeddings[start:end], dtype=np.float32)
+        np.save(shard_dir / 'embeddings.npy', rows)
+        write_index(build_index(index_type, rows, **index_params), index_path(index_type, shard_dir))
+        manifest = {'shard': shard, 'num_shards': num_shards, 'start': start, 'end': end,
+                    'dim': int(embeddings.shape[1]), 'index_type': index_type, 'corpus_version': version}
+        with open(shard_dir / MANIFEST, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        manifests.append(manifest)
+    return manifests
+
+
+class Shard:
+    """Chunk rows [start, end) of the corpus with their embeddings and index"""
+
+    def __init__(self, path, nprobe=None, ef_search=None):
+        path = Path(path)
+        with open(path / MANIFEST, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.start = self.manifest['start']
+        self.index_type = self.manifest['index_type']
+        self.embeddings = np.load(path / 'embeddings.npy', mmap_mode='r')
+        self.index = apply_search_params(read_index(self.index_type, path, mmap=True),
+                                         nprobe=nprobe, ef_search=ef_search)
+
+    def search(self, queries, k):
+        """Top-k (scores, global chunk ids); approximate index scores are replaced by exact ones"""
+        k = max(1, min(int(k), self.index.ntotal))
+        scores, ids = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        if self.index_type in LOSSY_INDEX_TYPES:
+            valid = ids >= 0
+            exact = np.einsum('qkd,qd->qk', self.embeddings[np.where(valid, ids, 0)], queries)
+            scores = np.where(valid, exact, -np.inf).astype(np.float32)
+            order = np.argsort(-scores, axis=1, kind='stable')
+            scores, ids = np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+        return scores, np.where(ids >= 0, ids + self.start, -1)
+
+    def info(self):
+        return {**self.manifest, 'ntotal': int(self.index.ntotal)}
+
+
+def create_shard_app(shard):
+    from flask import Flask, jsonify, request
+    app = Flask(__name__)
+
+    @app.route('/info', methods=['GET'])
+    def info():
+        return jsonify(shard.info())
+
+    @app.route('/search', methods=['POST'])
+    def search():
+        """Request body: { "queries": encoded float32 [n, dim], "k": int }"""
+        data = request.get_json(silent=True)
+        if not data or 'queries' not in data or 'k' not in data:
+            return jsonify({'error': 'Request body needs "queries" and "k"'}), 400
+        queries = decode_array(data['queries'])
+        if queries.ndim != 2 or queries.shape[1] != shard.manifest['dim']:
+            return jsonify({'error': f'"queries" must have shape [n, {shard.manifest["dim"]}]'}), 400
+        scores, ids = shard.search(queries, data['k'])
+        return jsonify({'scores': encode_array(scores), 'ids': encode_array(ids)})
+
+    return app
+
+
+# ===============================================
+# COORDINATOR SIDE
+# ===============================================
+
+_missing_shards = ContextVar('missing_shards', default=None)
+
+
+@contextmanager
+def track_missing_shards():
+    """Collect the shards left out of the searches run by this thread (also seen by enclosing trackers)"""
+    parent = _missing_shards.get()
+    missing = []
+    token = _missing_shards.set(missing)
+    try:
+        yield missing
+    finally:
+        _missing_shards.reset(token)
+        if parent is not None:
+            parent.extend(missing)
+
+
+class ShardedIndex:
+    """Remote shards behind the FAISS search interface (d, ntotal, search)"""
+
+    def __init__(self, urls, d, ntotal, timeout=2.0, max_workers=None):
+        """
+        urls: base URL of every shard server; d / ntotal: embedding dim and
+        number of base chunks. timeout (seconds) bounds every scatter-gather.
+        """
+        self.urls = [url.rstrip('/') for url in urls]
+        self.d = d
+        self.ntotal = ntotal
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or 8 * len(self.urls), thread_name_prefix='shard')
+        self._lock = threading.Lock()
+        self._stats = {url: {'url': url, 'requests': 0, 'failures': 0, 'timeouts': 0, 'last_error': None}
+                       for url in self.urls}
+
+    def _call(self, url, path, payload=None):
+        body = None if payload is None else json.dumps(payload).encode('utf-8')
+        req = urllib.request.Request(url + path, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def check(self, version):
+        """
+        Ask every shard for its manifest. Unreachable shards are only reported
+        (they are left out of searches until they come back); shards of another
+        corpus version or rows that do not add up to ntotal raise ValueError.
+        """
+        infos, unreachable = [], []
+        for url in self.urls:
+            try:
+                infos.append(self._call(url, '/info'))
+            except Exception as e:
+                unreachable.append(f"{url} ({e})")
+        for info in infos:
+            if info['corpus_version'] != version or info['dim'] != self.d:
+                raise ValueError(f"Shard {info['shard']} serves corpus {info['corpus_version']} (dim {info['dim']}), "
+                                 f"expected {version} (dim {self.d})")
+        ranges = sorted((info['start'], info['end']) for info in infos)
+        if any(a_end > b_start for (_, a_end), (b_start, _) in zip(ranges, ranges[1:])):
+            raise ValueError(f"Shard row ranges overlap: {ranges}")
+        if not unreachable and sum(end - start for start, end in ranges) != self.ntotal:
+            raise ValueError(f"Shards hold {sum(end - start for start, end in ranges)} chunks, corpus has {self.ntotal}")
+        return infos, unreachable
+
+    def search(self, queries, k):
+        """Scatter the queries to all shards and merge their top-k; missing shards are left out"""
+        payload = {'queries': encode_array(np.asarray(queries, dtype=np.float32)), 'k': int(k)}
+        futures = {self._pool.submit(self._call, url, '/search', payload): url for url in self.urls}
+        done, _ = wait(futures, timeout=self.timeout)
+
+        score_parts, id_parts, missing = [], [], []
+        for future, url in futures.items():
+            error = 'timeout' if future not in done else future.exception()
+            with self._lock:
+                stats = self._stats[url]
+                stats['requests'] += 1
+                if error is not None:
+                    stats['timeouts' if error == 'timeout' else 'failures'] += 1
+                    stats['last_error'] = str(error)
+            if error is not None:
+                missing.append(url)
+                continue
+            result = future.result()
+            score_parts.append(decode_array(result['scores']))
+            id_parts.append(decode_array(result['ids']))
+
+        sink = _missing_shards.get()
+        if sink is not None:
+            sink.extend(missing)
+        if not score_parts:
+            return (np.full((len(queries), 1), -np.inf, dtype=np.float32),
+                    np.full((len(queries), 1), -1, dtype=np.int64))
+        scores = np.hstack(score_parts)
+        ids = np.hstack(id_parts)
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def stats(self):
+        with self._lock:
+            return [dict(st) for st in self._stats.values()]
+
+
+# ===============================================
+# CLI
+# ===============================================
+
+def _load_embeddings(data_dir):
+    """(embeddings, corpus version) from the corpus store, else from the notebook artifacts"""
+    from corpus_store import CorpusStore, legacy_corpus_version
+    store_dir = data_dir / 'corpus_store'
+    if CorpusStore.exists(store_dir):
+        store = CorpusStore(store_dir)
+        return store.embeddings, store.version
+    return np.load(data_dir / 'chunk_embeddings_normalized.npy', mmap_mode='r'), legacy_corpus_version(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or serve corpus shards')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='Split the corpus embeddings into shards')
+    build.add_argument('--data-dir', default=str(DATA_DIR))
+    build.add_argument('--out', default=None, help='Output directory (default <data-dir>/shards)')
+    build.add_argument('--num-shards', type=int, required=True)
+    build.add_argument('--index-type', default='flat', choices=['flat', 'ivf_flat', 'hnsw', 'ivf_pq'])
+    serve = sub.add_parser('serve', help='Serve one shard over HTTP')
+    serve.add_argument('shard_dir')
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=5101)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        data_dir = Path(args.data_dir)
+        embeddings, version = _load_embeddings(data_dir)
+        start = time.perf_counter()
+        manifests = build_shards(embeddings, args.num_shards, Path(args.out) if args.out else data_dir / 'shards',
+                                 version, args.index_type)
+        for m in manifests:
+            print(f"   shard {m['shard']}: chunks [{m['start']}, {m['end']})")
+        print(f"✅ Built {len(manifests)} {args.index_type} shards in {time.perf_counter() - start:.1f}s")
+    else:
+        # Same search knobs as the API
+        shard = Shard(args.shard_dir, nprobe=int(os.environ.get('PLAGIARISM_FAISS_NPROBE', 16)),
+                      ef_search=int(os.environ.get('PLAGIARISM_FAISS_EF_SEARCH', 128)))
+        info = shard.info()
+        print(f"✅ Shard {info['shard']}/{info['num_shards']}: chunks [{info['start']}, {info['end']}) "
+              f"on http://{args.host}:{args.port}")
+        create_shard_app(shard).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
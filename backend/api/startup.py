@@ -0,0 +1,80 @@
+"""
+Startup orchestration for the API process
+Independent artifacts (corpus files, embeddings, FAISS index, encoder) load in
+parallel on a small thread pool. Optional ones, such as the AI detector, keep
+loading in the background while the API already serves requests. Each
+component's state and load time is kept for /api/health.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class StartupOrchestrator:
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.started_at = time.monotonic()
+        self._components = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def submit(self, name, loader, background=False):
+        """Start loading a component; no-op while it is loading or loaded, retried if it failed"""
+        with self._lock:
+            comp = self._components.get(name)
+            if comp is not None and comp['status'] != 'failed':
+                return comp['future']
+            if self._pid != os.getpid():
+                # Pool threads do not survive a fork; workers get their own pool
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='startup')
+                self._pid = os.getpid()
+            comp = {'status': 'loading', 'background': background, 'load_time_s': None, 'error': None}
+            comp['future'] = self._pool.submit(self._load, name, comp, loader)
+            self._components[name] = comp
+            return comp['future']
+
+    def _load(self, name, comp, loader):
+        start = time.monotonic()
+        try:
+            value = loader()
+        except Exception as e:
+            comp.update(status='failed', error=str(e), load_time_s=round(time.monotonic() - start, 2))
+            print(f"❌ Failed to load {name}: {e}")
+            raise
+        comp.update(status='ready', load_time_s=round(time.monotonic() - start, 2))
+        print(f"✅ Loaded {name} in {comp['load_time_s']}s")
+        return value
+
+    def result(self, name, loader=None, timeout=None):
+        """Wait for a component; with a loader it is started on demand (or retried) first"""
+        if loader is not None:
+            self.submit(name, loader)
+        with self._lock:
+            comp = self._components.get(name)
+        if comp is None:
+            raise KeyError(f"Unknown startup component '{name}'")
+        return comp['future'].result(timeout)
+
+    def peek(self, name):
+        """Value of a loaded component, or None while it is missing, loading or failed"""
+        with self._lock:
+            comp = self._components.get(name)
+        if comp is None or comp['status'] != 'ready':
+            return None
+        return comp['future'].result()
+
+    def wait(self, timeout=None):
+        """Block until every submitted component (background ones included) has finished or failed"""
+        with self._lock:
+            futures = [comp['future'] for comp in self._components.values()]
+        wait(futures, timeout=timeout)
+
+    def status(self):
+        with self._lock:
+            return {
+                name: {key: comp[key] for key in ('status', 'background', 'load_time_s', 'error')}
+                for name, comp in self._components.items()
+            }
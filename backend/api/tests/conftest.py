@@ -0,0 +1,84 @@
+"""
+Shared fixtures: a small synthetic corpus and a deterministic bag-of-words
+encoder standing in for the bi-encoder, so the pipeline runs without models.
+"""
+
+import sys
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import faiss  # noqa: E402
+
+from corpus_store import CorpusIndex  # noqa: E402
+from detector import CompletePlagiarismDetector, ContextExpander, DocumentScorer  # noqa: E402
+from text_chunker import TextChunker  # noqa: E402
+
+DIM = 64
+WORDS = ('sinh viên học tập nghiên cứu khoa học công nghệ thông tin dữ liệu mô hình phân tích kết quả '
+         'phương pháp thực nghiệm hệ thống mạng máy tính giáo dục kinh tế xã hội môi trường phát triển '
+         'ứng dụng trường đại học giảng viên bài báo luận văn đánh giá chất lượng').split()
+
+
+class HashEncoder:
+    """Sum of one pseudo-random unit vector per word: shared words mean similar embeddings"""
+
+    def __init__(self, dim=DIM):
+        self.dim = dim
+        self.calls = 0
+
+    def _word(self, word):
+        rng = np.random.default_rng(zlib.crc32(word.lower().encode('utf-8')))
+        return rng.standard_normal(self.dim)
+
+    def encode(self, texts, show_progress_bar=False, convert_to_numpy=True):
+        self.calls += 1
+        return np.stack([sum((self._word(w) for w in text.split()), np.zeros(self.dim)) for text in texts])
+
+
+def make_text(rng, num_sentences):
+    return ' '.join(' '.join(rng.choice(WORDS, size=rng.integers(8, 16))).capitalize() + '.'
+                    for _ in range(num_sentences))
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms < 1e-8] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+@pytest.fixture(scope='session')
+def corpus():
+    """60 documents of 3-12 sentences, chunked per sentence, with normalized embeddings and a flat index"""
+    rng = np.random.default_rng(7)
+    chunker = TextChunker()
+    data = [{'id': f'doc{i}', 'text': make_text(rng, int(rng.integers(3, 13))),
+             'title': f'T{i}', 'url': f'http://example.com/{i}'} for i in range(60)]
+    chunks = [c for doc in data for c in chunker.chunk_text(doc['text'], doc['id'])]
+    embeddings = normalize(HashEncoder().encode([c['text'] for c in chunks]))
+    index = faiss.IndexFlatIP(DIM)
+    index.add(embeddings)
+    return {'data': data, 'chunks': chunks, 'embeddings': embeddings, 'index': index,
+            'corpus_index': CorpusIndex.from_chunks(chunks, data)}
+
+
+@pytest.fixture
+def make_detector(corpus):
+    """CompletePlagiarismDetector over the synthetic corpus; keyword arguments override the defaults"""
+    def make(**kwargs):
+        options = dict(
+            bi_encoder=HashEncoder(),
+            chunk_faiss_index=corpus['index'],
+            corpus_chunks=corpus['chunks'],
+            corpus_data=corpus['data'],
+            doc_scorer=DocumentScorer(corpus['chunks'], corpus_index=corpus['corpus_index']),
+            context_expander=ContextExpander(corpus['chunks'], corpus['data'], corpus_index=corpus['corpus_index']),
+            corpus_embeddings=corpus['embeddings'],
+        )
+        options.update(kwargs)
+        return CompletePlagiarismDetector(**options)
+    return make
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import EndpointLimiter, configured_limits
+
+
+def hold_slot(limiter):
+    """Occupy one slot from another thread until the returned event is set"""
+    held, release = threading.Event(), threading.Event()
+
+    def run():
+        with limiter.slot() as admitted:
+            assert admitted
+            held.set()
+            release.wait(timeout=5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert held.wait(timeout=5)
+    return release, thread
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_full_queue_is_rejected_without_waiting():
+    limiter = EndpointLimiter('t', max_concurrent=1, max_queue=1, queue_timeout=5)
+    release, holder = hold_slot(limiter)
+    queued = []
+
+    def wait_for_slot():
+        with limiter.slot() as admitted:
+            queued.append(admitted)
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    wait_until(lambda: limiter.stats()['waiting'] == 1)
+
+    start = time.monotonic()
+    with limiter.slot() as admitted:
+        assert not admitted
+    assert time.monotonic() - start < 1
+    assert limiter.stats()['rejected'] == 1
+
+    # The queued request gets the slot once it is released
+    release.set()
+    holder.join()
+    waiter.join(timeout=5)
+    assert queued == [True]
+
+
+def test_queued_request_times_out():
+    limiter = EndpointLimiter('t', max_concurrent=1, max_queue=2, queue_timeout=0.05)
+    release, holder = hold_slot(limiter)
+    with limiter.slot() as admitted:
+        assert not admitted
+    stats = limiter.stats()
+    assert stats['timed_out'] == 1 and stats['rejected'] == 0 and stats['waiting'] == 0
+    release.set()
+    holder.join()
+
+
+def test_retry_after_scales_with_service_time_and_queue(monkeypatch):
+    limiter = EndpointLimiter('t', max_concurrent=2, max_queue=4)
+    assert limiter.retry_after() == 1
+
+    clock = [100.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: clock[0])
+    with limiter.slot():
+        clock[0] += 10
+    assert limiter.stats()['avg_service_s'] == 10.0
+
+    limiter.running, limiter.waiting = 2, 4
+    # 6 requests ahead, 2 at a time, 10 s each
+    assert limiter.retry_after() == 30
+
+
+def test_slot_is_released_when_the_request_fails():
+    limiter = EndpointLimiter('t', max_concurrent=1, max_queue=0, queue_timeout=0)
+    with pytest.raises(RuntimeError):
+        with limiter.slot() as admitted:
+            assert admitted
+            raise RuntimeError('handler failed')
+    assert limiter.stats()['running'] == 0
+    with limiter.slot() as admitted:
+        assert admitted
+    assert limiter.stats()['admitted'] == 2
+
+
+def test_configured_limits_read_the_environment():
+    limits = configured_limits({'AI_MAX_CONCURRENT': '8', 'AI_MAX_QUEUE': '0', 'PLAGIARISM_BULK_MAX_CONCURRENT': '2'})
+    assert limits['ai'] == (8, 0)
+    assert limits['bulk'] == (2, 0)
+    assert limits['plagiarism'] == (2, 8)
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ai_cascade import CheapAIScorer, check_band_report, evaluate_bands
+
+COMBINER = Path(__file__).resolve().parents[2] / 'data' / 'combiner_logreg.joblib'
+
+
+def label(p):
+    return 'ai' if p >= 0.6 else 'human'
+
+
+def test_evaluate_bands_measures_agreement_with_phobert():
+    cheap = [0.05, 0.1, 0.5, 0.95, 0.15]
+    phobert = [0.1, 0.7, 0.4, 0.9, 0.2]
+    rows = evaluate_bands(cheap, phobert, windows=[1, 2, 3, 4, 5], seconds=[1, 1, 1, 1, 1],
+                          bands=[(0.2, 1.0), (0.0, 0.9)], label_fn=label, labels=np.array([0, 1, 0, 1, 0]))
+
+    loose, strict = rows
+    # [0.2, 1.0]: texts 0, 1 and 4 skip PhoBERT; text 1 is one PhoBERT flags
+    assert loose['phobert_skipped'] == 0.6 and loose['windows_saved'] == round(8 / 15, 4)
+    assert loose['missed_suspicious'] == 1 and loose['label_agreement'] == 0.8
+    # [0.0, 0.9]: only text 3, which PhoBERT flags as well
+    assert strict['phobert_skipped'] == 0.2 and strict['false_suspicious'] == 0
+    assert strict['label_agreement'] == 1.0 and strict['accuracy'] == 1.0
+
+
+def write_report(path, **overrides):
+    report = {
+        'texts': 200, 'combiner_version': 'c1', 'phobert_version': 'p1',
+        'configured_band': {'low': 0.2, 'high': 1.0, 'label_agreement': 0.97, 'missed_suspicious': 0},
+        'bands': [{'low': 0.3, 'high': 1.0, 'label_agreement': 0.9, 'missed_suspicious': 0},
+                  {'low': 0.1, 'high': 0.9, 'label_agreement': 0.99, 'missed_suspicious': 2}],
+    }
+    report.update(overrides)
+    path.write_text(json.dumps(report))
+    return path
+
+
+def test_band_report_gates_the_cascade(tmp_path):
+    path = write_report(tmp_path / 'report.json')
+    assert check_band_report(path, 0.2, 1.0, 'c1', 'p1') is None
+    assert 'agrees with PhoBERT on 90.0%' in check_band_report(path, 0.3, 1.0, 'c1', 'p1')
+    assert 'clears 2 suspicious' in check_band_report(path, 0.1, 0.9, 'c1', 'p1')
+    assert 'not in' in check_band_report(path, 0.25, 1.0, 'c1', 'p1')
+    assert 'other model files' in check_band_report(path, 0.2, 1.0, 'c2', 'p1')
+    assert 'other model files' in check_band_report(path, 0.2, 1.0, 'c1', 'p2')
+    assert 'no usable evaluation report' in check_band_report(tmp_path / 'missing.json', 0.2, 1.0, 'c1', 'p1')
+
+
+@pytest.mark.skipif(not COMBINER.exists(), reason='combiner model not shipped')
+def test_unvalidated_scorer_defers_every_text_to_phobert():
+    pytest.importorskip('sklearn')
+    pytest.importorskip('pandas')
+    scorer = CheapAIScorer.load(COMBINER, low=0.2, high=0.8)
+    scores = scorer.score(['Xin chào. Đây là một văn bản ngắn.', 'Một câu khác hoàn toàn. ' * 30])
+    assert np.all((scores >= 0) & (scores <= 1))
+    assert {'prob_model', 'mlm_pseudo_ppl'} <= set(scorer.fixed)
+    assert scorer.decide(0.1) == 'human' and scorer.decide(0.9) == 'ai' and scorer.decide(0.5) is None
+
+    scorer.validated = False
+    assert [scorer.decide(s) for s in (0.0, 0.1, 0.9, 1.0)] == [None] * 4
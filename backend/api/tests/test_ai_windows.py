@@ -0,0 +1,123 @@
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+from conftest import make_text
+
+torch = pytest.importorskip('torch')
+
+from ai_windows import (_predict_prob_from_ids_simple, _score_windows, _tokenize_with_sentence_ids,  # noqa: E402
+                        analyze_ai_document_windows, get_ai_label, predict_probs_batched, split_ai_sentences)
+
+PAD = 1
+
+
+class StubClassifier(torch.nn.Module):
+    """Embedding + masked mean pooling + linear head: padding only matters if attention_mask is ignored"""
+
+    def __init__(self, vocab=300, dim=16):
+        super().__init__()
+        generator = torch.Generator().manual_seed(0)
+        self.embed = torch.nn.Parameter(torch.randn(vocab, dim, generator=generator))
+        self.head = torch.nn.Parameter(torch.randn(dim, 2, generator=generator))
+
+    def forward(self, input_ids, attention_mask):
+        mask = attention_mask.unsqueeze(-1).float()
+        pooled = (self.embed[input_ids] * mask).sum(1) / mask.sum(1)
+        return type('Output', (), {'logits': pooled @ self.head})()
+
+
+class StubTokenizer:
+    pad_token_id = PAD
+
+
+def mixed_windows(n=40):
+    rng = np.random.default_rng(3)
+    return [[0] + rng.integers(5, 300, size=rng.integers(6, 120)).tolist() + [2] for _ in range(n)]
+
+
+def test_batched_scores_match_one_window_at_a_time():
+    model = StubClassifier()
+    windows = mixed_windows()
+    single = [_predict_prob_from_ids_simple(w, model) for w in windows]
+    for batch_size in (1, 7, 64):
+        batched = predict_probs_batched(windows, model, pad_token_id=PAD, batch_size=batch_size)
+        np.testing.assert_allclose(batched, single, atol=1e-5)
+    np.testing.assert_allclose(_score_windows(windows, model, StubTokenizer(), batch_size=8), single, atol=1e-5)
+
+
+def test_failed_batch_falls_back_to_single_windows():
+    model = StubClassifier()
+    windows = mixed_windows(10)
+    single = [_predict_prob_from_ids_simple(w, model) for w in windows]
+
+    class FailsOnPadding(StubClassifier):
+        def forward(self, input_ids, attention_mask):
+            if len(input_ids) > 1:
+                raise RuntimeError('out of memory')
+            return super().forward(input_ids, attention_mask)
+
+    flaky = FailsOnPadding()
+    np.testing.assert_allclose(predict_probs_batched(windows, flaky, pad_token_id=PAD, batch_size=4), single, atol=1e-5)
+
+
+def test_no_windows():
+    assert predict_probs_batched([], StubClassifier()) == []
+
+
+class WordTokenizer:
+    """One token per whitespace-separated word; the fast variant tokenizes the whole text with offsets"""
+
+    pad_token_id = PAD
+
+    def __init__(self, is_fast):
+        self.is_fast = is_fast
+
+    def __call__(self, text, add_special_tokens=False, truncation=False, return_offsets_mapping=False):
+        words = list(re.finditer(r'\S+', text))
+        enc = {'input_ids': [5 + zlib.crc32(w.group().encode('utf-8')) % 295 for w in words]}
+        if return_offsets_mapping:
+            assert self.is_fast
+            enc['offset_mapping'] = [w.span() for w in words]
+        return enc
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [0] + list(ids) + [2]
+
+
+def document(num_sentences=40):
+    rng = np.random.default_rng(11)
+    # A short sentence in the middle, which never gets a score
+    return make_text(rng, num_sentences // 2) + ' Rất ngắn. ' + make_text(rng, num_sentences // 2)
+
+
+def test_fast_and_slow_tokenizers_give_the_same_sentence_ids():
+    text = document()
+    sentences = split_ai_sentences(text)
+    fast_ids, fast_sentence = _tokenize_with_sentence_ids(text, sentences, WordTokenizer(is_fast=True))
+    slow_ids, slow_sentence = _tokenize_with_sentence_ids(text, sentences, WordTokenizer(is_fast=False))
+    assert fast_ids == slow_ids
+    np.testing.assert_array_equal(fast_sentence, slow_sentence)
+    np.testing.assert_array_equal(np.bincount(slow_sentence), [len(s.split()) for s in sentences])
+
+
+def test_document_windows_score_every_sentence():
+    text = document()
+    model = StubClassifier()
+    analyses = []
+    for is_fast in (True, False):
+        analysis, window_scores = analyze_ai_document_windows(text, model, WordTokenizer(is_fast), stride_tokens=64)
+        assert len(window_scores) > 3
+        analyses.append(analysis)
+
+    assert analyses[0] == analyses[1]
+    sentences = split_ai_sentences(text)
+    assert [a['sentence'] for a in analyses[0]] == sentences
+    for result in analyses[0]:
+        if result['word_count'] < 5:
+            assert result['confidence'] == 0.0 and result['label'] == 'Nguoi viet'
+        else:
+            assert 0.0 < result['confidence'] < 1.0
+            assert result['label'] == get_ai_label(result['confidence'])
@@ -0,0 +1,68 @@
+import numpy as np
+
+from collusion import CollusionDetector
+from conftest import HashEncoder, make_text, normalize
+from detector import DocumentScorer
+from text_chunker import TextChunker
+
+COPIED = 'Sinh viên nghiên cứu mô hình phân tích dữ liệu giáo dục bằng phương pháp thực nghiệm tại trường đại học.'
+EDITED = 'Sinh viên nghiên cứu mô hình phân tích dữ liệu giáo dục bằng phương pháp thực nghiệm tại trường.'
+
+
+def make_collusion_detector(**kwargs):
+    return CollusionDetector(
+        encode=lambda texts: normalize(HashEncoder().encode(texts)),
+        chunker=TextChunker(),
+        make_scorer=lambda chunks, index: DocumentScorer(chunks, corpus_index=index),
+        **kwargs
+    )
+
+
+def test_copied_pair_is_found_despite_duplicates_inside_each_submission():
+    # Each submission repeats its sentence more often than k, so its own
+    # duplicates outrank the (slightly edited) copy in the other one
+    submissions = [{'id': 'a', 'text': ' '.join([COPIED] * 22)}, {'id': 'b', 'text': ' '.join([EDITED] * 22)}]
+    rng = np.random.default_rng(5)
+    submissions += [{'id': f's{i}', 'text': make_text(rng, 6)} for i in range(5)]
+
+    report = make_collusion_detector(k=20).detect(submissions)
+    assert (report['pairs'][0]['doc_a'], report['pairs'][0]['doc_b']) == ('a', 'b')
+    assert report['pairs'][0]['matches'][0]['text_a'] == COPIED.rstrip('.')
+    assert report['pairs'][0]['matches'][0]['text_b'] == EDITED.rstrip('.')
+
+
+def test_clusters_and_max_pairs():
+    rng = np.random.default_rng(6)
+    texts = {name: make_text(rng, 6) for name in ('a', 'c', 'x', 'y')}
+    submissions = [
+        {'id': 'a', 'text': texts['a']},
+        {'id': 'b', 'text': texts['a'] + ' ' + make_text(rng, 1)},
+        {'id': 'c', 'text': texts['c']},
+        {'id': 'd', 'text': texts['c']},
+        {'id': 'e', 'text': make_text(rng, 1) + ' ' + texts['c']},
+        {'id': 'x', 'text': texts['x']},
+        {'id': 'y', 'text': texts['y']},
+    ]
+    detector = make_collusion_detector()
+    report = detector.detect(submissions)
+    assert {(p['doc_a'], p['doc_b']) for p in report['pairs']} == {('a', 'b'), ('c', 'd'), ('c', 'e'), ('d', 'e')}
+    assert [c['members'] for c in report['clusters']] == [['c', 'd', 'e'], ['a', 'b']]
+    assert report['clusters'][0]['num_pairs'] == 3
+
+    limited = detector.detect(submissions, max_pairs=2)
+    assert limited['pairs'] == report['pairs'][:2]
+    assert limited['clusters'] == report['clusters']
+    assert limited['stats']['suspicious_pairs'] == 4
+
+
+def test_hnsw_join_matches_exact_join():
+    rng = np.random.default_rng(7)
+    texts = [make_text(rng, 6) for _ in range(6)]
+    submissions = [{'id': f's{i}', 'text': text} for i, text in enumerate(texts)]
+    submissions.append({'id': 'copy', 'text': texts[2]})
+    exact = make_collusion_detector().detect(submissions)
+    hnsw = make_collusion_detector(exact_max_chunks=0).detect(submissions)
+    assert hnsw['stats']['join'] == 'hnsw'
+    assert [(p['doc_a'], p['doc_b'], p['score']) for p in hnsw['pairs']] == \
+        [(p['doc_a'], p['doc_b'], p['score']) for p in exact['pairs']]
+    assert (exact['pairs'][0]['doc_a'], exact['pairs'][0]['doc_b']) == ('copy', 's2')
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from conftest import make_text
+from detector import DocumentScorer
+
+
+def _random_hits(corpus, seed, num_hits=200):
+    rng = np.random.default_rng(seed)
+    chunk_idx = rng.choice(len(corpus['chunks']), size=num_hits, replace=False)
+    sims = np.sort(rng.uniform(0.2, 1.0, size=num_hits))[::-1]
+    return sims, chunk_idx
+
+
+@pytest.fixture
+def scorer(corpus):
+    return DocumentScorer(corpus['chunks'], corpus_index=corpus['corpus_index'])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_threshold_pruning_keeps_every_document_that_can_pass(corpus, scorer, seed):
+    sims, chunk_idx = _random_hits(corpus, seed)
+    full = scorer.calculate_doc_scores_arrays(sims, chunk_idx)
+    pruned = scorer.calculate_doc_scores_arrays(sims, chunk_idx, prune='threshold', min_score=0.6)
+
+    by_id = {doc['doc_id']: doc for doc in full}
+    passing = [doc['doc_id'] for doc in full if doc['final_score'] >= 0.6]
+    assert [doc['doc_id'] for doc in pruned if doc['final_score'] >= 0.6] == passing
+    for doc in pruned:
+        assert doc == by_id[doc['doc_id']]
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('top_n', [1, 5, 15])
+def test_top_n_pruning_returns_the_same_top_documents(corpus, scorer, seed, top_n):
+    sims, chunk_idx = _random_hits(corpus, seed)
+    assert (scorer.calculate_doc_scores_arrays(sims, chunk_idx, top_n=top_n, prune='top_n')
+            == scorer.calculate_doc_scores_arrays(sims, chunk_idx, top_n=top_n))
+
+
+def test_pruning_drops_documents(corpus, scorer):
+    sims, chunk_idx = _random_hits(corpus, 0)
+    sims = np.where(np.arange(len(sims)) < 20, sims, sims * 0.3)
+    full = scorer.calculate_doc_scores_arrays(sims, chunk_idx)
+    pruned = scorer.calculate_doc_scores_arrays(sims, chunk_idx, prune='threshold', min_score=0.6)
+    assert 0 < len(pruned) < len(full)
+
+
+def test_unknown_prune_mode_is_rejected(corpus, scorer):
+    sims, chunk_idx = _random_hits(corpus, 0)
+    with pytest.raises(ValueError):
+        scorer.calculate_doc_scores_arrays(sims, chunk_idx, prune='fast')
+
+
+def test_pairs_and_arrays_score_alike(corpus, scorer):
+    sims, chunk_idx = _random_hits(corpus, 3)
+    assert (scorer.calculate_doc_scores(list(zip(sims, chunk_idx)), top_n=10)
+            == scorer.calculate_doc_scores_arrays(sims, chunk_idx, top_n=10))
+
+
+def test_fully_matched_document_features(corpus, scorer):
+    rows = np.flatnonzero(np.asarray(corpus['corpus_index'].chunk_doc_idx) == 4)
+    doc = scorer.calculate_doc_scores_arrays(np.ones(len(rows)), rows)[0]
+    assert doc['doc_id'] == 'doc4'
+    assert doc['doc_max'] == doc['doc_mean'] == 1.0
+    assert doc['doc_count'] == 1.0
+    assert doc['num_chunks'] == len(rows)
+    assert [c['chunk_idx'] for c in doc['chunks']] == rows.tolist()
+
+
+@pytest.mark.parametrize('prune', ['threshold', 'top_n'])
+def test_detect_pruning_parity(corpus, make_detector, prune):
+    detector = make_detector()
+    rng = np.random.default_rng(11)
+    queries = [corpus['data'][3]['text'], corpus['data'][8]['text'][:200] + ' ' + make_text(rng, 3),
+               make_text(rng, 5)]
+    for query, full, pruned in zip(queries, detector.detect_batch(queries),
+                                   detector.detect_batch(queries, prune=prune)):
+        assert pruned['confidence'] == full['confidence']
+        assert pruned['prediction'] == full['prediction']
+        if prune == 'top_n':
+            assert pruned['top_results'] == full['top_results']
+        else:
+            assert pruned['best_match'] == full['best_match'] or full['confidence'] < detector.threshold
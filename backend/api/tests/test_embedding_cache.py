@@ -0,0 +1,57 @@
+import unicodedata
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def vectors(n, dim=4):
+    return np.arange(n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache('m', max_entries=2)
+    cache.put_many(['a', 'b'], vectors(2))
+    cache.get_many(['a'])
+    cache.put_many(['c'], vectors(1))
+
+    a, b, c = cache.get_many(['a', 'b', 'c'])
+    assert a is not None and b is None and c is not None
+    assert cache.stats()['evictions'] == 1 and cache.stats()['entries'] == 2
+
+
+def test_key_ignores_whitespace_and_unicode_form_but_not_model():
+    cache = EmbeddingCache('m')
+    assert cache.key('  Tiếng\tViệt\n') == cache.key(unicodedata.normalize('NFD', 'Tiếng Việt'))
+    assert cache.key('Tiếng Việt') != cache.key('tiếng việt')
+    assert cache.key('Tiếng Việt') != EmbeddingCache('other').key('Tiếng Việt')
+
+
+def test_hits_and_misses_are_counted():
+    cache = EmbeddingCache('m')
+    cache.put_many(['a'], vectors(1))
+    found = cache.get_many(['a', 'b', 'a'])
+    assert [v is not None for v in found] == [True, False, True]
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_npz_round_trip_keeps_the_most_recent_entries(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    cache = EmbeddingCache('m', max_entries=3, persist_path=path)
+    cache.put_many(['a', 'b', 'c'], vectors(3))
+    cache.get_many(['a'])
+    cache.save()
+
+    reloaded = EmbeddingCache('m', max_entries=2, persist_path=path)
+    a, b, c = reloaded.get_many(['a', 'b', 'c'])
+    assert b is None
+    np.testing.assert_array_equal(a, vectors(3)[0])
+    np.testing.assert_array_equal(c, vectors(3)[2])
+
+    assert EmbeddingCache('other', persist_path=path).stats()['entries'] == 0
+
+
+def test_empty_cache_saves_and_loads(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    EmbeddingCache('m', persist_path=path).save()
+    assert EmbeddingCache('m', persist_path=path).stats()['entries'] == 0
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from inference_scheduler import BatchScheduler
+
+
+def test_concurrent_requests_share_batches():
+    calls = []
+
+    def batch_fn(items):
+        calls.append(len(items))
+        time.sleep(0.01)
+        return [item * 2 for item in items]
+
+    scheduler = BatchScheduler(batch_fn, max_batch_size=64, max_wait_ms=50)
+    results = {}
+    start = threading.Barrier(8)
+
+    def worker(n):
+        start.wait()
+        results[n] = scheduler.run(range(n * 10, n * 10 + 3))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {n: [2 * i for i in range(n * 10, n * 10 + 3)] for n in range(8)}
+    assert sum(calls) == 24
+    assert len(calls) < 8
+    assert scheduler.stats()['requests'] == 8
+
+
+def test_batches_never_exceed_max_size():
+    calls = []
+    scheduler = BatchScheduler(lambda items: calls.append(len(items)) or list(items), max_batch_size=5, max_wait_ms=20)
+    futures = [scheduler.submit([i, i, i]) for i in range(6)]
+    assert [f.result(timeout=5) for f in futures] == [[i, i, i] for i in range(6)]
+    assert max(calls) <= 5
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def batch_fn(items):
+        raise RuntimeError('model failed')
+
+    scheduler = BatchScheduler(batch_fn, max_wait_ms=20)
+    futures = [scheduler.submit(['a']), scheduler.submit(['b'])]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    # The worker survives and serves the next request
+    scheduler.batch_fn = lambda items: [item.upper() for item in items]
+    assert scheduler.run(['c']) == ['C']
+
+
+def test_empty_submit_resolves_without_a_batch():
+    scheduler = BatchScheduler(lambda items: pytest.fail('batch_fn called'))
+    assert scheduler.run([]) == []
+    assert scheduler.stats()['batches'] == 0
+
+
+def test_queue_depth_counts_the_request_carried_to_the_next_batch():
+    calls = []
+    releases = [threading.Event() for _ in range(3)]
+
+    def batch_fn(items):
+        calls.append(list(items))
+        releases[len(calls) - 1].wait(timeout=5)
+        return list(items)
+
+    def wait_for_calls(n):
+        deadline = time.monotonic() + 5
+        while len(calls) < n and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert len(calls) == n
+
+    scheduler = BatchScheduler(batch_fn, max_batch_size=3, max_wait_ms=20)
+    futures = [scheduler.submit(['a1', 'a2', 'a3'])]
+    wait_for_calls(1)
+    futures += [scheduler.submit(['b1', 'b2']), scheduler.submit(['c1', 'c2'])]
+    assert scheduler.queue_depth() == 2
+
+    # b fills the next batch, c does not fit and is held back for the one after
+    releases[0].set()
+    wait_for_calls(2)
+    assert calls[1] == ['b1', 'b2']
+    assert scheduler.queue_depth() == 1
+
+    releases[1].set()
+    releases[2].set()
+    assert [f.result(timeout=5) for f in futures] == [['a1', 'a2', 'a3'], ['b1', 'b2'], ['c1', 'c2']]
+    assert scheduler.queue_depth() == 0
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from conftest import make_text
+from lexical_index import AppendedLexicalIndex, LexicalIndex, shingle_hashes
+
+
+@pytest.fixture(scope='module')
+def texts(corpus):
+    return [c['text'] for c in corpus['chunks']]
+
+
+@pytest.fixture(scope='module')
+def index(texts):
+    return LexicalIndex.build(texts, version='v1')
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert np.array_equal(shingle_hashes('Sinh viên, học tập: nghiên cứu khoa học!'),
+                          shingle_hashes('sinh viên học tập nghiên cứu khoa học'))
+    assert len(shingle_hashes('quá ngắn nhé')) == 0
+
+
+def test_every_chunk_matches_itself(index, texts):
+    for row, text in enumerate(texts):
+        rows, containment, n_shingles = index.match(text)
+        if n_shingles:
+            assert row in rows[containment >= 1.0]
+            assert containment[0] == 1.0
+
+
+def test_containment_is_the_share_of_query_shingles(index, texts):
+    words = texts[0].split()
+    # Half the query copied, half new words that appear nowhere in the corpus
+    query = ' '.join(words + [f'từmới{i}' for i in range(len(words))])
+    rows, containment, n_shingles = index.match(query)
+    assert rows[0] == 0
+    expected = len(shingle_hashes(texts[0])) / len(shingle_hashes(query))
+    assert containment[0] == pytest.approx(expected)
+    assert n_shingles == len(shingle_hashes(query))
+
+
+def test_part_of_a_chunk_is_fully_contained(index, texts):
+    longest = max(range(len(texts)), key=lambda i: len(texts[i].split()))
+    rows, containment, _ = index.match(' '.join(texts[longest].split()[2:-2]))
+    assert longest in rows[containment >= 1.0]
+
+
+def test_unrelated_text_finds_nothing(index):
+    rows, containment, n_shingles = index.match(' '.join(f'từ{i}' for i in range(20)))
+    assert len(rows) == 0 and n_shingles == 17
+
+
+def test_stock_phrases_are_ignored(texts):
+    stock = 'trân trọng cảm ơn quý thầy cô'
+    index = LexicalIndex.build([f'{stock} {text}' for text in texts], max_postings=10)
+    rows, _, n_shingles = index.match(stock)
+    assert n_shingles == 0 and len(rows) == 0
+
+
+def test_save_and_load(index, tmp_path, texts):
+    index.save(tmp_path)
+    loaded = LexicalIndex.load(tmp_path, version='v1')
+    assert LexicalIndex.load(tmp_path, version='v2') is None
+    assert LexicalIndex.load(tmp_path / 'missing') is None
+    for text in texts[:20]:
+        for a, b in zip(index.match(text), loaded.match(text)):
+            np.testing.assert_array_equal(a, b)
+
+
+def test_appended_index_continues_the_base_rows(index, texts):
+    new_text = make_text(np.random.default_rng(5), 1) + ' kết thúc bằng những từ hoàn toàn khác biệt'
+    appended = AppendedLexicalIndex(index, [new_text])
+    assert len(appended) == len(texts) + 1
+    rows, containment, _ = appended.match(new_text)
+    assert rows[0] == len(texts) and containment[0] == 1.0
+    rows, containment, _ = appended.match(texts[7])
+    assert 7 in rows[containment >= 1.0]
+
+
+def _scores(result):
+    return [(doc['doc_id'], doc['final_score']) for doc in result['top_results']], result['confidence']
+
+
+@pytest.mark.parametrize('use_faiss', [True, False])
+def test_feature_mode_scores_like_off(corpus, index, make_detector, use_faiss):
+    off = make_detector()
+    feature = make_detector(lexical_index=index, lexical_mode='feature')
+    rng = np.random.default_rng(3)
+    queries = [corpus['data'][i]['text'] for i in (1, 9)] + [
+        corpus['data'][4]['text'][:150] + ' ' + make_text(rng, 4), make_text(rng, 6)]
+    for expected, result in zip(off.detect_batch(queries, use_faiss=use_faiss),
+                                feature.detect_batch(queries, use_faiss=use_faiss)):
+        assert _scores(result) == _scores(expected)
+        assert result['prediction'] == expected['prediction']
+        assert result['lexical_chunks'] == 0
+    copied = feature.detect(corpus['data'][1]['text'], use_faiss=use_faiss)
+    assert copied['best_match']['doc_lexical'] == 1.0
+
+
+def test_prefilter_resolves_verbatim_copies_without_the_encoder(corpus, index, make_detector):
+    detector = make_detector(lexical_index=index, lexical_mode='prefilter')
+    result = detector.detect(corpus['data'][2]['text'])
+    assert detector.bi_encoder.calls == 0
+    assert result['method'] == 'lexical'
+    assert result['best_match']['doc_id'] == 'doc2'
+    assert result['lexical_chunks'] == result['query_chunks']
@@ -0,0 +1,215 @@
+import json
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import live_corpus
+from corpus_store import CorpusIndex, CorpusStore, build_store, legacy_corpus_version
+from conftest import HashEncoder, make_text, normalize
+from live_corpus import DeltaLog, LiveCorpus, LogSealedError, carry_records, ingest_documents
+from text_chunker import TextChunker
+
+NEW_TEXT = ('Giảng viên đánh giá luận văn về môi trường kinh tế xã hội. Hệ thống mạng máy tính của trường '
+            'đại học phát triển ứng dụng dữ liệu. Bài báo phân tích chất lượng giáo dục bằng phương pháp thực nghiệm.')
+
+
+@pytest.fixture
+def live(corpus, tmp_path):
+    metadata = {doc['id']: doc for doc in corpus['data']}
+    return LiveCorpus(corpus['chunks'], corpus['corpus_index'], corpus['embeddings'], corpus['index'],
+                      metadata, 'v1', delta_root=tmp_path)
+
+
+def encode(texts):
+    return normalize(HashEncoder().encode(texts))
+
+
+def publish_to(detector):
+    """What the API's publish_corpus does for the detector components"""
+    def publish(snapshot):
+        for component in (detector.doc_scorer, detector.context_expander):
+            component.corpus_chunks = snapshot.chunks
+            component.corpus_index = snapshot.index
+        detector.corpus_chunks = snapshot.chunks
+        detector.chunk_alive = snapshot.chunk_alive
+        detector.corpus_embeddings = snapshot.embeddings
+        detector.chunk_faiss_index = snapshot.faiss_index
+    return publish
+
+
+@pytest.mark.parametrize('use_faiss', [True, False])
+def test_ingest_search_delete_search(corpus, live, make_detector, use_faiss):
+    detector = make_detector()
+    publish = publish_to(detector)
+    before = detector.detect(NEW_TEXT, use_faiss=use_faiss)
+    assert before['best_match']['doc_id'] != 'new1'
+
+    counts = ingest_documents(live.log, [{'id': 'new1', 'text': NEW_TEXT, 'title': 'New'}], TextChunker(), encode)
+    assert counts == {'documents': 1, 'chunks': 3}
+    snapshot = live.refresh(publish)
+    assert snapshot.version == live.snapshot.version != 'v1'
+    found = detector.detect(NEW_TEXT, use_faiss=use_faiss)
+    assert found['best_match']['doc_id'] == 'new1'
+    assert found['confidence'] > before['confidence']
+    assert live.metadata['new1']['title'] == 'New'
+
+    live.log.append_deletes(['new1', 'doc3'])
+    live.refresh(publish)
+    assert detector.detect(NEW_TEXT, use_faiss=use_faiss)['best_match']['doc_id'] != 'new1'
+    copied = detector.detect(corpus['data'][3]['text'], use_faiss=use_faiss)
+    assert all(doc['doc_id'] != 'doc3' for doc in copied['top_results'])
+    assert live.stats()['tombstoned_documents'] == 2
+
+
+def test_replacing_a_document_tombstones_the_old_version(corpus, live, make_detector):
+    detector = make_detector()
+    ingest_documents(live.log, [{'id': 'doc5', 'text': NEW_TEXT}], TextChunker(), encode)
+    live.refresh(publish_to(detector))
+    assert detector.detect(NEW_TEXT)['best_match']['doc_id'] == 'doc5'
+    assert all(doc['doc_id'] != 'doc5' for doc in detector.detect(corpus['data'][5]['text'])['top_results'])
+
+
+def test_replay_in_another_process(corpus, live, tmp_path):
+    ingest_documents(live.log, [{'id': 'new1', 'text': NEW_TEXT}], TextChunker(), encode)
+    live.log.append_deletes(['doc2'])
+    other = LiveCorpus(corpus['chunks'], corpus['corpus_index'], corpus['embeddings'], corpus['index'],
+                       {}, 'v1', delta_root=tmp_path)
+    live.refresh()
+    other.refresh()
+    assert other.snapshot.version == live.snapshot.version
+    assert other.stats() == live.stats()
+    np.testing.assert_array_equal(other.snapshot.chunk_alive, live.snapshot.chunk_alive)
+
+
+def test_snapshot_chains_base_columns_and_updates_tombstones_incrementally(corpus, live):
+    base = corpus['corpus_index']
+    rng = np.random.default_rng(2)
+    ingest_documents(live.log, [{'id': 'new1', 'text': NEW_TEXT}, {'id': 'new2', 'text': make_text(rng, 4)},
+                                {'id': 'doc5', 'text': make_text(rng, 3)}], TextChunker(), encode)
+    live.log.append_deletes(['doc3', 'new1'])
+    index = live.refresh().index
+    assert index.chunk_doc_idx.segments[0] is base.chunk_doc_idx
+    assert index.chunk_order.segments[0] is base.chunk_order
+
+    # Same answers as the concatenated arrays
+    chunk_doc_idx = np.asarray(index.chunk_doc_idx)
+    reference = CorpusIndex(list(index.doc_ids), chunk_doc_idx, np.asarray(index.chunk_position))
+    for row in (0, 5, len(base.doc_ids) - 1, live.row_of('new2'), live.row_of('doc5')):
+        np.testing.assert_array_equal(index.doc_chunk_indices(row), reference.doc_chunk_indices(row))
+    np.testing.assert_array_equal(np.asarray(index.doc_chunk_counts), reference.doc_chunk_counts)
+    rows = np.array([[0, len(chunk_doc_idx) - 1], [-1, len(base.chunk_doc_idx)]])
+    np.testing.assert_array_equal(index.chunk_doc_idx[rows], chunk_doc_idx[rows])
+    np.testing.assert_array_equal(index.chunk_doc_idx[-5:], chunk_doc_idx[-5:])
+
+    def expected_alive():
+        return ~np.isin(chunk_doc_idx, list(live.dead_rows))
+
+    np.testing.assert_array_equal(np.asarray(live.snapshot.chunk_alive), expected_alive())
+    base_alive = live.snapshot.chunk_alive.segments[0]
+
+    live.log.append_deletes(['new2', 'doc7'])
+    live.refresh()
+    np.testing.assert_array_equal(np.asarray(live.snapshot.chunk_alive), expected_alive())
+    assert live.snapshot.chunk_alive.segments[0] is base_alive
+    assert live.stats()['tombstoned_chunks'] == int((~expected_alive()).sum())
+
+
+def test_refresh_waits_for_a_running_replay(live):
+    ingest_documents(live.log, [{'id': 'new1', 'text': NEW_TEXT}], TextChunker(), encode)
+    published = threading.Event()
+
+    def slow_publish(snapshot):
+        time.sleep(0.2)
+        published.set()
+
+    replay = threading.Thread(target=live.refresh, args=(slow_publish,))
+    replay.start()
+    time.sleep(0.05)
+    live.refresh()
+    assert published.is_set()
+    assert live.row_of('new1') is not None
+    replay.join()
+
+
+def test_sealed_log_refuses_writes_and_carry_keeps_records(live, tmp_path):
+    ingest_documents(live.log, [{'id': 'new1', 'text': NEW_TEXT}, {'id': 'new2', 'text': make_text(
+        np.random.default_rng(0), 4)}], TextChunker(), encode)
+    live.log.append_deletes(['new1'])
+    records, _ = live.log.read()
+    target = DeltaLog(tmp_path / 'v2', live.log.dim)
+    carry_records(live.log, records, target)
+
+    carried, _ = target.read()
+    assert [r['op'] for r in carried] == ['add', 'add', 'delete']
+    for old, new in zip(records[:2], carried[:2]):
+        np.testing.assert_array_equal(target.embeddings(new['row'], len(new['chunks'])),
+                                      live.log.embeddings(old['row'], len(old['chunks'])))
+
+    (live.log.path / live_corpus.SEALED_FILE).write_text('v2')
+    with pytest.raises(LogSealedError):
+        live.log.append_deletes(['new2'])
+    with pytest.raises(LogSealedError):
+        ingest_documents(live.log, [{'id': 'new3', 'text': NEW_TEXT}], TextChunker(), encode)
+
+
+def test_compact_folds_the_delta_and_carries_late_records(corpus, tmp_path, monkeypatch):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    with open(data_dir / 'vn_plagiarism_corpus.json', 'w', encoding='utf-8') as f:
+        json.dump(corpus['data'], f, ensure_ascii=False)
+    with open(data_dir / 'corpus_chunks.pkl', 'wb') as f:
+        pickle.dump(corpus['chunks'], f)
+    with open(data_dir / 'chunk_metadata.pkl', 'wb') as f:
+        pickle.dump({'chunk_ids': [c['chunk_id'] for c in corpus['chunks']]}, f)
+    np.save(data_dir / 'chunk_embeddings_normalized.npy', corpus['embeddings'])
+    store_dir, delta_root = data_dir / 'corpus_store', data_dir / 'corpus_delta'
+
+    log = DeltaLog(delta_root / legacy_corpus_version(data_dir), corpus['embeddings'].shape[1])
+    ingest_documents(log, [{'id': 'new1', 'text': NEW_TEXT}], TextChunker(), encode)
+    log.append_deletes(['doc3'])
+
+    # A document ingested while the new store is being built
+    write_store = live_corpus.write_store
+
+    def write_store_while_ingesting(*args, **kwargs):
+        manifest = write_store(*args, **kwargs)
+        ingest_documents(log, [{'id': 'late', 'text': make_text(np.random.default_rng(1), 3)}], TextChunker(), encode)
+        return manifest
+
+    monkeypatch.setattr(live_corpus, 'write_store', write_store_while_ingesting)
+    manifest = live_corpus.compact(data_dir, store_dir, delta_root)
+
+    store = CorpusStore(store_dir)
+    assert store.version == manifest['version']
+    doc_ids = list(store.doc_id)
+    assert 'new1' in doc_ids and 'doc3' not in doc_ids and 'late' not in doc_ids
+    assert len(doc_ids) == len(corpus['data'])
+    assert len(store.chunk_id) == len(store.embeddings) == (
+        len(corpus['chunks']) + 3 - sum(c['doc_id'] == 'doc3' for c in corpus['chunks']))
+    assert (data_dir / 'chunk_faiss_index.faiss').exists()
+
+    carried, _ = DeltaLog(delta_root / store.version, log.dim).read()
+    assert [(r['op'], r['doc']['id']) for r in carried] == [('add', 'late')]
+    with pytest.raises(LogSealedError):
+        log.append_deletes(['doc4'])
+
+
+def test_rebuilt_store_is_swapped_in_without_touching_an_open_one(corpus, tmp_path):
+    store_dir = tmp_path / 'corpus_store'
+    chunk_ids = [c['chunk_id'] for c in corpus['chunks']]
+    build_store(corpus['data'], corpus['chunks'], corpus['embeddings'], chunk_ids, store_dir)
+    old = CorpusStore(store_dir)
+
+    chunks = corpus['chunks'][:10]
+    build_store(corpus['data'][:5], chunks, corpus['embeddings'][:10], chunk_ids[:10], store_dir)
+    assert not (tmp_path / 'corpus_store.new').exists() and (tmp_path / 'corpus_store.old').is_dir()
+
+    # Columns first opened after the swap still come from the old generation
+    assert len(old.embeddings) == len(corpus['chunks']) and len(old.doc_id) == len(corpus['data'])
+    assert old.chunk_text[-1] == corpus['chunks'][-1]['text']
+    new = CorpusStore(store_dir)
+    assert new.version != old.version and len(new.embeddings) == 10
+    assert CorpusIndex.from_store(new).doc_row == {f'doc{i}': i for i in range(5)}
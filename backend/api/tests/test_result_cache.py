@@ -0,0 +1,63 @@
+import result_cache
+from result_cache import ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    cache = ResultCache(ttl_seconds=60)
+    cache.put('a', 1)
+
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 2
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert stats['expirations'] == 1 and stats['entries'] == 0 and stats['misses'] == 1
+
+
+def test_ttl_zero_never_expires(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    cache = ResultCache(ttl_seconds=0)
+    cache.put('a', 1)
+    clock.now += 10 ** 6
+    assert cache.get('a') == 1
+
+
+def test_key_covers_endpoint_version_text_and_params():
+    key = ResultCache.make_key('plagiarism', 'Văn bản', 'v1', top_k=5, mode='fast')
+    assert key == ResultCache.make_key('plagiarism', 'Văn bản', 'v1', mode='fast', top_k=5)
+    assert key != ResultCache.make_key('ai', 'Văn bản', 'v1', top_k=5, mode='fast')
+    assert key != ResultCache.make_key('plagiarism', 'Văn bản', 'v2', top_k=5, mode='fast')
+    assert key != ResultCache.make_key('plagiarism', 'Văn bản ', 'v1', top_k=5, mode='fast')
+    assert key != ResultCache.make_key('plagiarism', 'Văn bản', 'v1', top_k=6, mode='fast')
+
+
+def test_invalidate_drops_every_entry():
+    cache = ResultCache()
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.invalidate()
+    assert cache.get('a') is None and cache.get('b') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,134 @@
+import socket
+import threading
+
+import numpy as np
+import pytest
+from werkzeug.serving import make_server
+
+from sharding import Shard, ShardedIndex, build_shards, create_shard_app, decode_array, encode_array, track_missing_shards
+
+NUM_SHARDS = 3
+
+
+@pytest.fixture(scope='module')
+def shard_urls(corpus, tmp_path_factory):
+    """One HTTP server per shard of the synthetic corpus, on free local ports"""
+    out = tmp_path_factory.mktemp('shards')
+    build_shards(corpus['embeddings'], NUM_SHARDS, out, 'v1')
+    servers = []
+    for i in range(NUM_SHARDS):
+        server = make_server('127.0.0.1', 0, create_shard_app(Shard(out / f'shard_{i}')), threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield [f'http://127.0.0.1:{server.server_port}' for server in servers]
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def silent_url():
+    """A port that accepts connections but never answers"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(8)
+    yield f'http://127.0.0.1:{sock.getsockname()[1]}'
+    sock.close()
+
+
+def _closed_url():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f'http://127.0.0.1:{port}'
+
+
+def _queries(corpus, n=12):
+    rng = np.random.default_rng(2)
+    noisy = corpus['embeddings'][rng.choice(len(corpus['embeddings']), n)] + 0.05 * rng.standard_normal(
+        (n, corpus['embeddings'].shape[1]))
+    return np.ascontiguousarray(noisy / np.linalg.norm(noisy, axis=1, keepdims=True), dtype=np.float32)
+
+
+def _sharded(corpus, urls, timeout=2.0):
+    return ShardedIndex(urls, corpus['embeddings'].shape[1], len(corpus['embeddings']), timeout=timeout)
+
+
+def test_arrays_round_trip():
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    np.testing.assert_array_equal(decode_array(encode_array(array)), array)
+
+
+def test_shards_cover_the_corpus(corpus, shard_urls):
+    infos, unreachable = _sharded(corpus, shard_urls).check('v1')
+    assert unreachable == []
+    assert sorted((i['start'], i['end']) for i in infos)[0][0] == 0
+    assert sum(i['end'] - i['start'] for i in infos) == len(corpus['embeddings'])
+
+
+@pytest.mark.parametrize('k', [1, 10, 100])
+def test_sharded_merge_equals_a_flat_index(corpus, shard_urls, k):
+    queries = _queries(corpus)
+    expected_scores, expected_ids = corpus['index'].search(queries, k)
+    with track_missing_shards() as missing:
+        scores, ids = _sharded(corpus, shard_urls).search(queries, k)
+    assert missing == []
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+
+
+def test_sharded_detector_equals_local(corpus, shard_urls, make_detector):
+    texts = [corpus['data'][i]['text'] for i in (0, 6, 13)]
+    local = make_detector().detect_batch(texts)
+    sharded = make_detector(chunk_faiss_index=_sharded(corpus, shard_urls)).detect_batch(texts)
+    for a, b in zip(local, sharded):
+        assert b['confidence'] == pytest.approx(a['confidence'])
+        assert [d['doc_id'] for d in b['top_results']] == [d['doc_id'] for d in a['top_results']]
+        assert b['missing_shards'] == []
+
+
+@pytest.mark.parametrize('broken', ['refused', 'silent'])
+def test_missing_shard_is_left_out_and_reported(corpus, shard_urls, silent_url, broken):
+    bad_url = _closed_url() if broken == 'refused' else silent_url
+    index = _sharded(corpus, [shard_urls[0], bad_url, shard_urls[2]], timeout=0.5)
+    queries = _queries(corpus)
+    with track_missing_shards() as missing:
+        scores, ids = index.search(queries, 20)
+    assert missing == [bad_url]
+
+    # Same as searching only the rows of the shards that answered
+    infos, unreachable = index.check('v1')
+    assert len(unreachable) == 1
+    rows = np.concatenate([np.arange(i['start'], i['end']) for i in infos])
+    exact = queries @ corpus['embeddings'][rows].T
+    top = np.argsort(-exact, axis=1, kind='stable')[:, :20]
+    np.testing.assert_array_equal(ids, rows[top])
+    np.testing.assert_allclose(scores, np.take_along_axis(exact, top, axis=1), rtol=1e-5, atol=1e-6)
+    stats = {s['url']: s for s in index.stats()}
+    # A silent shard is cut off by wait() or by the socket timeout, whichever fires first
+    assert stats[bad_url]['timeouts'] + stats[bad_url]['failures'] == 1
+    assert stats[shard_urls[0]]['failures'] == stats[shard_urls[0]]['timeouts'] == 0
+
+
+def test_all_shards_missing(corpus):
+    with track_missing_shards() as missing:
+        scores, ids = _sharded(corpus, [_closed_url()], timeout=0.5).search(_queries(corpus, 2), 5)
+    assert len(missing) == 1
+    assert (ids == -1).all() and np.isneginf(scores).all()
+
+
+def test_nested_trackers_see_missing_shards(corpus):
+    url = _closed_url()
+    with track_missing_shards() as outer:
+        with track_missing_shards() as inner:
+            _sharded(corpus, [url], timeout=0.5).search(_queries(corpus, 1), 5)
+    assert inner == outer == [url]
+
+
+def test_check_rejects_another_corpus(corpus, shard_urls):
+    with pytest.raises(ValueError):
+        _sharded(corpus, shard_urls).check('v2')
+    with pytest.raises(ValueError):
+        ShardedIndex(shard_urls, corpus['embeddings'].shape[1], len(corpus['embeddings']) + 1).check('v1')
+    with pytest.raises(ValueError):
+        _sharded(corpus, shard_urls[:1] * 2).check('v1')
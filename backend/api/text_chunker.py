@@ -0,0 +1,93 @@
+"""
+Sentence / paragraph chunker shared by the API, corpus ingestion and the notebook
+artifacts (chunk ids are "<doc_id>_chunk_<i>")
+"""
+
+import re
+
+
+class TextChunker:
+    def __init__(self, chunk_type="adaptive", max_chunk_words=100):
+        self.chunk_type = chunk_type
+        self.max_chunk_words = max_chunk_words
+    
+    def chunk_text(self, text, doc_id):
+        word_count = len(text.split())
+        if self.chunk_type == "adaptive":
+            if word_count > 500:
+                return self._chunk_by_paragraph(text, doc_id)
+            else:
+                return self._chunk_by_sentence(text, doc_id)
+        elif self.chunk_type == "paragraph":
+            return self._chunk_by_paragraph(text, doc_id)
+        else:
+            return self._chunk_by_sentence(text, doc_id)
+    
+    def _chunk_by_sentence(self, text, doc_id):
+        sentences = re.split(r'[.!?]+', text)
+        sentences = [s.strip() for s in sentences if s.strip()]
+        chunks = []
+        for i, sentence in enumerate(sentences):
+            chunk = {
+                'chunk_id': f"{doc_id}_chunk_{i}",
+                'doc_id': doc_id,
+                'text': sentence,
+                'position': i,
+                'length': len(sentence.split())
+            }
+            chunks.append(chunk)
+        return chunks
+    
+    def _chunk_by_paragraph(self, text, doc_id):
+        paragraphs = re.split(r'\n\n+|\s{4,}', text)
+        paragraphs = [p.strip() for p in paragraphs if p.strip()]
+        chunks = []
+        current_chunk = []
+        current_length = 0
+        
+        for para in paragraphs:
+            para_words = para.split()
+            para_length = len(para_words)
+            
+            if para_length > self.max_chunk_words:
+                if current_chunk:
+                    chunks.append(' '.join(current_chunk))
+                    current_chunk = []
+                    current_length = 0
+                sentences = re.split(r'[.!?]+', para)
+                sentences = [s.strip() for s in sentences if s.strip()]
+                temp_chunk = []
+                temp_length = 0
+                for sent in sentences:
+                    sent_len = len(sent.split())
+                    if temp_length + sent_len > self.max_chunk_words and temp_chunk:
+                        chunks.append(' '.join(temp_chunk))
+                        temp_chunk = [sent]
+                        temp_length = sent_len
+                    else:
+                        temp_chunk.append(sent)
+                        temp_length += sent_len
+                if temp_chunk:
+                    chunks.append(' '.join(temp_chunk))
+            elif current_length + para_length <= self.max_chunk_words:
+                current_chunk.append(para)
+                current_length += para_length
+            else:
+                if current_chunk:
+                    chunks.append(' '.join(current_chunk))
+                current_chunk = [para]
+                current_length = para_length
+        
+        if current_chunk:
+            chunks.append(' '.join(current_chunk))
+        
+        chunk_objects = []
+        for i, chunk_text in enumerate(chunks):
+            chunk_objects.append({
+                'chunk_id': f"{doc_id}_chunk_{i}",
+                'doc_id': doc_id,
+                'text': chunk_text,
+                'position': i,
+                'length': len(chunk_text.split())
+            })
+        return chunk_objects
@@ -25,6 +25,10 @@ export const checkAI = asyncHandler(async (req, res) => {
 
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({}));
+      const retryAfter = response.headers.get('retry-after');
+      if (retryAfter) {
+        res.set('Retry-After', retryAfter);
+      }
       return res.status(response.status).json({
         error: errorData.error || 'AI detection failed',
         message: errorData.message || `Flask API returned status ${response.status}`,
@@ -16,7 +16,6 @@ echo Checking for required model files in backend\\data...
 set "missing="
 
 if not exist "backend\data\vn_plagiarism_corpus.json" set "missing=%missing% vn_plagiarism_corpus.json"
-if not exist "backend\data\vn_plagiarism_queries.json" set "missing=%missing% vn_plagiarism_queries.json"
 if not exist "backend\data\corpus_chunks.pkl" set "missing=%missing% corpus_chunks.pkl"
 if not exist "backend\data\chunk_embeddings_normalized.npy" set "missing=%missing% chunk_embeddings_normalized.npy"
 if not exist "backend\data\chunk_faiss_index.faiss" set "missing=%missing% chunk_faiss_index.faiss"
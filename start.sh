@@ -16,7 +16,6 @@ fi
 echo "Checking for required model files in backend/data..."
 required_files=(
     "backend/data/vn_plagiarism_corpus.json"
-    "backend/data/vn_plagiarism_queries.json"
     "backend/data/corpus_chunks.pkl"
     "backend/data/chunk_embeddings_normalized.npy"
     "backend/data/chunk_faiss_index.faiss"